@@ -0,0 +1,66 @@
+"""
+Benchmark for champion lists: InvertedIndex.ranked_retrieve with champions=True, which only scores the documents in the
+champion lists of the query terms unless that finds fewer than 5 of them, against ranked retrieval over the full posting lists.
+For a few champion list sizes, reports the size of the champion lists, time per query, how many queries fell back to the full
+lists, and the overlap of the top 5 with the exact top 5.
+
+Run from the repository root with `python -m benchmarks.bench_champions [num_runs] [docs_per_run]`. The index is merged from the
+synthetic, Zipfian runs of bench_merge, queries are 1 to 3 terms out of the 200 most common ones.
+"""
+from pathlib import Path
+from index.champion_lists import CHAMPION_LISTS_FILE_NAME, write_champion_lists
+from index.partial_index import PartialIndexMerger
+from index.term_statistics import DOC_NORMS_FILE_NAME
+from index.url_store import URL_STORE_FILE_NAME, write_url_store
+from engine.inverted_index import InvertedIndex
+from benchmarks.bench_merge import write_runs
+import random
+import sys
+import tempfile
+import time
+
+
+def main() -> None:
+    num_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    docs_per_run = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as runs_dir, tempfile.TemporaryDirectory() as index_dir:
+        write_runs(Path(runs_dir), num_runs, docs_per_run)
+        PartialIndexMerger(Path(runs_dir), Path(index_dir)).merge()
+        write_url_store(Path(index_dir) / URL_STORE_FILE_NAME,
+                        {doc_id: f"https://example.com/{doc_id}" for doc_id in range(num_runs * docs_per_run)})
+
+        rng = random.Random(0)
+        # bench_merge's vocabulary is term0, term1, ... by decreasing frequency
+        common = [f"term{i}" for i in range(200)]
+        queries = [" ".join(rng.sample(common, rng.randint(1, 3))) for _ in range(200)]
+
+        inverted_index = InvertedIndex(Path(index_dir))
+        start = time.perf_counter()
+        exact = [inverted_index.ranked_retrieve(query) for query in queries]
+        exact_time = (time.perf_counter() - start) / len(queries)
+        print(f"{len(queries)} queries of 1 to 3 common terms. full lists: {exact_time * 1e3:.2f}ms a query")
+
+        for size in [16, 64, 256]:
+            # the index maps the file, so it's replaced rather than overwritten
+            champion_lists_fp = Path(index_dir) / CHAMPION_LISTS_FILE_NAME
+            start = time.perf_counter()
+            write_champion_lists(Path(index_dir) / "inverted_index.bin", Path(index_dir) / DOC_NORMS_FILE_NAME,
+                                 champion_lists_fp.with_suffix(".tmp"), size)
+            write_time = time.perf_counter() - start
+            champion_lists_fp.with_suffix(".tmp").replace(champion_lists_fp)
+            inverted_index = InvertedIndex(Path(index_dir))
+
+            start = time.perf_counter()
+            found = [inverted_index.ranked_retrieve(query, champions=True) for query in queries]
+            champion_time = (time.perf_counter() - start) / len(queries)
+            num_fallbacks = sum(inverted_index._champion_retrieve(inverted_index._parse_query(query)[1]) is None
+                                for query in queries)
+            overlap = sum(len(set(urls) & set(exact_urls)) / len(exact_urls)
+                          for urls, exact_urls in zip(found, exact) if exact_urls) / len(queries)
+            print(f"r = {size}: {champion_lists_fp.stat().st_size / 2 ** 10:.0f}KB, {write_time:.2f}s to write. "
+                  f"{champion_time * 1e3:.2f}ms a query, {num_fallbacks} fell back to full lists, "
+                  f"{overlap:.0%} overlap with the exact top 5")
+
+
+if __name__ == '__main__':
+    main()
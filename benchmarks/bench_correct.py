@@ -0,0 +1,75 @@
+"""
+Benchmark for spelling correction: finding the terms within max_edit_distance of a misspelled term through the k-gram index
+(what IndexSegment.fuzzy_matches does) against comparing it to every term of the vocabulary. Reports k-gram index size, build
+time, candidates compared and time per lookup, and checks both find the same terms.
+
+Run from the repository root with `python -m benchmarks.bench_correct [num_terms] [num_queries]`. The vocabulary is the one of
+bench_suggest, and queries are terms of it with one or two random edits.
+"""
+from pathlib import Path
+from index.term_dictionary import TermDictionary
+from index.kgram_index import KGramIndex, edit_distance, max_edit_distance, write_kgram_index
+from benchmarks.bench_suggest import write_dictionary
+import random
+import string
+import sys
+import tempfile
+import time
+
+
+def misspell(term: str, rng: random.Random) -> str:
+    for _ in range(rng.randint(1, 2)):
+        i = rng.randrange(len(term))
+        edit = rng.choice(["insert", "delete", "substitute"])
+        if edit == "insert":
+            term = term[:i] + rng.choice(string.ascii_lowercase) + term[i:]
+        elif edit == "delete" and len(term) > 1:
+            term = term[:i] + term[i + 1:]
+        else:
+            term = term[:i] + rng.choice(string.ascii_lowercase) + term[i + 1:]
+    return term
+
+
+def scan(terms: list[str], query: str, max_distance: int) -> list[str]:
+    return [term for term in terms if edit_distance(query, term, max_distance) <= max_distance]
+
+
+def lookup(dictionary: TermDictionary, kgram_index: KGramIndex, query: str, max_distance: int) -> tuple[list[str], int]:
+    candidates = sorted(kgram_index.candidates(query, max_distance))
+    return [term for term, _, _ in dictionary.entries_at(candidates)
+            if edit_distance(query, term, max_distance) <= max_distance], len(candidates)
+
+
+def main() -> None:
+    num_terms = int(sys.argv[1]) if len(sys.argv) > 1 else 250000
+    num_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    with tempfile.TemporaryDirectory() as index_dir:
+        terms_fp = Path(index_dir) / "terms.bin"
+        kgrams_fp = Path(index_dir) / "kgrams.bin"
+        terms = write_dictionary(terms_fp, num_terms)
+        dictionary = TermDictionary(terms_fp)
+        start = time.perf_counter()
+        write_kgram_index(kgrams_fp, dictionary)
+        print(f"{num_terms} terms, {terms_fp.stat().st_size / 2 ** 20:.1f}MB dictionary. k-gram index: "
+              f"{time.perf_counter() - start:.2f}s to write, {kgrams_fp.stat().st_size / 2 ** 20:.1f}MB")
+        kgram_index = KGramIndex(kgrams_fp)
+
+        rng = random.Random(1)
+        queries = [misspell(term, rng) for term in rng.sample(terms, num_queries)]
+        queries = [query for query in queries if max_edit_distance(query) > 0]
+
+        start = time.perf_counter()
+        expected = [scan(terms, query, max_edit_distance(query)) for query in queries]
+        scan_time = (time.perf_counter() - start) / len(queries)
+        start = time.perf_counter()
+        found = [lookup(dictionary, kgram_index, query, max_edit_distance(query)) for query in queries]
+        lookup_time = (time.perf_counter() - start) / len(queries)
+        assert expected == [matches for matches, _ in found], "k-gram lookups missed terms"
+
+        num_candidates = sum(candidates for _, candidates in found) / len(queries)
+        print(f"{len(queries)} misspelled queries: scan {scan_time * 1e3:.1f}ms, k-grams {lookup_time * 1e3:.1f}ms per lookup "
+              f"({num_candidates:.0f} candidates compared on average)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark for utils.tokenize.get_term_frequencies against the original find_all(_TAGS) implementation.
+Reports pages/sec, and how much the resulting term frequencies differ.
+
+Run from the repository root with `python -m benchmarks.bench_get_postings [num_pages]`. Pages are sampled from WEBPAGES_DIR
+if it exists, otherwise synthetic pages with nested markup are used.
+"""
+from collections import defaultdict
+from bs4 import BeautifulSoup, FeatureNotFound
+from pathlib import Path
+from utils import load_config
+from utils.tokenize import get_term_frequencies, tokenize, _TAGS, _TAG_WEIGHTS
+import json
+import os
+import random
+import sys
+import time
+
+
+def get_term_frequencies_find_all(soup: BeautifulSoup) -> dict[str, int]:
+    """The original implementation: every matched tag is walked and tokenized again, so nested text is counted once per enclosing tag."""
+    token_tf_map: defaultdict[str, int] = defaultdict(int)
+    for tag in soup.find_all(_TAGS):
+        tokens = tokenize(tag.get_text(separator=" ", strip=True))
+        for token, count in tokens.items():
+            token_tf_map[token] += count * _TAG_WEIGHTS[tag.name]
+    return token_tf_map
+
+
+def load_pages(num_pages: int) -> list[str]:
+    load_config()
+    webpages_dir = Path(os.environ.get("WEBPAGES_DIR", "./DEV/"))
+    if webpages_dir.is_dir():
+        paths = sorted(webpages_dir.rglob('*.json'))
+        paths = random.Random(0).sample(paths, min(num_pages, len(paths)))
+        pages = []
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                pages.append(json.load(f)['content'])
+        print(f"Using {len(pages)} pages from {webpages_dir}")
+        return pages
+
+    print(f"{webpages_dir} not found, using {num_pages} synthetic pages")
+    rng = random.Random(0)
+    words = ["research", "computing", "students", "informatics", "faculty", "machine", "learning", "the", "of", "and",
+             "graduate", "courses", "irvine", "software", "systems", "data", "events", "news", "contact", "about"]
+
+    def sentence() -> str:
+        return " ".join(rng.choices(words, k=rng.randint(5, 20)))
+
+    pages = []
+    for _ in range(num_pages):
+        sections = []
+        for _ in range(rng.randint(3, 10)):
+            sections.append(
+                f"<div><h2>{sentence()}</h2><div><p>{sentence()} <b>{sentence()}</b> <span>{sentence()}</span></p>"
+                f"<p><strong>{sentence()}</strong> {sentence()}</p></div></div>")
+        pages.append(f"<html><head><title>{sentence()}</title><script>var x = 1;</script></head>"
+                     f"<body><h1>{sentence()}</h1>{''.join(sections)}</body></html>")
+    return pages
+
+
+def bench(name: str, pages: list[str], parser: str, extract) -> list[dict[str, int]]:
+    """pages/sec for parsing and extracting, and for extracting from already parsed pages."""
+    start = time.perf_counter()
+    soups = [BeautifulSoup(page, parser) for page in pages]
+    parsed = time.perf_counter()
+    results = [extract(soup) for soup in soups]
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {len(pages) / elapsed:8.1f} pages/sec, "
+          f"{len(pages) / (elapsed - (parsed - start)):8.1f} pages/sec extracting only")
+    return results
+
+
+def compare(old: list[dict[str, int]], new: list[dict[str, int]]) -> None:
+    pairs = same = 0
+    ratio_sum = 0.0
+    top_overlap = 0.0
+    for old_tfs, new_tfs in zip(old, new):
+        assert old_tfs.keys() == new_tfs.keys(), "both implementations should find the same terms"
+        for term, old_tf in old_tfs.items():
+            pairs += 1
+            same += old_tf == new_tfs[term]
+            ratio_sum += old_tf / new_tfs[term]
+        if old_tfs:
+            k = min(10, len(old_tfs))
+            old_top = set(sorted(old_tfs, key=lambda t: (-old_tfs[t], t))[:k])
+            new_top = set(sorted(new_tfs, key=lambda t: (-new_tfs[t], t))[:k])
+            top_overlap += len(old_top & new_top) / k
+    print(f"(doc, term) pairs: {pairs}, identical tf: {same / pairs:.1%}, mean old/new tf ratio: {ratio_sum / pairs:.2f}, "
+          f"mean top-10 term overlap per page: {top_overlap / len(old):.1%}")
+
+
+def main() -> None:
+    num_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    pages = load_pages(num_pages)
+    # both implementations stem through the same module-wide cache, warm it so neither pays for it
+    for page in pages:
+        get_term_frequencies(BeautifulSoup(page, 'html.parser'))
+
+    old = bench("find_all (html.parser)", pages, 'html.parser', get_term_frequencies_find_all)
+    new = bench("single pass (html.parser)", pages, 'html.parser', get_term_frequencies)
+    try:
+        bench("single pass (lxml)", pages, 'lxml', get_term_frequencies)
+    except FeatureNotFound:
+        print("lxml isn't installed, skipping")
+
+    compare(old, new)
+
+
+if __name__ == "__main__":
+    main()
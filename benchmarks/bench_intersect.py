@@ -0,0 +1,80 @@
+"""
+Benchmark for conjunctive queries: InvertedIndex.bool_retrieve, which intersects posting list cursors and skips the blocks of
+long lists the doc IDs of the short ones can't be in, against bool_retrieve as it was (every posting list decoded in full into
+a set, then the sets intersected). Both full intersections (every matching doc ID) and bool_retrieve (stops at the first 5)
+are timed, for a rare term AND a common one, and for two common terms.
+
+Run from the repository root with `python -m benchmarks.bench_intersect [num_runs] [docs_per_run]`. The index is merged from
+the synthetic, Zipfian runs of bench_merge.
+"""
+from pathlib import Path
+from index import Term
+from index.partial_index import PartialIndexMerger
+from index.posting_list import intersect
+from index.url_store import URL_STORE_FILE_NAME, write_url_store
+from engine.inverted_index import InvertedIndex
+from benchmarks.bench_merge import write_runs
+import random
+import sys
+import tempfile
+import time
+
+
+def set_intersection(inverted_index: InvertedIndex, terms: list[str]) -> list[int]:
+    """The old bool_retrieve, before it looked up URLs."""
+    doc_ids = {posting.doc_id for posting in inverted_index._search_term(Term(terms[0]))}
+    for term in terms[1:]:
+        doc_ids.intersection_update(posting.doc_id for posting in inverted_index._search_term(Term(term)))
+    return sorted(doc_ids)
+
+
+def cursor_intersection(inverted_index: InvertedIndex, terms: list[str]) -> tuple[list[int], int]:
+    """Every matching doc ID, and the number of blocks decoded to find them."""
+    doc_ids = []
+    num_blocks = 0
+    for segment in inverted_index._segments:
+        cursors = sorted((segment.cursor(Term(term)) for term in terms), key=len)
+        doc_ids += intersect(cursors)
+        num_blocks += sum(cursor.num_blocks_decoded for cursor in cursors)
+    return doc_ids, num_blocks
+
+
+def main() -> None:
+    num_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    docs_per_run = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as runs_dir, tempfile.TemporaryDirectory() as index_dir:
+        write_runs(Path(runs_dir), num_runs, docs_per_run)
+        PartialIndexMerger(Path(runs_dir), Path(index_dir)).merge()
+        write_url_store(Path(index_dir) / URL_STORE_FILE_NAME,
+                        {doc_id: f"https://example.com/{doc_id}" for doc_id in range(num_runs * docs_per_run)})
+        inverted_index = InvertedIndex(Path(index_dir))
+
+        rng = random.Random(0)
+        # bench_merge's vocabulary is term0, term1, ... by decreasing frequency
+        common = [f"term{i}" for i in range(20)]
+        rare = [f"term{i}" for i in range(2000, 4000) if len(inverted_index._search_term(Term(f"term{i}"))) > 0]
+        workloads = [("rare AND common", [[rng.choice(rare), rng.choice(common)] for _ in range(200)]),
+                     ("common AND common", [rng.sample(common, 2) for _ in range(200)])]
+
+        for name, queries in workloads:
+            start = time.perf_counter()
+            expected = [set_intersection(inverted_index, terms) for terms in queries]
+            set_time = time.perf_counter() - start
+            start = time.perf_counter()
+            found = [cursor_intersection(inverted_index, terms) for terms in queries]
+            cursor_time = time.perf_counter() - start
+            assert expected == [doc_ids for doc_ids, _ in found], "intersections differ"
+            num_postings = sum(len(inverted_index._search_term(Term(term))) for terms in queries for term in terms)
+            num_blocks = sum(blocks for _, blocks in found)
+
+            start = time.perf_counter()
+            for terms in queries:
+                inverted_index.bool_retrieve(" ".join(terms))
+            retrieve_time = time.perf_counter() - start
+            print(f"{name} ({len(queries)} queries, {num_postings} postings): sets {set_time / len(queries) * 1e3:.2f}ms, "
+                  f"cursors {cursor_time / len(queries) * 1e3:.2f}ms ({num_blocks / len(queries):.1f} blocks decoded) a query. "
+                  f"bool_retrieve: {retrieve_time / len(queries) * 1e3:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
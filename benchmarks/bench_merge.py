@@ -0,0 +1,74 @@
+"""
+Benchmark for PartialIndexMerger: merging the same runs two at a time (fan-in 2, which reads and writes every posting about
+log2(runs) times like the old polyphase merge did) against a single k-way pass, and that pass split into term ranges merged by
+several processes.
+Reports wall time, passes and bytes written, and checks they all produce the same postings.
+
+Run from the repository root with `python -m benchmarks.bench_merge [num_runs] [docs_per_run] [num_workers]`. Runs are synthetic, with
+Zipfian term frequencies so most terms are rare and a few show up in every run.
+"""
+from pathlib import Path
+from index.partial_index import PartialIndex, PartialIndexMerger
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+
+def write_runs(runs_dir: Path, num_runs: int, docs_per_run: int) -> None:
+    rng = random.Random(0)
+    vocabulary = [f"term{i}" for i in range(50000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    doc_id = 0
+    for run in range(num_runs):
+        partial_index = PartialIndex()
+        for _ in range(docs_per_run):
+            tfs: dict[str, int] = {}
+            for term in rng.choices(vocabulary, weights, k=150):
+                tfs[term] = tfs.get(term, 0) + 1
+            partial_index.add_document(doc_id, tfs)
+            doc_id += 1
+        with open(runs_dir / f"partial_index_{run:03}.bin", 'wb') as f:
+            partial_index.write(f)
+
+
+def bench(runs_dir: Path, fan_in: int, num_workers: int = 1) -> tuple[float, bytes]:
+    with tempfile.TemporaryDirectory() as work_dir, tempfile.TemporaryDirectory() as index_dir:
+        # the merger deletes its runs, so merge a copy
+        for path in runs_dir.iterdir():
+            shutil.copy(path, work_dir)
+        merger = PartialIndexMerger(
+            Path(work_dir), Path(index_dir), fan_in=fan_in, num_workers=num_workers)
+        start = time.perf_counter()
+        merger.merge()
+        elapsed = time.perf_counter() - start
+        print(f"fan-in {fan_in:>3}, {num_workers} worker(s): {elapsed:.2f}s, {merger.num_passes} pass(es), "
+              f"{merger.bytes_written / 2 ** 20:.1f}MB written")
+        with open(Path(index_dir) / "inverted_index.bin", 'rb') as f:
+            return elapsed, f.read()
+
+
+def main() -> None:
+    num_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    docs_per_run = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    num_workers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    with tempfile.TemporaryDirectory() as runs_dir:
+        write_runs(Path(runs_dir), num_runs, docs_per_run)
+        size = sum(path.stat().st_size for path in Path(runs_dir).iterdir())
+        print(f"{num_runs} runs of {docs_per_run} documents, {size / 2 ** 20:.1f}MB")
+
+        two_way, two_way_index = bench(Path(runs_dir), 2)
+        k_way, k_way_index = bench(Path(runs_dir), max(2, num_runs))
+        parallel, parallel_index = bench(
+            Path(runs_dir), max(2, num_runs), num_workers)
+        # blocks of long posting lists end where the runs merged into them did, so only the postings have to match
+        assert PartialIndex.deserialize(two_way_index) == PartialIndex.deserialize(k_way_index), \
+            "merges produced different inverted indexes"
+        assert k_way_index == parallel_index, "merges produced different inverted indexes"
+        print(f"k-way speedup: {two_way / k_way:.2f}x, "
+              f"with {num_workers} workers: {k_way / parallel:.2f}x more")
+
+
+if __name__ == '__main__':
+    main()
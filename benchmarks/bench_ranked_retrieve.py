@@ -0,0 +1,83 @@
+"""
+Benchmark for ranked retrieval scoring: InvertedIndex.ranked_retrieve, which accumulates scores term at a time with IDFs and
+document norms looked up in the statistics the merger precomputed, against ranked_retrieve as it was (the IDF recomputed for
+every posting, and every posting scored against every query term). Reports the size and write time of the statistics, and
+the time per query for one and two common terms. The old scoring isn't normalized, so only times are compared.
+
+Run from the repository root with `python -m benchmarks.bench_ranked_retrieve [num_runs] [docs_per_run]`. The index is merged
+from the synthetic, Zipfian runs of bench_merge.
+"""
+from pathlib import Path
+from index import Term, Posting, PostingList
+from index.partial_index import PartialIndexMerger
+from index.term_statistics import DOC_NORMS_FILE_NAME, TERM_STATISTICS_FILE_NAME, write_statistics
+from index.url_store import URL_STORE_FILE_NAME, write_url_store
+from engine.inverted_index import InvertedIndex
+from benchmarks.bench_merge import write_runs
+import math
+import random
+import sys
+import tempfile
+import time
+
+
+def recomputed_retrieve(inverted_index: InvertedIndex, terms: list[str]) -> list[str | None]:
+    """The old ranked_retrieve: _compute_score for every posting of every term, which recomputed the IDF of every term."""
+    posting_lists = {Term(term): inverted_index._search_term(Term(term)) for term in terms}
+
+    def compute_score(posting: Posting) -> float:
+        score = 0.0
+        num_terms = 0
+        for term_posting_list in posting_lists.values():
+            if len(term_posting_list) == 0:
+                continue
+            score += (1 + math.log10(posting.term_frequency)) * math.log10(inverted_index._num_docs / len(term_posting_list))
+            num_terms += 1
+        return score if num_terms > len(posting_lists) * 0.75 else 0.0
+
+    posting_list: PostingList
+    results = [(posting.doc_id, compute_score(posting))
+               for posting_list in posting_lists.values() for posting in posting_list]
+    results.sort(key=lambda result: result[1], reverse=True)
+    return [inverted_index._url(doc_id) for doc_id, _ in results[:5]]
+
+
+def main() -> None:
+    num_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    docs_per_run = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as runs_dir, tempfile.TemporaryDirectory() as index_dir:
+        write_runs(Path(runs_dir), num_runs, docs_per_run)
+        PartialIndexMerger(Path(runs_dir), Path(index_dir)).merge()
+        write_url_store(Path(index_dir) / URL_STORE_FILE_NAME,
+                        {doc_id: f"https://example.com/{doc_id}" for doc_id in range(num_runs * docs_per_run)})
+        # the merger already wrote them, this is just to time it
+        start = time.perf_counter()
+        write_statistics(Path(index_dir) / "inverted_index.bin", Path(index_dir) / TERM_STATISTICS_FILE_NAME,
+                         Path(index_dir) / DOC_NORMS_FILE_NAME)
+        print(f"Statistics: {time.perf_counter() - start:.2f}s to write, "
+              f"{(Path(index_dir) / TERM_STATISTICS_FILE_NAME).stat().st_size / 2 ** 10:.0f}KB of term statistics, "
+              f"{(Path(index_dir) / DOC_NORMS_FILE_NAME).stat().st_size / 2 ** 10:.0f}KB of document norms")
+        inverted_index = InvertedIndex(Path(index_dir))
+
+        rng = random.Random(0)
+        # bench_merge's vocabulary is term0, term1, ... by decreasing frequency
+        common = [f"term{i}" for i in range(20)]
+        workloads = [("one common term", [[rng.choice(common)] for _ in range(50)]),
+                     ("two common terms", [rng.sample(common, 2) for _ in range(50)])]
+
+        for name, queries in workloads:
+            num_postings = sum(len(inverted_index._search_term(Term(term))) for terms in queries for term in terms)
+            start = time.perf_counter()
+            for terms in queries:
+                recomputed_retrieve(inverted_index, terms)
+            recomputed_time = time.perf_counter() - start
+            start = time.perf_counter()
+            for terms in queries:
+                inverted_index.ranked_retrieve(" ".join(terms))
+            lookup_time = time.perf_counter() - start
+            print(f"{name} ({len(queries)} queries, {num_postings / len(queries):.0f} postings a query): recomputed "
+                  f"{recomputed_time / len(queries) * 1e3:.2f}ms, looked up {lookup_time / len(queries) * 1e3:.2f}ms a query")
+
+
+if __name__ == '__main__':
+    main()
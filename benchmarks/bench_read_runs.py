@@ -0,0 +1,50 @@
+"""
+Benchmark for PartialIndexResource: reading runs through a buffered file object (four read() calls per item) against parsing
+them out of a memory mapping, both fully decoded (read_items) and as raw records (read_raw_items, what the merger uses).
+Then times a merge of the same runs, which reads with the default (memory mapped) mode.
+
+Run from the repository root with `python -m benchmarks.bench_read_runs [num_runs] [docs_per_run]`. Runs are the synthetic,
+Zipfian ones of bench_merge.
+"""
+from pathlib import Path
+from index.partial_index.partial_index import PartialIndexResource
+from benchmarks.bench_merge import bench, write_runs
+import sys
+import tempfile
+import time
+
+
+def read_all(run_paths: list[Path], use_mmap: bool, raw: bool) -> tuple[float, int]:
+    start = time.perf_counter()
+    num_items = 0
+    for path in run_paths:
+        with PartialIndexResource(path, use_mmap=use_mmap) as resource:
+            items = resource.read_raw_items() if raw else resource.read_items()
+            for _ in items:
+                num_items += 1
+    return time.perf_counter() - start, num_items
+
+
+def main() -> None:
+    num_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    docs_per_run = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as runs_dir:
+        write_runs(Path(runs_dir), num_runs, docs_per_run)
+        run_paths = sorted(Path(runs_dir).iterdir())
+        size = sum(path.stat().st_size for path in run_paths)
+        print(f"{num_runs} runs of {docs_per_run} documents, {size / 2 ** 20:.1f}MB")
+
+        for raw in [False, True]:
+            timings = {}
+            for use_mmap in [False, True]:
+                elapsed, num_items = read_all(run_paths, use_mmap, raw)
+                timings[use_mmap] = elapsed
+                print(f"{'read_raw_items' if raw else 'read_items':>14}, {'mmap' if use_mmap else 'file':>4}: "
+                      f"{elapsed:.2f}s, {num_items} items, {size / 2 ** 20 / elapsed:.1f}MB/s")
+            print(f"speedup: {timings[False] / timings[True]:.2f}x")
+
+        bench(Path(runs_dir), max(2, num_runs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark for posting list decoding: InvertedIndex._search_term on the compressed (doc ID gap + varint) format against the old
+fixed width format (a <H posting count and 8 byte <II postings), read the way IndexSegment used to. Reports index size and
+lookup time over every term of the index, and over the 100 longest posting lists alone.
+
+Run from the repository root with `python -m benchmarks.bench_search_term [num_runs] [docs_per_run]`. The index is merged from
+the synthetic, Zipfian runs of bench_merge.
+"""
+from pathlib import Path
+from index import Term, Posting, PostingList
+from index.partial_index import PartialIndexMerger
+from index.partial_index.partial_index import PartialIndexResource
+from index.url_store import URL_STORE_FILE_NAME, write_url_store
+from engine.inverted_index import InvertedIndex
+from benchmarks.bench_merge import write_runs
+import struct
+import sys
+import tempfile
+import time
+
+_OLD_LENGTH_FORMAT = "<H"
+_OLD_POSTING_FORMAT = "<II"
+
+
+def write_old_format(index_fp: Path, old_fp: Path) -> dict[str, int]:
+    """Re-encode the inverted index in the old fixed width format. Returns its term to position mapping."""
+    positions = {}
+    with PartialIndexResource(index_fp) as resource, open(old_fp, 'wb') as out:
+        for term, posting_list in resource:
+            positions[term.term] = out.tell()
+            out.write(term.serialize())
+            out.write(struct.pack(_OLD_LENGTH_FORMAT, len(posting_list)))
+            out.write(b''.join(struct.pack(_OLD_POSTING_FORMAT, posting.doc_id, posting.term_frequency)
+                               for posting in posting_list))
+    return positions
+
+
+def search_old_format(old_fp: Path, positions: dict[str, int], term: str) -> PostingList:
+    """IndexSegment.search_term as it was for the old format."""
+    with open(old_fp, 'rb') as f:
+        f.seek(positions[term])
+        term_length = struct.unpack("<H", f.read(2))[0]
+        f.read(term_length)
+        length = struct.unpack(_OLD_LENGTH_FORMAT, f.read(2))[0]
+        posting_list = PostingList()
+        posting_list._postings = [Posting(doc_id, term_frequency) for doc_id, term_frequency
+                                  in struct.iter_unpack(_OLD_POSTING_FORMAT, f.read(length * 8))]
+        return posting_list
+
+
+def main() -> None:
+    num_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    docs_per_run = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as runs_dir, tempfile.TemporaryDirectory() as index_dir:
+        write_runs(Path(runs_dir), num_runs, docs_per_run)
+        PartialIndexMerger(Path(runs_dir), Path(index_dir)).merge()
+        write_url_store(Path(index_dir) / URL_STORE_FILE_NAME,
+                        {doc_id: f"https://example.com/{doc_id}" for doc_id in range(num_runs * docs_per_run)})
+        index_fp = Path(index_dir) / "inverted_index.bin"
+        old_fp = Path(runs_dir) / "old_inverted_index.bin"
+        positions = write_old_format(index_fp, old_fp)
+        print(f"inverted index: {old_fp.stat().st_size / 2 ** 20:.1f}MB fixed width, "
+              f"{index_fp.stat().st_size / 2 ** 20:.1f}MB compressed")
+
+        inverted_index = InvertedIndex(Path(index_dir))
+        terms = sorted(positions)
+        lengths = {term: len(inverted_index._search_term(Term(term))) for term in terms}
+        longest = sorted(terms, key=lengths.get, reverse=True)[:100]
+
+        for name, sample in [("all terms", terms), ("100 longest lists", longest)]:
+            start = time.perf_counter()
+            old = [search_old_format(old_fp, positions, term) for term in sample]
+            old_time = time.perf_counter() - start
+            start = time.perf_counter()
+            new = [inverted_index._search_term(Term(term)) for term in sample]
+            new_time = time.perf_counter() - start
+            assert old == new, "formats decoded different posting lists"
+            num_postings = sum(len(posting_list) for posting_list in new)
+            print(f"{name} ({len(sample)} terms, {num_postings} postings): fixed width {old_time:.2f}s, "
+                  f"compressed {new_time:.2f}s ({num_postings / new_time / 1e6:.2f}M postings/s)")
+
+
+if __name__ == '__main__':
+    main()
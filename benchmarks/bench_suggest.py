@@ -0,0 +1,74 @@
+"""
+Benchmark for autocomplete: IndexSegment.suggest with the precomputed completions table against scanning the terms of the prefix
+in the term dictionary (what suggest does for prefixes that aren't in the table) for every prefix. Reports table size and time
+per suggestion for prefixes of 1 to 4 characters.
+
+Run from the repository root with `python -m benchmarks.bench_suggest [num_terms]`. Terms are random lowercase words, with
+Zipfian document frequencies.
+"""
+from pathlib import Path
+from index.term_dictionary import TermDictionary, write_term_dictionary
+from index.completions import COMPLETIONS_K, Completions, write_completions
+import heapq
+import random
+import string
+import sys
+import tempfile
+import time
+
+
+def write_dictionary(path: Path, num_terms: int) -> list[str]:
+    rng = random.Random(0)
+    # english-ish letter weights, so some prefixes have far more terms than others
+    weights = [8, 2, 3, 4, 12, 2, 2, 6, 7, 1, 1, 4, 2, 7, 8, 2, 1, 6, 6, 9, 3, 1, 2, 1, 2, 1]
+    terms = set()
+    while len(terms) < num_terms:
+        terms.add("".join(rng.choices(string.ascii_lowercase, weights, k=rng.randint(3, 12))))
+    terms = sorted(terms)
+    write_term_dictionary(path, ((term, position, int(1 / rng.random()))
+                                 for position, term in enumerate(terms)))
+    return terms
+
+
+def scan(dictionary: TermDictionary, prefix: str) -> list[str]:
+    start, end = dictionary.prefix_range(prefix)
+    return [term for term, _ in heapq.nlargest(COMPLETIONS_K, ((term, document_frequency) for term, _, document_frequency
+                                                               in dictionary.entries(start, end)), key=lambda entry: entry[1])]
+
+
+def complete(dictionary: TermDictionary, completions: Completions, prefix: str) -> list[str]:
+    stored = completions.get(prefix)
+    if stored is None:
+        return scan(dictionary, prefix)
+    return [term for term, _ in stored]
+
+
+def main() -> None:
+    num_terms = int(sys.argv[1]) if len(sys.argv) > 1 else 250000
+    with tempfile.TemporaryDirectory() as index_dir:
+        terms_fp = Path(index_dir) / "terms.bin"
+        completions_fp = Path(index_dir) / "completions.bin"
+        terms = write_dictionary(terms_fp, num_terms)
+        dictionary = TermDictionary(terms_fp)
+        start = time.perf_counter()
+        write_completions(completions_fp, dictionary)
+        print(f"{num_terms} terms, {terms_fp.stat().st_size / 2 ** 20:.1f}MB dictionary. "
+              f"completions: {time.perf_counter() - start:.2f}s to write, {completions_fp.stat().st_size / 2 ** 10:.0f}KB")
+        completions = Completions(completions_fp)
+        print(f"{len(completions)} prefixes stored")
+
+        for length in range(1, 5):
+            prefixes = sorted({term[:length] for term in terms})
+            timings = []
+            suggestions = []
+            for fn in [scan, lambda dictionary, prefix: complete(dictionary, completions, prefix)]:
+                start = time.perf_counter()
+                suggestions.append([fn(dictionary, prefix) for prefix in prefixes])
+                timings.append((time.perf_counter() - start) / len(prefixes))
+            assert suggestions[0] == suggestions[1], "completions don't match the scan"
+            print(f"{len(prefixes):>6} prefixes of {length}: scan {timings[0] * 1e6:.0f}µs, "
+                  f"completions {timings[1] * 1e6:.0f}µs per suggestion")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Micro-benchmark for utils.tokenize.tokenize against the original character by character implementation.
+
+Run from the repository root with `python -m benchmarks.bench_tokenize`.
+"""
+from collections import Counter
+from nltk.stem import PorterStemmer
+from utils.tokenize import tokenize, _TOKEN_PATTERN, _lower
+import random
+import time
+
+
+def tokenize_reference(text: str) -> Counter[str]:
+    """The original tokenizer, kept here as the baseline to compare against."""
+    stemmer = PorterStemmer()
+    tokens = Counter()
+
+    buffer = ""
+    cursor = 0
+
+    while cursor < len(text):
+        char = text[cursor]
+        if char.isalnum():
+            buffer += char.lower()
+        else:
+            if buffer:
+                stemmed_token = stemmer.stem(buffer)
+                tokens[stemmed_token] += 1
+                buffer = ""
+        cursor += 1
+
+    if buffer:
+        stemmed_token = stemmer.stem(buffer)
+        tokens[stemmed_token] += 1
+
+    return tokens
+
+
+def split_reference(text: str) -> Counter[str]:
+    """Character loop from the original tokenizer, without stemming."""
+    tokens = Counter()
+    buffer = ""
+    for char in text:
+        if char.isalnum():
+            buffer += char.lower()
+        elif buffer:
+            tokens[buffer] += 1
+            buffer = ""
+    if buffer:
+        tokens[buffer] += 1
+    return tokens
+
+
+def split_fast(text: str) -> Counter[str]:
+    """Regex splitting from utils.tokenize.tokenize, without stemming."""
+    if text.isascii():
+        return Counter(_TOKEN_PATTERN.findall(text.lower()))
+    return Counter(_lower(token) for token in _TOKEN_PATTERN.findall(text))
+
+
+_WORDS = ["the", "of", "and", "computer", "science", "informatics", "students", "research", "Learning",
+          "machine", "UCI", "2024", "irvine", "software", "engineering", "graduate", "courses", "faculty",
+          "systems", "data", "networking", "ICS", "e-mail", "résumé", "naïve", "ΟΔΟΣ", "running", "runs"]
+_SEPARATORS = [" ", " ", " ", ", ", ". ", "\n", " - ", "/", "_", "(", ") "]
+
+
+def make_texts(num_texts: int, words_per_text: int, seed: int = 0) -> list[str]:
+    """Zipf-ish synthetic text, roughly the size of a tag's worth of text in get_postings."""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(_WORDS))]
+    texts = []
+    for _ in range(num_texts):
+        words = rng.choices(_WORDS, weights=weights, k=words_per_text)
+        texts.append("".join(word + rng.choice(_SEPARATORS) for word in words))
+    return texts
+
+
+def bench(name: str, tokenizer, texts: list[str]) -> float:
+    start = time.perf_counter()
+    num_tokens = 0
+    for text in texts:
+        num_tokens += sum(tokenizer(text).values())
+    elapsed = time.perf_counter() - start
+    rate = num_tokens / elapsed
+    print(f"{name:<12} {num_tokens} tokens in {elapsed:.3f}s ({rate:,.0f} tokens/sec)")
+    return rate
+
+
+def main() -> None:
+    texts = make_texts(num_texts=2000, words_per_text=200)
+
+    # outputs must be identical before speed means anything
+    for text in texts:
+        assert tokenize(text) == tokenize_reference(text)
+
+        assert split_fast(text) == split_reference(text)
+
+    # splitting and lowercasing alone, which is what the regex replaces
+    reference_rate = bench("split (old)", split_reference, texts)
+    fast_rate = bench("split (new)", split_fast, texts)
+    print(f"speedup: {fast_rate / reference_rate:.2f}x\n")
+
+    # end to end, Porter stemming included
+    reference_rate = bench("reference", tokenize_reference, texts)
+    fast_rate = bench("tokenize", tokenize, texts)
+    print(f"speedup: {fast_rate / reference_rate:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
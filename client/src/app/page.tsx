@@ -1,6 +1,9 @@
 "use client";
 
-import React, { useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
+
+// ms to wait after a keystroke before asking for suggestions, so fast typing sends one request instead of one per key
+const SUGGEST_DEBOUNCE_MS = 150;
 
 interface SearchResult {
   count: number;
@@ -14,6 +17,14 @@ function Index() {
   const [loading, setLoading] = useState(false);
   const [hasSearched, setHasSearched] = useState(false);
   const [luckyIndex, setLuckyIndex] = useState(0);
+  const [suggestions, setSuggestions] = useState<string[]>([]);
+  // the pending debounce timer and the suggest request in flight, if any
+  const suggestTimer = useRef<ReturnType<typeof setTimeout> | null>(null);
+  const suggestRequest = useRef<AbortController | null>(null);
+  // what's in the input right now, responses for anything else are stale
+  const latestValue = useRef("");
+
+  useEffect(() => () => cancelSuggest(), []);
 
   const luckyQueries = [
     "cristina lopes",
@@ -22,9 +33,64 @@ function Index() {
     "master of software engineering",
   ];
 
+  const cancelSuggest = () => {
+    if (suggestTimer.current) {
+      clearTimeout(suggestTimer.current);
+      suggestTimer.current = null;
+    }
+    suggestRequest.current?.abort();
+    suggestRequest.current = null;
+  };
+
+  const suggest = (value: string) => {
+    latestValue.current = value;
+    cancelSuggest();
+    // complete the word being typed
+    const prefix = value.endsWith(" ") ? "" : value.split(" ").pop() ?? "";
+    if (!prefix || prefix.endsWith("*")) {
+      setSuggestions([]);
+      return;
+    }
+    suggestTimer.current = setTimeout(async () => {
+      suggestTimer.current = null;
+      const controller = new AbortController();
+      suggestRequest.current = controller;
+      try {
+        const response = await fetch(
+          `http://localhost:8080/api/suggest?prefix=${encodeURIComponent(prefix)}`,
+          { signal: controller.signal }
+        );
+        const data = await response.json();
+        // the input changed while this was in flight
+        if (controller.signal.aborted || latestValue.current !== value) return;
+        setSuggestions(data.suggestions ?? []);
+      } catch (error) {
+        if (!controller.signal.aborted) {
+          console.error("Suggest failed:", error);
+        }
+      } finally {
+        if (suggestRequest.current === controller) {
+          suggestRequest.current = null;
+        }
+      }
+    }, SUGGEST_DEBOUNCE_MS);
+  };
+
+  const pickSuggestion = (suggestion: string) => {
+    const words = query.split(" ");
+    words[words.length - 1] = suggestion;
+    const value = words.join(" ") + " ";
+    setQuery(value);
+    latestValue.current = value;
+    cancelSuggest();
+    setSuggestions([]);
+  };
+
   const search = async () => {
     if (!query.trim()) return;
 
+    cancelSuggest();
+    setSuggestions([]);
     setLoading(true);
     try {
       const response = await fetch(
@@ -138,14 +204,22 @@ function Index() {
                   className="flex-1 py-3 px-2 text-lg outline-none text-black"
                   type="text"
                   value={query}
-                  onChange={(e) => setQuery(e.target.value)}
+                  onChange={(e) => {
+                    setQuery(e.target.value);
+                    suggest(e.target.value);
+                  }}
                   onKeyPress={handleKeyPress}
                   placeholder="Search the web..."
                   autoComplete="off"
                 />
                 {query && (
                   <button
-                    onClick={() => setQuery("")}
+                    onClick={() => {
+                      setQuery("");
+                      latestValue.current = "";
+                      cancelSuggest();
+                      setSuggestions([]);
+                    }}
                     className="p-2 hover:bg-gray-100 rounded-full mr-2"
                   >
                     <svg
@@ -165,6 +239,20 @@ function Index() {
                 )}
               </div>
 
+              {suggestions.length > 0 && (
+                <ul className="absolute z-10 w-full mt-1 bg-white border border-gray-200 rounded-lg shadow-md py-2">
+                  {suggestions.map((suggestion) => (
+                    <li
+                      key={suggestion}
+                      className="px-4 py-1 text-black hover:bg-gray-100 cursor-pointer"
+                      onClick={() => pickSuggestion(suggestion)}
+                    >
+                      {suggestion}
+                    </li>
+                  ))}
+                </ul>
+              )}
+
               {!hasSearched && (
                 <div className="flex justify-center mt-8 space-x-4">
                   <button
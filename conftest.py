@@ -0,0 +1 @@
+# empty on purpose: a conftest at the repository root puts the root on sys.path, so plain `pytest` finds index, utils and engine
@@ -0,0 +1,154 @@
+from pathlib import Path
+from index import Term, PostingList
+from index.term import TERM_LENGTH_FORMAT, TERM_LENGTH_SIZE
+from index.champion_lists import CHAMPION_LISTS_FILE_NAME, ChampionLists
+from index.completions import COMPLETIONS_FILE_NAME, COMPLETIONS_K, Completions
+from index.kgram_index import KGRAM_INDEX_FILE_NAME, KGramIndex, edit_distance
+from index.term_dictionary import TERM_DICTIONARY_FILE_NAME, TermDictionary
+from index.term_statistics import DOC_NORMS_FILE_NAME, TERM_STATISTICS_FILE_NAME, DocNorms, TermStatistics
+from index.url_store import URL_STORE_FILE_NAME, UrlStore
+from index.posting_list import PostingListCursor
+from typing import Iterator, Optional, Union
+import heapq
+import mmap
+import os
+import struct
+
+
+class IndexSegment:
+    """
+    A single merged index on disk: inverted_index.bin, its term to position mapping, and the URLs of its documents.
+    The base index in INDEX_DIR is one, and so is every segment an incremental build adds under it.
+    """
+
+    def __init__(self, segment_dir: Path) -> None:
+        self._segment_dir = segment_dir
+        self._index_fp = segment_dir / "inverted_index.bin"
+        # memory mapped, so a posting list cursor only ever reads the blocks it decodes. an empty index can't be mapped
+        with open(self._index_fp, 'rb') as f:
+            self._index: Union[mmap.mmap, bytes] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) \
+                if os.fstat(f.fileno()).st_size else b''
+
+        # memory mapped, URLs are only decoded for results that are returned
+        self._urls = UrlStore(segment_dir / URL_STORE_FILE_NAME)
+        # memory mapped too, a lookup decodes one block of terms
+        self._terms = TermDictionary(segment_dir / TERM_DICTIONARY_FILE_NAME)
+        self._completions = Completions(segment_dir / COMPLETIONS_FILE_NAME)
+        self._kgrams = KGramIndex(segment_dir / KGRAM_INDEX_FILE_NAME)
+        # precomputed at merge time, scoring only looks them up
+        self._term_statistics = TermStatistics(segment_dir / TERM_STATISTICS_FILE_NAME)
+        self._norms = DocNorms(segment_dir / DOC_NORMS_FILE_NAME)
+        self._champions = ChampionLists(segment_dir / CHAMPION_LISTS_FILE_NAME)
+
+    @property
+    def num_docs(self) -> int:
+        return len(self._urls)
+
+    @property
+    def num_scored_docs(self) -> int:
+        """Documents of the segment with postings, deleted ones included. The IDFs of its term statistics were computed with it."""
+        return self._term_statistics.num_docs
+
+    @property
+    def num_terms(self) -> int:
+        return len(self._terms)
+
+    def terms(self) -> set[str]:
+        """Every term of the segment. Decodes the whole term dictionary."""
+        return set(self._terms)
+
+    def document_frequency(self, term: str) -> int:
+        entry = self._terms.lookup(term)
+        return entry[1] if entry is not None else 0
+
+    def term_statistics(self, term: str) -> Optional[tuple[int, float, float]]:
+        """
+        Document frequency, IDF and max weight of term (see write_statistics), None if the segment doesn't have it. The IDF is
+        the one of this segment alone.
+        """
+        entry = self._terms.find(term)
+        if entry is None:
+            return None
+        ordinal, _, document_frequency = entry
+        return (document_frequency, *self._term_statistics.get(ordinal))
+
+    def norm(self, doc_id: int) -> float:
+        """Length of the tf_weight vector of a document of this segment, scores are divided by it."""
+        return self._norms.norm(doc_id)
+
+    def champions(self, term: str) -> Optional[list[int]]:
+        """
+        Doc IDs of the champion list of term, highest impact first (see write_champion_lists). A term without one is in few enough
+        documents that all of them are returned, in doc ID order. None if the segment doesn't have the term.
+        """
+        entry = self._terms.find(term)
+        if entry is None:
+            return None
+        champions = self._champions.get(entry[0])
+        if champions is not None:
+            return champions
+        return [posting.doc_id for posting in self.search_term(Term(term))]
+
+    def prefix_terms(self, prefix: str) -> Iterator[tuple[str, int]]:
+        """Every term of the segment starting with prefix, in term order, with its document frequency."""
+        start, end = self._terms.prefix_range(prefix)
+        for term, _, document_frequency in self._terms.entries(start, end):
+            yield term, document_frequency
+
+    def suggest(self, prefix: str, k: int = COMPLETIONS_K) -> list[tuple[str, int]]:
+        """
+        Up to k (at most COMPLETIONS_K) terms starting with prefix, with their document frequencies, most frequent first.
+        Precomputed for prefixes of many terms, the few terms of any other prefix are just scanned.
+        """
+        completions = self._completions.get(prefix)
+        if completions is not None:
+            return completions[:k]
+        start, end = self._terms.prefix_range(prefix)
+        return heapq.nlargest(k, ((term, document_frequency) for term, _, document_frequency in self._terms.entries(start, end)),
+                              key=lambda entry: entry[1])
+
+    def fuzzy_matches(self, term: str, max_distance: int) -> list[tuple[str, int, int]]:
+        """
+        Terms within max_distance edits of term, with their edit distance and document frequency. Only the terms the k-gram index
+        finds as candidates are compared to term.
+        """
+        matches = []
+        for candidate, _, document_frequency in self._terms.entries_at(sorted(self._kgrams.candidates(term, max_distance))):
+            distance = edit_distance(term, candidate, max_distance)
+            if distance <= max_distance:
+                matches.append((candidate, distance, document_frequency))
+        return matches
+
+    def has_doc_id(self, doc_id: int) -> bool:
+        """Whether doc_id falls in this segment's doc ID range. Cheap, doesn't decode anything."""
+        return self._urls.first_doc_id <= doc_id < self._urls.end_doc_id
+
+    def url(self, doc_id: int) -> Optional[str]:
+        return self._urls.url(doc_id)
+
+    def _posting_list_position(self, term: Term) -> Optional[int]:
+        """Where the posting list of term starts in the inverted index, None if the segment doesn't have it."""
+        position = self._terms.get(term.term)
+        if position is None:
+            return None
+        term_length = struct.unpack_from(TERM_LENGTH_FORMAT, self._index, position)[0]
+        position += TERM_LENGTH_SIZE
+        assert self._index[position:position + term_length].decode("utf-8") == term.term, "Term mismatch"
+        return position + term_length
+
+    def search_term(self, term: Term) -> PostingList:
+        """Returns the posting list of term in this segment, empty if the segment doesn't have it."""
+        position = self._posting_list_position(term)
+        if position is None:
+            return PostingList()
+        return PostingList.deserialize(memoryview(self._index)[position:])
+
+    def cursor(self, term: Term) -> Optional[PostingListCursor]:
+        """A cursor over the posting list of term in this segment (see PostingListCursor), None if the segment doesn't have it."""
+        position = self._posting_list_position(term)
+        if position is None:
+            return None
+        return PostingListCursor(self._index, position)
+
+    def __str__(self) -> str:
+        return f"<IndexSegment stored at {self._segment_dir} | {self.num_docs} documents, {self.num_terms} terms>"
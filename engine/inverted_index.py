@@ -10,13 +10,24 @@ Each index term is associated with an inverted list
 from pathlib import Path
 from index.partial_index.partial_index import PartialIndex
 from index import Term, PostingList, Posting
-from utils.tokenize import tokenize
+from utils.tokenize import tokenize, _lower
+from utils.stem_cache import StemCache
+from utils.logger import engine_log
+from engine.index_segment import IndexSegment
+from index.segments import segment_dirs
+from index.tombstones import Tombstones
+from index.completions import COMPLETIONS_K
+from index.kgram_index import max_edit_distance
+from index.posting_list import intersect
+from index.term_statistics import tf_weight
+from typing import Iterator, Optional
+import heapq
+import itertools
 import math
-import json
-import struct
-from index.term import TERM_LENGTH_FORMAT, TERM_LENGTH_SIZE
-from index.posting_list import POSTING_LIST_LENGTH_FORMAT, POSTING_LIST_LENGTH_SIZE
-from index.posting import POSTING_SIZE
+
+# most index terms a trailing wildcard is expanded to, the ones in the most documents. a one or two letter prefix would decode most
+# of the index otherwise
+WILDCARD_MAX_TERMS = 4096
 
 
 class InvertedIndex:
@@ -27,158 +38,322 @@ class InvertedIndex:
     There are NO methods for adding or removing postings from the index. InvertedIndex is read-only, and based off of data specified from `index_dir`.
     """
 
-    def __init__(self, index_dir: Path) -> None:
+    def __init__(self, index_dir: Path, stem_cache_size: int = 2 ** 17) -> None:
         self._index_dir = index_dir
 
         if not index_dir.is_dir() or not index_dir.exists() or not any(index_dir.iterdir()):
             raise ValueError(
                 f"Inverted index directory must be exist and be populated.")
 
-        self._index_fp = self._index_dir / "inverted_index.bin"
-        self._doc_id_map_fp = self._index_dir / "doc_id_map.json"
-        self._term_to_ii_position_fp = self._index_dir / "term_to_ii_position.json"
-
-        with open(self._doc_id_map_fp, 'r') as f:
-            # convert doc_ids back to int
-            self._doc_id_to_url = {
-                int(doc_id): doc_url for doc_id, doc_url in json.load(f).items()}
-            self._num_docs = len(self._doc_id_to_url)
-
-        with open(self._term_to_ii_position_fp, 'r') as f:
-            # convert term_to_ii_position to dict[str, int]
-            self._term_to_ii_position = {
-                term: pos for term, pos in json.load(f).items()}
-            self._num_terms = len(self._term_to_ii_position)
-
+        self._stem_cache_fp = self._index_dir / "stem_cache.json"
+
+        # the base index, then any segments incremental builds added to it. doc IDs go up from one segment to the next
+        self._segments = [IndexSegment(index_dir)] + \
+            [IndexSegment(d) for d in segment_dirs(index_dir)]
+        # deleted (or replaced) documents, their postings are still on disk until the index is compacted
+        self._deleted = Tombstones.load(index_dir)
+        self._num_docs = sum(
+            segment.num_docs for segment in self._segments) - len(self._deleted)
+        # the N of IDFs: documents with postings on disk, deleted ones included, since so are their postings in document frequencies
+        self._num_scored_docs = sum(
+            segment.num_scored_docs for segment in self._segments)
+        # segments share most of their terms, counting them means decoding every term dictionary, so that's only done with segments
+        if len(self._segments) == 1:
+            self._num_terms = self._segments[0].num_terms
+        else:
+            self._num_terms = len(set().union(
+                *(segment.terms() for segment in self._segments)))
+
+        # query terms are stemmed through the same kind of cache as the indexer, warmed with its table if it kept one
+        self._stem_cache = StemCache(stem_cache_size)
+        if self._stem_cache_fp.exists():
+            self._stem_cache.load(self._stem_cache_fp)
+            engine_log.info(f"Warmed stem cache from {self._stem_cache_fp}: {self._stem_cache}")
+
+        if len(self._segments) > 1:
+            engine_log.info(
+                f"Loaded {len(self._segments) - 1} incremental segment(s) on top of the base index")
         print("Number of documents in index:", self._num_docs)
         print("Number of terms in index:", self._num_terms)
 
-    def _search_term(self, term: Term) -> PostingList:
-        """Returns a list of postings for a given term."""
-        with open(self._index_fp, "rb") as f:
-            position = self._term_to_ii_position.get(term.term)
-            if position is None:
-                # return empty PostingList if term isn't found in term to inverted index mapping
-                return PostingList()
-            f.seek(position)
-
-            # super shit design; I designed deserialization in PostingList and Post for partial index creation and merging
-            # that was designed to read a variable length of bytes and produce the object from it
-            # did not design it for a buffered reader. and if we were to convert the buffered reader into a bytes we'd have to load the entire thing
-            # instead, we have to basically reimplement deserialization, but instead of using a fixed bytes, we use the buffered reader
-            # I hate this this sucks
-            term_length = struct.unpack(
-                TERM_LENGTH_FORMAT, f.read(TERM_LENGTH_SIZE))[0]
-            term_data = f.read(term_length)
-            str_term = term_data.decode("utf-8")
-            assert str_term == term.term, "Term mismatch"
-
-            byte_buffer = f.read(POSTING_LIST_LENGTH_SIZE)
-            posting_list_length = struct.unpack(
-                POSTING_LIST_LENGTH_FORMAT, byte_buffer)[0]
-            byte_buffer += f.read(posting_list_length * POSTING_SIZE)
-            posting_list = PostingList.deserialize(byte_buffer)
-            return posting_list
-
-    def _compute_tf_idf(self, term: Term, posting: Posting, term_posting_list: PostingList) -> float:
-        """
-        Compute the TF-IDF score for a term and a Posting (which represents a document in which that term is found in).
-        """
-        tf = 1 + math.log10(posting.term_frequency)
-        # length of the term's posting list is the document frequency of that term. Add one to it in case the length is zero to avoid division by zero.
-        idf = math.log10(self._num_docs / len(term_posting_list))
-        return tf * idf
-
-    def _compute_score(self, term_postings: dict[Term, PostingList], posting: Posting) -> float:
-        """
-        Term postings are a dictionary of all terms in the query and their corresponding posting lists.
-        Future optimization: only compute scores for postings that are in ALL term posting lists:
-        Essentially do a boolean retrieval first, then compute scores for the remaining postings.
-
-        Additionally, implements the soft conjunction heuristic. If the query has multiple terms, but several are not found in the document, don't include it.
-        The threshold for "several" is set to 3/4ths of the number of terms in the query.
-        """
-
-        query_len = len(term_postings)
-        num_terms = 0
-        score = 0
-        for term, posting_list in term_postings.items():
-            if len(posting_list) == 0:
-                continue
-            score += self._compute_tf_idf(term, posting, posting_list)
-            num_terms += 1
+    def _url(self, doc_id: int) -> str | None:
+        for segment in self._segments:
+            if segment.has_doc_id(doc_id):
+                return segment.url(doc_id)
+        return None
 
-        if num_terms <= query_len * 0.75:
-            return 0.0
+    def _search_term(self, term: Term) -> PostingList:
+        """Returns a list of postings for a given term, across the base index and all of its segments."""
+        posting_list = PostingList()
+        for segment in self._segments:
+            # segments hold increasing doc ID ranges, so appending keeps the list sorted
+            posting_list._postings.extend(segment.search_term(term))
+        return posting_list
+
+    def suggest(self, prefix: str, k: int = COMPLETIONS_K) -> list[str]:
+        """
+        Autocomplete: up to k (at most COMPLETIONS_K) index terms starting with prefix, by document frequency, most frequent first.
+        Index terms are stemmed, so the prefix is only lowercased, stemming a partial word would make no sense.
+        """
+        prefix = _lower(prefix.strip())
+        if not prefix:
+            return []
+        if len(self._segments) == 1:
+            return [term for term, _ in self._segments[0].suggest(prefix, k)]
 
-        return score
+        # a term's document frequency is spread over the segments, add it up for every term that's a top completion in any of them
+        candidates = {term for segment in self._segments
+                      for term, _ in segment.suggest(prefix, k)}
+        document_frequencies = {term: sum(segment.document_frequency(term) for segment in self._segments)
+                                for term in candidates}
+        return sorted(candidates, key=lambda term: (-document_frequencies[term], term))[:k]
 
-    def _retrieve(self, query: str) -> dict[Term, PostingList]:
+    def correct(self, term: str) -> Optional[str]:
+        """
+        Spelling correction for a (stemmed) query term the index doesn't have: of the index terms within max_edit_distance(term)
+        edits of it, the one with the fewest edits, and the highest document frequency of those. None if there isn't one.
+        """
+        max_distance = max_edit_distance(term)
+        if max_distance == 0:
+            return None
+        distances: dict[str, int] = {}
+        document_frequencies: dict[str, int] = {}
+        for segment in self._segments:
+            for candidate, distance, document_frequency in segment.fuzzy_matches(term, max_distance):
+                distances[candidate] = distance
+                document_frequencies[candidate] = document_frequencies.get(
+                    candidate, 0) + document_frequency
+        if not distances:
+            return None
+        return min(distances, key=lambda candidate: (distances[candidate], -document_frequencies[candidate], candidate))
+
+    def _wildcard_terms(self, prefix: str) -> list[str]:
+        """
+        Every index term starting with prefix (only lowercased, like for suggest), across segments. A prefix matching more than
+        WILDCARD_MAX_TERMS terms is cut down to the ones in the most documents, which is logged.
+        """
+        prefix = _lower(prefix.strip())
+        if not prefix:
+            return []
+        document_frequencies: dict[str, int] = {}
+        for segment in self._segments:
+            for term, document_frequency in segment.prefix_terms(prefix):
+                document_frequencies[term] = document_frequencies.get(
+                    term, 0) + document_frequency
+        if len(document_frequencies) > WILDCARD_MAX_TERMS:
+            engine_log.info(
+                f"Wildcard {prefix}* matches {len(document_frequencies)} terms, only searching the {WILDCARD_MAX_TERMS} in the most documents")
+            return heapq.nlargest(WILDCARD_MAX_TERMS, document_frequencies, key=lambda term: document_frequencies[term])
+        return list(document_frequencies)
+
+    def _search_wildcard(self, prefix: str) -> PostingList:
+        """
+        Posting list of a trailing wildcard query term (prefix*): the postings of every term starting with prefix (see
+        _wildcard_terms), as a single posting list, with term frequencies added up for documents that have several of them.
+        """
+        term_frequencies: dict[int, int] = {}
+        for term in self._wildcard_terms(prefix):
+            for posting in self._search_term(Term(term)):
+                term_frequencies[posting.doc_id] = term_frequencies.get(
+                    posting.doc_id, 0) + posting.term_frequency
+        posting_list = PostingList()
+        posting_list._postings = [Posting(doc_id, term_frequency)
+                                  for doc_id, term_frequency in sorted(term_frequencies.items())]
+        return posting_list
+
+    def _idf(self, term: str, document_frequency: int) -> float:
+        """
+        IDF of a query term, log10(N / df), with N the documents with postings and df the term's postings, both across segments
+        and counting deleted documents until a compaction drops them, so df is never more than N. Looked up in the term statistics
+        when the index is a single segment, which were computed the same way, otherwise computed once. Never negative.
+        """
+        if len(self._segments) == 1:
+            statistics = self._segments[0].term_statistics(term)
+            if statistics is not None:
+                return statistics[1]
+        return max(0.0, math.log10(self._num_scored_docs / document_frequency))
+
+    def _norm(self, doc_id: int) -> float:
+        for segment in self._segments:
+            if segment.has_doc_id(doc_id):
+                return segment.norm(doc_id)
+        return 0.0
+
+    def _parse_query(self, query: str, correct: bool = False) -> tuple[list[str], list[str], dict[str, str]]:
+        """
+        The wildcard prefixes of a query (words ending in *, see _search_wildcard), the rest of it tokenized and stemmed, and the
+        terms that were corrected. With correct, terms the index doesn't have are probably misspelled, and are replaced by the
+        closest one it does have (see correct), except ones with digits, which are more likely IDs or years than typos.
+        """
+        words = query.split()
+        wildcards = [word[:-1] for word in words if word.endswith("*") and len(word) > 1]
+        terms = []
+        corrections: dict[str, str] = {}
+        for term in tokenize(" ".join(word for word in words if not word.endswith("*")), self._stem_cache):
+            if correct and not any(c.isdigit() for c in term) and \
+                    not any(segment.document_frequency(term) for segment in self._segments):
+                corrected = self.correct(term)
+                if corrected is not None:
+                    engine_log.info(f"Corrected query term {term} to {corrected}")
+                    corrections[term] = corrected
+                    term = corrected
+            terms.append(term)
+        return wildcards, terms, corrections
+
+    def _retrieve(self, query: str, correct: bool = False) -> dict[Term, PostingList]:
         """
         Given a query string, return a dictionary mapping each term in the query to their entire posting lists.
         """
-        stemmed_terms = tokenize(query)
+        wildcards, terms, _ = self._parse_query(query, correct)
+        return self._search_query(wildcards, terms)
 
+    def _search_query(self, wildcards: list[str], terms: list[str]) -> dict[Term, PostingList]:
+        """Posting lists of the wildcard prefixes and terms of a parsed query (see _parse_query)."""
         posting_lists = {}
-        for term_str in stemmed_terms:
+        for prefix in wildcards:
+            posting_lists[Term(_lower(prefix) + "*")] = self._search_wildcard(prefix)
+        for term_str in terms:
             term = Term(term_str)
             posting_list = self._search_term(term)
-            posting_lists[Term] = posting_list
+            posting_lists[term] = posting_list
 
         return posting_lists
 
-    def ranked_retrieve(self, query: str) -> list[str | None]:
-        """
-        Given a query string, return a list of documents using TD-IDF ranked retrieval.
+    def ranked_retrieve(self, query: str, champions: bool = False,
+                        corrections: Optional[dict[str, str]] = None) -> list[str | None]:
         """
-        posting_lists = self._retrieve(query)
+        Given a query string, return a list of documents using TF-IDF ranked retrieval, cosine normalized: a document's score is
+        the sum of IDF * tf_weight over the query terms it has, divided by its norm. IDFs and norms are looked up, not computed.
 
-        # to get all documents that could potentially match the query, we need to flatten posting_lists
-        all_postings = [
-            posting
-            for posting_list in posting_lists.values()
-            for posting in posting_list
-        ]
+        Scores are accumulated term at a time, one posting list after the other. Implements the soft conjunction heuristic: if the
+        query has multiple terms and a document doesn't have more than 3/4ths of them, its score is 0.
 
-        results: list[tuple[int, float]] = []
-        for posting in all_postings:
-            score = self._compute_score(posting_lists, posting)
-            results.append((posting.doc_id, score))
+        With champions, only the documents in the champion lists of the query terms are scored first (see _champion_retrieve),
+        and the full posting lists only if that doesn't find enough of them. Queries with wildcards always use the full lists.
 
-        # sort results by score in descending order
-        results.sort(key=lambda x: x[1], reverse=True)
-        # print(results[:5])
+        Given a corrections dict, misspelled query terms are corrected (see _parse_query), and each correction is added to it,
+        from the stem of the query term to the index term it was replaced by, so the caller can show what was searched instead.
+        """
+        wildcards, terms, corrected = self._parse_query(query, correct=corrections is not None)
+        if corrections is not None:
+            corrections.update(corrected)
+        if champions and not wildcards:
+            doc_ids = self._champion_retrieve(terms)
+            if doc_ids is not None:
+                return [self._url(doc_id) for doc_id in doc_ids]
+
+        posting_lists = self._search_query(wildcards, terms)
+        query_len = len(posting_lists)
+
+        scores: dict[int, float] = {}
+        num_terms: dict[int, int] = {}
+        for term, posting_list in posting_lists.items():
+            if len(posting_list) == 0:
+                continue
+            idf = self._idf(term.term, len(posting_list))
+            for posting in posting_list:
+                scores[posting.doc_id] = scores.get(posting.doc_id, 0.0) + idf * tf_weight(posting.term_frequency)
+                num_terms[posting.doc_id] = num_terms.get(posting.doc_id, 0) + 1
+
+        # a single segment's norms are looked up directly, and tombstones only checked if there are any
+        norm = self._segments[0].norm if len(self._segments) == 1 else self._norm
+        min_terms = query_len * 0.75
+        results = []
+        for doc_id, score in scores.items():
+            if self._deleted and doc_id in self._deleted:
+                continue
+            doc_norm = norm(doc_id)
+            results.append((doc_id, score / doc_norm if doc_norm and num_terms[doc_id] > min_terms else 0.0))
 
-        return [self._doc_id_to_url.get(result[0]) for result in results[:5]]
+        # only the top 5 URLs are looked up
+        return [self._url(doc_id) for doc_id, _ in heapq.nlargest(5, results, key=lambda result: result[1])]
+
+    def _champion_retrieve(self, terms: list[str], k: int = 5) -> Optional[list[int]]:
+        """
+        Top k doc IDs of a query without wildcards, out of the documents in the champion lists of its terms only: the ones each
+        term adds the most score to. Candidates are scored exactly, with posting list cursors skipping to them, so the full lists
+        are only decoded around them. A document in none of the champion lists is never scored, so results can differ from
+        ranked_retrieve over the full lists. None if fewer than k candidates make the soft conjunction cut.
+        """
+        # the same terms as the keys of _search_query's posting lists
+        terms = list(dict.fromkeys(terms))
+        min_terms = len(terms) * 0.75
+        idfs = {}
+        for term in terms:
+            document_frequency = sum(segment.document_frequency(term) for segment in self._segments)
+            if document_frequency:
+                idfs[term] = self._idf(term, document_frequency)
+
+        results: list[tuple[int, float]] = []
+        for segment in self._segments:
+            candidates: set[int] = set()
+            for term in idfs:
+                candidates.update(segment.champions(term) or ())
+            # sorted, cursors only go forward
+            doc_ids = sorted(doc_id for doc_id in candidates if not self._deleted or doc_id not in self._deleted)
+
+            scores: dict[int, float] = {}
+            num_terms: dict[int, int] = {}
+            for term, idf in idfs.items():
+                cursor = segment.cursor(Term(term))
+                if cursor is None:
+                    continue
+                for doc_id in doc_ids:
+                    posting = cursor.advance_to(doc_id)
+                    if posting is None:
+                        break
+                    if posting.doc_id == doc_id:
+                        scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf_weight(posting.term_frequency)
+                        num_terms[doc_id] = num_terms.get(doc_id, 0) + 1
+
+            for doc_id, score in scores.items():
+                norm = segment.norm(doc_id)
+                if norm and num_terms[doc_id] > min_terms:
+                    results.append((doc_id, score / norm))
+
+        if len(results) < k:
+            return None
+        return [doc_id for doc_id, _ in heapq.nlargest(k, results, key=lambda result: result[1])]
 
     def bool_retrieve(self, query: str) -> list[str | None]:
         """
         Given a query string, return a list of documents using boolean retrieval.
+        Posting lists are intersected with cursors (see intersect), segment by segment, rarest term first, so the longer lists
+        only decode the blocks that can have the doc IDs of the shorter ones. Stops at the first 5 matches.
         """
-        # for boolean retrieval, we don't need to care about the actual terms themselves, just posting lists
-        posting_lists = list(self._retrieve(query).values())
-
-        # optimization: if any of the posting lists are empty, then boolean retrieval should return no results
-        if not all(posting_lists):
+        wildcards, terms, _ = self._parse_query(query)
+        if not wildcards and not terms:
             return []
-
-        result_doc_ids = set(
-            posting.doc_id for posting in posting_lists[0])
-
-        # intersect with the document IDs from the remaining posting lists
-        for i in range(1, len(posting_lists)):
-            next_doc_ids = set(
-                posting.doc_id for posting in posting_lists[i])
-            # updates set in place to contain only common elements
-            result_doc_ids.intersection_update(next_doc_ids)
-
-        # at this point result_doc_ids is a set of doc_ids that contain all terms in the query
-
-        # convert doc_ids to urls
-        retrieved_urls = [self._doc_id_to_url.get(
-            doc_id) for doc_id in sorted(list(result_doc_ids))]
-
-        return retrieved_urls[:5]  # return top 5
+        # wildcards match several terms, their posting lists are made on the spot anyway
+        wildcard_doc_ids = [{posting.doc_id for posting in self._search_wildcard(prefix)} for prefix in wildcards]
+        wildcard_doc_ids.sort(key=len)
+
+        def matches() -> Iterator[int]:
+            if not terms:
+                yield from sorted(set.intersection(*wildcard_doc_ids))
+                return
+            for segment in self._segments:
+                cursors = [segment.cursor(Term(term)) for term in terms]
+                # a term missing from a segment means no document of it has them all
+                if any(cursor is None for cursor in cursors):
+                    continue
+                cursors.sort(key=len)
+                for doc_id in intersect(cursors):
+                    if all(doc_id in doc_ids for doc_ids in wildcard_doc_ids):
+                        yield doc_id
+
+        # only the top 5 URLs are looked up
+        doc_ids = itertools.islice((doc_id for doc_id in matches() if doc_id not in self._deleted), 5)
+        return [self._url(doc_id) for doc_id in doc_ids]
+
+    def stem_cache_stats(self) -> dict[str, float]:
+        """Hits, misses and hit rate of the query stem cache, for sizing STEM_CACHE_SIZE."""
+        return {
+            'size': len(self._stem_cache),
+            'hits': self._stem_cache.hits,
+            'misses': self._stem_cache.misses,
+            'hit_rate': self._stem_cache.hit_rate(),
+        }
 
     def __str__(self):
-        return f"<InvertedIndex stored at {self._index_dir} | {self._num_docs} documents>"
+        return f"<InvertedIndex stored at {self._index_dir} | {self._num_docs} documents, {len(self._deleted)} deleted>"
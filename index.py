@@ -1,10 +1,26 @@
 from index import Indexer
+from index.compactor import IndexCompactor
+from index.tombstones import delete_urls
 from utils import load_config
+import argparse
 import os
 from pathlib import Path
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the inverted index from WEBPAGES_DIR.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="add pages that aren't indexed yet to the existing index in INDEX_DIR as a new segment, instead of building from scratch")
+    parser.add_argument("--update", action="store_true",
+                        help="with --incremental, index already indexed pages again and tombstone their old documents")
+    parser.add_argument("--delete", nargs="+", metavar="URL",
+                        help="tombstone the pages with these URLs instead of building")
+    parser.add_argument("--compact", action="store_true",
+                        help="merge every segment into the base index and purge deleted documents, instead of building")
+    parser.add_argument("--resume", action="store_true",
+                        help="carry on with an interrupted build from its last checkpoint in PARTIAL_INDEX_DIR")
+    args = parser.parse_args()
+
     load_config()  # must be called to load critical environment variables
 
     webpages_dir = os.environ.get("WEBPAGES_DIR")
@@ -13,11 +29,45 @@ def main() -> None:
     assert partial_index_dir
     index_dir = os.environ.get("INDEX_DIR")
     assert index_dir
+    merge_fan_in = int(os.environ.get("MERGE_FAN_IN", "64"))
+    champion_list_size = int(os.environ.get("CHAMPION_LIST_SIZE", "64"))
+
+    if args.delete:
+        missing = delete_urls(Path(index_dir), args.delete)
+        for url in missing:
+            print(f"Not in the index: {url}")
+        return
+    if args.compact:
+        IndexCompactor(Path(partial_index_dir), Path(index_dir),
+                       merge_fan_in=merge_fan_in, champion_list_size=champion_list_size).compact()
+        return
+
+    num_workers = int(os.environ.get("NUM_WORKERS", "1"))
+    stem_cache_size = int(os.environ.get("STEM_CACHE_SIZE", str(2 ** 17)))
+    duplicate_detection = os.environ.get("DUPLICATE_DETECTION", "none")
+    simhash_distance = int(os.environ.get("SIMHASH_DISTANCE", "3"))
+    html_parser = os.environ.get("HTML_PARSER", "html.parser")
+    memory_budget = int(os.environ.get("PARTIAL_INDEX_MEMORY_MB", "256")) * 2 ** 20
+    max_pending_runs = int(os.environ.get("MAX_PENDING_RUNS", "2"))
+    anchor_text = os.environ.get("ANCHOR_TEXT", "false").lower() == "true"
 
     indexer = Indexer(
         Path(webpages_dir),
         Path(partial_index_dir),
-        Path(index_dir)
+        Path(index_dir),
+        num_workers=num_workers,
+        stem_cache_size=stem_cache_size,
+        duplicate_detection=duplicate_detection,
+        simhash_distance=simhash_distance,
+        html_parser=html_parser,
+        memory_budget=memory_budget,
+        max_pending_runs=max_pending_runs,
+        incremental=args.incremental,
+        update=args.update,
+        resume=args.resume,
+        anchor_text=anchor_text,
+        merge_fan_in=merge_fan_in,
+        champion_list_size=champion_list_size
     )
     indexer.construct()
 
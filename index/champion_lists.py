@@ -0,0 +1,94 @@
+from index.partial_index.partial_index import PartialIndexResource
+from index.term_statistics import DocNorms, tf_weight
+from index.varint import decode_varint, decode_varints, encode_varint
+from pathlib import Path
+from typing import Optional
+import heapq
+import itertools
+import mmap
+import struct
+
+CHAMPION_LISTS_FILE_NAME = "champions.bin"
+# postings kept in a term's champion list, the r of top-r
+CHAMPION_LIST_SIZE = 64
+
+# magic, number of champion lists, champion list size
+_HEADER_FORMAT = "<4sII"
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+_MAGIC = b"CHM1"
+# term ordinal and offset of its champion list, sorted by ordinal
+_ENTRY_FORMAT = "<IQ"
+_ENTRY_SIZE = struct.calcsize(_ENTRY_FORMAT)
+
+
+def write_champion_lists(index_fp: Path, doc_norms_fp: Path, path: Path, size: int = CHAMPION_LIST_SIZE) -> None:
+    """
+    Write the champion list of every term of a merged inverted index that's in more than size documents: the doc IDs of the size
+    postings with the highest impact, tf_weight / norm, highest first. A term's IDF is the same in all of its documents, so they're
+    the documents it adds the most score to. Terms in fewer documents don't get one, their whole posting list is short already.
+    Only the posting lists that get a champion list are decoded, the rest are skipped by their header.
+    """
+    doc_norms = DocNorms(doc_norms_fp)
+    entries = bytearray()
+    blob = bytearray()
+    num_lists = 0
+    with PartialIndexResource(index_fp) as resource:
+        for ordinal, (_, record, _, (num_postings, _, start, end)) in enumerate(resource.read_raw_items()):
+            if num_postings <= size:
+                continue
+            values = decode_varints(record[start:end])
+            impacts = ((tf_weight(term_frequency) / norm if (norm := doc_norms.norm(doc_id)) else 0.0, doc_id)
+                       for doc_id, term_frequency in zip(itertools.accumulate(values[0::2]), values[1::2]))
+            entries += struct.pack(_ENTRY_FORMAT, ordinal, len(blob))
+            encode_varint(size, blob)
+            # ties go to the lower doc ID
+            for _, doc_id in heapq.nlargest(size, impacts, key=lambda impact: (impact[0], -impact[1])):
+                encode_varint(doc_id, blob)
+            num_lists += 1
+
+    with open(path, 'wb') as f:
+        f.write(struct.pack(_HEADER_FORMAT, _MAGIC, num_lists, size))
+        f.write(entries)
+        f.write(blob)
+
+
+class ChampionLists:
+    """Read side of a champion list file, memory mapped. Terms are looked up by ordinal (see TermDictionary.find)."""
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._num_lists, self.size = struct.unpack_from(
+            _HEADER_FORMAT, self._mmap, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} isn't a champion list file.")
+        self._blob_start = _HEADER_SIZE + self._num_lists * _ENTRY_SIZE
+
+    def __len__(self) -> int:
+        return self._num_lists
+
+    def get(self, ordinal: int) -> Optional[list[int]]:
+        """Doc IDs of the champion list of the term with the given ordinal, highest impact first. None if it doesn't have one."""
+        low, high = 0, self._num_lists
+        while low < high:
+            mid = (low + high) // 2
+            mid_ordinal, offset = struct.unpack_from(_ENTRY_FORMAT, self._mmap, _HEADER_SIZE + mid * _ENTRY_SIZE)
+            if mid_ordinal < ordinal:
+                low = mid + 1
+            elif mid_ordinal > ordinal:
+                high = mid
+            else:
+                num_doc_ids, pos = decode_varint(self._mmap, self._blob_start + offset)
+                doc_ids = []
+                for _ in range(num_doc_ids):
+                    doc_id, pos = decode_varint(self._mmap, pos)
+                    doc_ids.append(doc_id)
+                return doc_ids
+        return None
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __str__(self) -> str:
+        return f"<ChampionLists at {self._path} | {self._num_lists} lists of {self.size} documents>"
@@ -0,0 +1,69 @@
+from index.partial_index import PartialIndexMerger
+from index.champion_lists import CHAMPION_LIST_SIZE
+from index.segments import SEGMENTS_DIR_NAME, segment_dirs
+from index.tombstones import TOMBSTONES_FILE_NAME, Tombstones
+from index.url_store import URL_STORE_FILE_NAME, UrlStore, write_url_store
+from utils import index_log
+from pathlib import Path
+import shutil
+import time
+
+
+class IndexCompactor:
+    """
+    Folds every segment of an index back into the base index, and physically drops the postings of deleted documents.
+
+    Every segment's inverted_index.bin is already a sorted run, so compaction is just a merge of them with a tombstone purge.
+    Doc IDs aren't renumbered, deleted ones simply stop showing up anywhere, after which the tombstones are cleared.
+    """
+
+    def __init__(self, partial_index_dir: Path, index_dir: Path, merge_fan_in: int = 64,
+                 champion_list_size: int = CHAMPION_LIST_SIZE) -> None:
+        if not (index_dir / "inverted_index.bin").exists():
+            raise ValueError(
+                f"Compaction needs an existing inverted index in {index_dir}.")
+        if partial_index_dir.is_dir() and any(partial_index_dir.iterdir()):
+            raise ValueError(f"Partial index directory must be empty.")
+        partial_index_dir.mkdir(exist_ok=True)
+
+        self._partial_index_dir = partial_index_dir
+        self._index_dir = index_dir
+        self._merge_fan_in = merge_fan_in
+        self._champion_list_size = champion_list_size
+        # the compacted index is put together here, and only moved over the old one once it's complete
+        self._compacted_dir = index_dir / "compacting"
+
+    def compact(self) -> None:
+        start = time.time()
+        tombstones = Tombstones.load(self._index_dir)
+        segments = [self._index_dir] + segment_dirs(self._index_dir)
+        index_log.info(
+            f"Compacting {len(segments)} segment(s) of {self._index_dir}, purging {len(tombstones)} deleted document(s)")
+
+        # copies, not moves, so the index is untouched if compaction dies halfway
+        doc_id_map: dict[int, str] = {}
+        for i, segment in enumerate(segments):
+            shutil.copyfile(segment / "inverted_index.bin",
+                            self._partial_index_dir / f"segment_{i:03}.bin")
+            url_store = UrlStore(segment / URL_STORE_FILE_NAME)
+            for doc_id, url in url_store.items():
+                if doc_id not in tombstones:
+                    doc_id_map[doc_id] = url
+            url_store.close()
+
+        if self._compacted_dir.exists():
+            shutil.rmtree(self._compacted_dir)
+        self._compacted_dir.mkdir()
+        PartialIndexMerger(self._partial_index_dir, self._compacted_dir,
+                           tombstones, fan_in=self._merge_fan_in, champion_list_size=self._champion_list_size).merge()
+        write_url_store(self._compacted_dir / URL_STORE_FILE_NAME, doc_id_map)
+
+        # swap the compacted index in. the stem cache table stays where it is
+        shutil.rmtree(self._index_dir / SEGMENTS_DIR_NAME, ignore_errors=True)
+        (self._index_dir / TOMBSTONES_FILE_NAME).unlink(missing_ok=True)
+        for path in self._compacted_dir.iterdir():
+            path.replace(self._index_dir / path.name)
+        self._compacted_dir.rmdir()
+
+        index_log.info(
+            f"Compacted {self._index_dir} to {len(doc_id_map)} documents in {(time.time() - start):.2f}s")
@@ -0,0 +1,135 @@
+from index.term_dictionary import TermDictionary
+from index.varint import decode_varint, encode_varint
+from pathlib import Path
+from typing import Optional
+import heapq
+import mmap
+import struct
+
+COMPLETIONS_FILE_NAME = "completions.bin"
+
+# magic, number of prefixes, completions per prefix
+_HEADER_FORMAT = "<4sII"
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+_MAGIC = b"CMP2"
+_OFFSET_FORMAT = "<Q"
+_OFFSET_SIZE = struct.calcsize(_OFFSET_FORMAT)
+# completions stored per prefix, the most a suggestion can return
+COMPLETIONS_K = 10
+# prefixes of at most this many terms aren't stored, scanning their terms in the term dictionary is about as fast
+COMPLETIONS_MAX_SCAN = 64
+
+
+def write_completions(path: Path, dictionary: TermDictionary, k: int = COMPLETIONS_K, max_scan: int = COMPLETIONS_MAX_SCAN) -> None:
+    """
+    Precompute the k terms with the highest document frequency for every prefix of more than max_scan terms of dictionary,
+    and write them as a completions table next to it. Completions are stored as the terms themselves with their document
+    frequencies, not as term ordinals, so a suggestion doesn't decode a dictionary block per completion.
+
+    Terms with a common prefix are a range of the sorted dictionary, so prefixes are found by splitting ranges on the next
+    character, only as deep as ranges stay larger than max_scan.
+    """
+    terms = []
+    document_frequencies = []
+    for term, _, document_frequency in dictionary.entries():
+        terms.append(term)
+        document_frequencies.append(document_frequency)
+
+    table: list[tuple[str, list[int]]] = []
+
+    def visit(start: int, end: int, depth: int) -> None:
+        # terms[start:end] are all the terms starting with terms[start][:depth]
+        if end - start <= max_scan:
+            return
+        if depth > 0:
+            table.append((terms[start][:depth], heapq.nlargest(
+                k, range(start, end), key=document_frequencies.__getitem__)))
+        i = start
+        while i < end:
+            if len(terms[i]) <= depth:
+                # the prefix itself
+                i += 1
+                continue
+            char = terms[i][depth]
+            j = i + 1
+            while j < end and terms[j][depth] == char:
+                j += 1
+            visit(i, j, depth + 1)
+            i = j
+
+    visit(0, len(terms), 0)
+
+    blob = bytearray()
+    offsets = []
+    for prefix, ordinals in table:
+        offsets.append(len(blob))
+        encoded = prefix.encode("utf-8")
+        encode_varint(len(encoded), blob)
+        blob += encoded
+        encode_varint(len(ordinals), blob)
+        for ordinal in ordinals:
+            encoded = terms[ordinal].encode("utf-8")
+            encode_varint(len(encoded), blob)
+            blob += encoded
+            encode_varint(document_frequencies[ordinal], blob)
+
+    with open(path, 'wb') as f:
+        f.write(struct.pack(_HEADER_FORMAT, _MAGIC, len(table), k))
+        f.write(b''.join(struct.pack(_OFFSET_FORMAT, offset)
+                for offset in offsets))
+        f.write(blob)
+
+
+class Completions:
+    """
+    Read side of a completions table. Memory mapped, and prefixes are binary searched right in the mapping, they're in sorted order
+    since write_completions finds them depth first.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._num_prefixes, self.k = struct.unpack_from(
+            _HEADER_FORMAT, self._mmap, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} isn't a completions table.")
+        self._blob_start = _HEADER_SIZE + self._num_prefixes * _OFFSET_SIZE
+
+    def __len__(self) -> int:
+        return self._num_prefixes
+
+    def _prefix_at(self, i: int) -> tuple[bytes, int]:
+        """The i-th prefix, and the position right after it."""
+        pos = self._blob_start + struct.unpack_from(
+            _OFFSET_FORMAT, self._mmap, _HEADER_SIZE + i * _OFFSET_SIZE)[0]
+        length, pos = decode_varint(self._mmap, pos)
+        return self._mmap[pos:pos + length], pos + length
+
+    def get(self, prefix: str) -> Optional[list[tuple[str, int]]]:
+        """Completions of prefix with their document frequencies, most frequent first. None if the prefix isn't stored."""
+        encoded = prefix.encode("utf-8")
+        low, high = 0, self._num_prefixes
+        while low < high:
+            mid = (low + high) // 2
+            mid_prefix, pos = self._prefix_at(mid)
+            if mid_prefix < encoded:
+                low = mid + 1
+            elif mid_prefix > encoded:
+                high = mid
+            else:
+                count, pos = decode_varint(self._mmap, pos)
+                completions = []
+                for _ in range(count):
+                    length, pos = decode_varint(self._mmap, pos)
+                    term = self._mmap[pos:pos + length].decode("utf-8")
+                    document_frequency, pos = decode_varint(self._mmap, pos + length)
+                    completions.append((term, document_frequency))
+                return completions
+        return None
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __str__(self) -> str:
+        return f"<Completions at {self._path} | {self._num_prefixes} prefixes, {self.k} completions each>"
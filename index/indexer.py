@@ -1,7 +1,13 @@
 from index.partial_index import PartialIndexBuilder, PartialIndexMerger
+from index.partial_index.partial_index_builder import CHECKPOINT_FILE_NAME, DOCUMENT_LOG_FILE_NAME
+from index.champion_lists import CHAMPION_LIST_SIZE
+from index.segments import load_indexed_urls, next_segment_dir, segment_dirs
+from index.tombstones import Tombstones
+from index.url_store import URL_STORE_FILE_NAME, UrlStore
 from utils import index_log
 from bs4 import XMLParsedAsHTMLWarning, MarkupResemblesLocatorWarning
 from pathlib import Path
+import shutil
 import warnings
 import time
 
@@ -12,34 +18,93 @@ warnings.filterwarnings("ignore", category=MarkupResemblesLocatorWarning)
 class Indexer:
     """
     Indexes a directory of webpages downloaded from project specifications.
-    Stores partial indexes to disk, the polyphase merges them at the end.
+    Stores partial indexes to disk, then k-way merges them at the end.
+
+    With incremental set, index_dir must already hold an inverted index. Only pages whose URLs aren't in it yet are indexed,
+    and they're merged into a new segment under index_dir/segments/ instead, which InvertedIndex queries along with the base index.
+    With update set as well, pages that are already indexed are indexed again, and their old documents are tombstoned.
+
+    With resume set, picks an interrupted build back up from the checkpoint the builder left in partial_index_dir.
 
     This class should be a singleton; it will only be created and constructed once per program execution.
     """
 
-    def __init__(self, webpages_dir: Path, partial_index_dir: Path, index_dir: Path) -> None:
+    def __init__(self, webpages_dir: Path, partial_index_dir: Path, index_dir: Path, num_workers: int = 1, stem_cache_size: int = 2 ** 17,
+                 duplicate_detection: str = "none", simhash_distance: int = 3, html_parser: str = 'html.parser',
+                 memory_budget: int = 256 * 2 ** 20, max_pending_runs: int = 2, incremental: bool = False,
+                 update: bool = False, resume: bool = False, anchor_text: bool = False, merge_fan_in: int = 64,
+                 champion_list_size: int = CHAMPION_LIST_SIZE) -> None:
         # validate directories
         if not webpages_dir.is_dir():
             raise ValueError(
                 f"Webpages directory {webpages_dir} is not a valid directory.")
-        if partial_index_dir.is_dir() and partial_index_dir.exists() and any(partial_index_dir.iterdir()):
+        # a resumed build's own runs and checkpoint are in there
+        if not resume and partial_index_dir.is_dir() and partial_index_dir.exists() and any(partial_index_dir.iterdir()):
             raise ValueError(
                 f"Partial index directory must be empty.")
         partial_index_dir.mkdir(exist_ok=True)
-        if index_dir.is_dir() and index_dir.exists() and any(index_dir.iterdir()):
-            raise ValueError(f"Inverted Index directory must be empty.")
-        index_dir.mkdir(exist_ok=True)
+        if update and not incremental:
+            raise ValueError(f"Updating pages is only possible in an incremental build.")
+        if incremental:
+            if not (index_dir / "inverted_index.bin").exists():
+                raise ValueError(
+                    f"Incremental indexing needs an existing inverted index in {index_dir}.")
+        else:
+            if not resume and index_dir.is_dir() and index_dir.exists() and any(index_dir.iterdir()):
+                raise ValueError(f"Inverted Index directory must be empty.")
+            index_dir.mkdir(exist_ok=True)
 
         self._webpages_dir = webpages_dir
         self._partial_index_dir = partial_index_dir
         self._index_dir = index_dir
+        self._num_workers = num_workers
+        self._stem_cache_size = stem_cache_size
+        self._duplicate_detection = duplicate_detection
+        self._simhash_distance = simhash_distance
+        self._html_parser = html_parser
+        self._memory_budget = memory_budget
+        self._max_pending_runs = max_pending_runs
+        self._anchor_text = anchor_text
+        self._merge_fan_in = merge_fan_in
+        self._champion_list_size = champion_list_size
+
+        # where the builder and merger put their output, the index itself or a new segment of it
+        self._incremental = incremental
+        self._update = update
+        # URL to doc ID of live documents already in the index, filled in by an incremental build
+        self._known_urls: dict[str, int] = {}
+        self._output_dir = next_segment_dir(index_dir) if incremental else index_dir
+        self._resume = resume
+        if resume and incremental:
+            # the interrupted build's segment, unless it never got as far as creating one
+            segments = segment_dirs(index_dir)
+            if segments and not (segments[-1] / "inverted_index.bin").exists():
+                self._output_dir = segments[-1]
 
     def _build_partial_indexes(self) -> None:
         """Constructs partial indexes from a directory of webpages."""
         index_log.info(f"Building partial indexes from {self._webpages_dir}")
+        first_doc_id = 0
+        known_urls = None
+        if self._incremental:
+            indexed_urls = load_indexed_urls(self._index_dir)
+            # deleted doc IDs are never handed out again, but their URLs can be indexed again
+            first_doc_id = max(indexed_urls.values(), default=-1) + 1
+            tombstones = Tombstones.load(self._index_dir)
+            self._known_urls = {url: doc_id for url, doc_id in indexed_urls.items()
+                                if doc_id not in tombstones}
+            # when updating, known pages aren't skipped, their old documents are tombstoned once the segment is done
+            known_urls = None if self._update else self._known_urls
+            self._output_dir.mkdir(parents=True, exist_ok=self._resume)
+            index_log.info(
+                f"Incremental build into {self._output_dir}: {len(self._known_urls)} documents already indexed, doc IDs start at {first_doc_id}")
+
         builder = PartialIndexBuilder(
-            self._webpages_dir, self._partial_index_dir, self._index_dir)
-        builder.build()
+            self._webpages_dir, self._partial_index_dir, self._output_dir, num_workers=self._num_workers, stem_cache_size=self._stem_cache_size,
+            duplicate_detection=self._duplicate_detection, simhash_distance=self._simhash_distance, html_parser=self._html_parser,
+            memory_budget=self._memory_budget, max_pending_runs=self._max_pending_runs, first_doc_id=first_doc_id, known_urls=known_urls,
+            anchor_text=self._anchor_text)
+        builder.build(resume=self._resume)
 
     def _merge_partial_indexes(self) -> None:
         """
@@ -49,9 +114,33 @@ class Indexer:
         """
         index_log.info(
             f"Merging partial indexes from {self._partial_index_dir}")
-        merger = PartialIndexMerger(self._partial_index_dir, self._index_dir)
+        # anchor runs have postings for the same documents as the regular runs
+        merger = PartialIndexMerger(
+            self._partial_index_dir, self._output_dir, sum_duplicates=self._anchor_text,
+            fan_in=self._merge_fan_in, num_workers=self._num_workers, champion_list_size=self._champion_list_size)
         merger.merge()
 
+        if self._update:
+            self._tombstone_replaced_documents()
+        # the build is done with, nothing left to resume
+        (self._partial_index_dir / CHECKPOINT_FILE_NAME).unlink(missing_ok=True)
+        (self._partial_index_dir / DOCUMENT_LOG_FILE_NAME).unlink(missing_ok=True)
+
+    def _tombstone_replaced_documents(self) -> None:
+        """Tombstone the old documents of pages this build indexed again."""
+        url_store = UrlStore(self._output_dir / URL_STORE_FILE_NAME)
+        new_urls = [url for _, url in url_store.items()]
+        url_store.close()
+        tombstones = Tombstones.load(self._index_dir)
+        num_replaced = 0
+        for url in new_urls:
+            if url in self._known_urls:
+                tombstones.add(self._known_urls[url])
+                num_replaced += 1
+        tombstones.save(self._index_dir)
+        index_log.info(
+            f"Updated {num_replaced} already indexed page(s), {tombstones}")
+
     def construct(self) -> None:
         """Construct a full inverted index from a collection of webpages specified in the constructor."""
         index_log.info(f"Indexing documents from {self._webpages_dir}")
@@ -73,6 +162,16 @@ class Indexer:
         print(summary)
         index_log.info(summary)
 
+        if self._incremental and not any(self._partial_index_dir.glob("*.bin")):
+            # nothing new was crawled, an empty segment isn't worth keeping around
+            index_log.info(
+                f"No new documents in {self._webpages_dir}, not adding a segment")
+            shutil.rmtree(self._output_dir)
+            (self._partial_index_dir / CHECKPOINT_FILE_NAME).unlink(missing_ok=True)
+            (self._partial_index_dir / DOCUMENT_LOG_FILE_NAME).unlink(missing_ok=True)
+            print("-"*80)
+            return
+
         merge_start_time = time.time()
         self._merge_partial_indexes()
         merge_finish_time = time.time()
@@ -0,0 +1,152 @@
+from index.term_dictionary import TermDictionary
+from index.varint import decode_varint, decode_varints, encode_varint
+from collections import Counter
+from pathlib import Path
+from typing import Sequence
+import itertools
+import mmap
+import struct
+
+KGRAM_INDEX_FILE_NAME = "kgrams.bin"
+
+# magic, number of k-grams, number of terms
+_HEADER_FORMAT = "<4sII"
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+_MAGIC = b"KGR1"
+_OFFSET_FORMAT = "<Q"
+_OFFSET_SIZE = struct.calcsize(_OFFSET_FORMAT)
+# bigrams. terms are wrapped in _BOUNDARY, so their first and last characters get k-grams of their own
+KGRAM_SIZE = 2
+_BOUNDARY = "$"
+# term lengths are stored in a byte
+_MAX_LENGTH = 255
+# most edits a query term is corrected by. terms of up to 4 characters only get one, and ones shorter than 3 none at all
+FUZZY_MAX_EDIT_DISTANCE = 2
+
+
+def kgrams(term: str) -> set[str]:
+    """The distinct k-grams of term."""
+    padded = _BOUNDARY + term + _BOUNDARY
+    return {padded[i:i + KGRAM_SIZE] for i in range(len(padded) - KGRAM_SIZE + 1)}
+
+
+def max_edit_distance(term: str) -> int:
+    """Most edits term can be corrected by. Short terms are a couple of edits away from too many others to guess."""
+    if len(term) < 3:
+        return 0
+    if len(term) <= 4:
+        return 1
+    return FUZZY_MAX_EDIT_DISTANCE
+
+
+def edit_distance(a: str, b: str, bound: int) -> int:
+    """Levenshtein distance between a and b, or bound + 1 as soon as it's sure to be more than bound."""
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        if min(current) > bound:
+            return bound + 1
+        previous = current
+    return min(previous[-1], bound + 1)
+
+
+def write_kgram_index(path: Path, dictionary: TermDictionary) -> None:
+    """
+    Write a k-gram index of the terms of dictionary next to it: for every k-gram, the ordinals of the terms that have it, plus the
+    length of every term. Ordinals are stored as gaps, as varints, like doc IDs in posting lists.
+    """
+    postings: dict[str, list[int]] = {}
+    lengths = bytearray()
+    for ordinal, (term, _, _) in enumerate(dictionary.entries()):
+        lengths.append(min(len(term), _MAX_LENGTH))
+        for kgram in kgrams(term):
+            postings.setdefault(kgram, []).append(ordinal)
+
+    blob = bytearray()
+    offsets = []
+    # code point order is UTF-8 order, which the reader binary searches in
+    for kgram in sorted(postings):
+        offsets.append(len(blob))
+        encoded = kgram.encode("utf-8")
+        encode_varint(len(encoded), blob)
+        blob += encoded
+        gaps = bytearray()
+        previous = 0
+        for ordinal in postings[kgram]:
+            encode_varint(ordinal - previous, gaps)
+            previous = ordinal
+        encode_varint(len(gaps), blob)
+        blob += gaps
+
+    with open(path, 'wb') as f:
+        f.write(struct.pack(_HEADER_FORMAT, _MAGIC, len(offsets), len(lengths)))
+        f.write(lengths)
+        f.write(b''.join(struct.pack(_OFFSET_FORMAT, offset)
+                for offset in offsets))
+        f.write(blob)
+
+
+class KGramIndex:
+    """
+    Read side of a k-gram index, for finding the terms close to a misspelled one without comparing it to every term. Memory
+    mapped, and k-grams are binary searched right in the mapping like prefixes in a completions table.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._num_kgrams, self._num_terms = struct.unpack_from(
+            _HEADER_FORMAT, self._mmap, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} isn't a k-gram index.")
+        self._offsets_start = _HEADER_SIZE + self._num_terms
+        self._blob_start = self._offsets_start + self._num_kgrams * _OFFSET_SIZE
+
+    def __len__(self) -> int:
+        return self._num_kgrams
+
+    def _ordinals(self, kgram: str) -> Sequence[int]:
+        """Gaps between the ordinals of the terms that have kgram, empty if none do."""
+        encoded = kgram.encode("utf-8")
+        low, high = 0, self._num_kgrams
+        while low < high:
+            mid = (low + high) // 2
+            pos = self._blob_start + struct.unpack_from(
+                _OFFSET_FORMAT, self._mmap, self._offsets_start + mid * _OFFSET_SIZE)[0]
+            length, pos = decode_varint(self._mmap, pos)
+            mid_kgram = self._mmap[pos:pos + length]
+            if mid_kgram < encoded:
+                low = mid + 1
+            elif mid_kgram > encoded:
+                high = mid
+            else:
+                size, pos = decode_varint(self._mmap, pos + length)
+                return decode_varints(self._mmap[pos:pos + size])
+        return ()
+
+    def candidates(self, term: str, max_distance: int) -> list[int]:
+        """
+        Ordinals of the terms that can be within max_distance edits of term, in no particular order. An edit changes at most
+        KGRAM_SIZE k-grams, so a term can only be that close if it shares all but KGRAM_SIZE * max_distance of the k-grams of term,
+        and if its length is within max_distance of term's. Candidates still have to be compared to term (see edit_distance).
+        """
+        term_kgrams = kgrams(term)
+        counts: Counter[int] = Counter()
+        for kgram in term_kgrams:
+            counts.update(itertools.accumulate(self._ordinals(kgram)))
+        min_shared = len(term_kgrams) - KGRAM_SIZE * max_distance
+        length = min(len(term), _MAX_LENGTH)
+        return [ordinal for ordinal, shared in counts.items()
+                if shared >= min_shared and abs(self._mmap[_HEADER_SIZE + ordinal] - length) <= max_distance]
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __str__(self) -> str:
+        return f"<KGramIndex at {self._path} | {self._num_kgrams} k-grams of {self._num_terms} terms>"
@@ -0,0 +1,156 @@
+from dataclasses import dataclass
+from typing import Optional
+import hashlib
+import re
+
+# strip markup before fingerprinting, otherwise every page built from the same template looks like a near duplicate
+_MARKUP_PATTERN = re.compile(
+    r"<script.*?</script>|<style.*?</style>|<!--.*?-->|<[^>]*>", re.DOTALL | re.IGNORECASE)
+_WORD_PATTERN = re.compile(r"[^\W_]+")
+
+SIMHASH_BITS = 64
+
+# simhash votes are counted in 64 lanes of one big int instead of 64 separate counters, so each word costs 8 table lookups
+# instead of 64 bit tests. _BYTE_LANES[b] has a 1 in lane i for every bit i set in the byte b.
+_LANE_BITS = 32
+_LANE_MASK = (1 << _LANE_BITS) - 1
+_BYTE_LANES = [sum(1 << (bit * _LANE_BITS) for bit in range(8) if byte >> bit & 1)
+               for byte in range(256)]
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """Content fingerprint of a document: a digest for exact duplicates and a simhash for near duplicates."""
+    digest: bytes
+    simhash: int
+    # number of distinct words that went into the simhash, too few and the simhash is meaningless
+    num_features: int
+
+
+def _feature_hash(word: str) -> int:
+    # hash() is salted per process, which would make fingerprints from worker processes incomparable
+    return int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def fingerprint(content: str) -> Fingerprint:
+    """
+    Fingerprint raw page content without parsing it.
+    The simhash is Charikar's: every distinct word votes on every bit with its count, weighted by the word's hash bit.
+    """
+    digest = hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+    counts: dict[str, int] = {}
+    for word in _WORD_PATTERN.findall(_MARKUP_PATTERN.sub(" ", content).lower()):
+        counts[word] = counts.get(word, 0) + 1
+
+    # lane i of ones ends up as the total count of words whose hash has bit i set
+    ones = 0
+    for word, count in counts.items():
+        h = _feature_hash(word)
+        lanes = 0
+        for byte in range(SIMHASH_BITS // 8):
+            lanes |= _BYTE_LANES[h >> (byte * 8) & 0xff] << (byte * 8 * _LANE_BITS)
+        ones += count * lanes
+
+    total = sum(counts.values())
+    simhash = 0
+    for bit in range(SIMHASH_BITS):
+        # a bit wins its vote if more (weighted) words have it set than not
+        if 2 * (ones >> (bit * _LANE_BITS) & _LANE_MASK) > total:
+            simhash |= 1 << bit
+
+    return Fingerprint(digest, simhash, len(counts))
+
+
+class DuplicateDetector:
+    """
+    Remembers fingerprints of accepted documents, and flags documents that are exact or near duplicates of one.
+
+    Near duplicate lookup doesn't scan every simhash seen: simhashes are split into max_distance + 1 bands, and two simhashes
+    within max_distance bits of each other must agree exactly on at least one band (pigeonhole). So only simhashes sharing a band
+    are compared.
+    """
+
+    def __init__(self, mode: str = "none", max_distance: int = 3, min_features: int = 8) -> None:
+        if mode not in ("none", "exact", "near"):
+            raise ValueError(
+                f"Duplicate detection mode must be one of none, exact or near, got {mode}.")
+        if not 0 <= max_distance < SIMHASH_BITS:
+            raise ValueError(
+                f"Simhash distance must be between 0 and {SIMHASH_BITS - 1}, got {max_distance}.")
+        self._mode = mode
+        self._max_distance = max_distance
+        self._min_features = min_features
+
+        self._digests: set[bytes] = set()
+
+        # (shift, mask) of each band, bands are as even as 64 bits allow
+        num_bands = max_distance + 1
+        self._bands: list[tuple[int, int]] = []
+        for band in range(num_bands):
+            start = band * SIMHASH_BITS // num_bands
+            end = (band + 1) * SIMHASH_BITS // num_bands
+            self._bands.append((start, (1 << (end - start)) - 1))
+        self._band_tables: list[dict[int, list[int]]] = [
+            {} for _ in range(num_bands)]
+
+        # statistics
+        self.num_exact = 0
+        self.num_near = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._mode != "none"
+
+    def _find_near(self, simhash: int) -> bool:
+        for (shift, mask), table in zip(self._bands, self._band_tables):
+            for candidate in table.get(simhash >> shift & mask, ()):
+                if (candidate ^ simhash).bit_count() <= self._max_distance:
+                    return True
+        return False
+
+    def check(self, fp: Fingerprint) -> Optional[str]:
+        """
+        Returns "exact" or "near" if fp duplicates a document seen before, otherwise remembers fp and returns None.
+        """
+        if not self.enabled:
+            return None
+
+        if fp.digest in self._digests:
+            self.num_exact += 1
+            return "exact"
+
+        near_enabled = self._mode == "near" and fp.num_features >= self._min_features
+        if near_enabled and self._find_near(fp.simhash):
+            self.num_near += 1
+            return "near"
+
+        self.remember(fp)
+        return None
+
+    def remember(self, fp: Fingerprint) -> None:
+        """Remember fp without checking it, like check does for a document that isn't a duplicate. Used to replay a resumed build."""
+        if not self.enabled:
+            return
+        self._digests.add(fp.digest)
+        if self._mode == "near" and fp.num_features >= self._min_features:
+            for (shift, mask), table in zip(self._bands, self._band_tables):
+                table.setdefault(fp.simhash >> shift & mask, []).append(fp.simhash)
+
+    def state(self) -> dict:
+        """
+        Counters, as JSON serializable data. Fingerprints aren't in it, they're saved with the documents they were taken of
+        and remembered again (see remember) when a build is resumed.
+        """
+        return {
+            "num_exact": self.num_exact,
+            "num_near": self.num_near,
+        }
+
+    def restore(self, state: dict) -> None:
+        """Pick the counters of a state() back up."""
+        self.num_exact = state["num_exact"]
+        self.num_near = state["num_near"]
+
+    def __str__(self) -> str:
+        return f"<DuplicateDetector | {self._mode}, {len(self._digests)} documents, {self.num_exact} exact and {self.num_near} near duplicates dropped>"
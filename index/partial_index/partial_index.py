@@ -1,12 +1,29 @@
-from collections import defaultdict
-from typing import DefaultDict, Iterator, Tuple, Optional
+from array import array
+from typing import BinaryIO, Iterator, Mapping, Tuple, Optional, Union
 from index.posting import Posting
-from index.posting_list import PostingList, POSTING_LIST_LENGTH_SIZE, POSTING_LIST_LENGTH_FORMAT
+from index.posting_list import PostingList, PostingListHeader, decode_postings, encode_posting_list, read_posting_list_header
 from index.term import Term, TERM_LENGTH_SIZE, TERM_LENGTH_FORMAT
-from index.posting import POSTING_SIZE
+from index.varint import read_varint
 import bisect
 from pathlib import Path
+import io
+import mmap
+import os
 import struct
+import sys
+
+
+# doc IDs and term frequencies are stored as unsigned 32 bit ints
+_PAIR_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+assert array(_PAIR_TYPECODE).itemsize == 4
+
+# estimates for memory_usage(). a new term costs its string, an array holding its first posting and a slot in the dict, and every
+# posting after that 8 bytes plus the array's over-allocation (about 1/8th)
+_TERM_OVERHEAD = sys.getsizeof(array(_PAIR_TYPECODE, (0, 0))) + 40
+_POSTING_SIZE_ESTIMATE = 9
+
+# write() hands the file this many bytes at a time
+WRITE_CHUNK_SIZE = 2 ** 20
 
 
 class PartialIndex:
@@ -14,35 +31,110 @@ class PartialIndex:
     PartialIndex-es are only used in the construction of the InvertedIndex class.
     The Indexer class creates numerous PartialIndex-es and merges them into one InvertedIndex.
     PartialIndex-es are a container mapping terms (strings) to a list of postings (PostingList).
+
+    Internally, it's a SPIMI style accumulator: each term maps to a flat array of interleaved (doc ID, term frequency) pairs instead
+    of a PostingList of Posting objects, so a posting costs 8 bytes instead of a few Python objects. Documents are added in doc ID
+    order, so a posting is almost always an append. Terms are only sorted once, when serializing.
     """
 
     def __init__(self) -> None:
-        self._index: DefaultDict[Term, PostingList] = defaultdict(PostingList)
-        self._sorted_terms: list[Term] = []
+        self._postings: dict[str, array] = {}
 
-        # track the total number of postings added, used for determining when to dump partial index to disk
+        # track the total number of postings added
         self._num_postings = 0
+        # estimated bytes held by the accumulator, used for determining when to dump partial index to disk
+        self._memory_usage = 0
 
     def num_terms(self) -> int:
-        return len(self._index)
+        return len(self._postings)
 
     def num_postings(self) -> int:
         return self._num_postings
 
+    def memory_usage(self) -> int:
+        """Estimated number of bytes of memory held by the postings accumulated so far."""
+        return self._memory_usage
+
+    def terms(self) -> list[Term]:
+        """All terms in the partial index, sorted."""
+        return [Term(term) for term in sorted(self._postings)]
+
+    def posting_list(self, term: Term) -> PostingList:
+        """Builds a PostingList of a term's postings. Empty if the term isn't in the partial index."""
+        posting_list = PostingList()
+        pairs = self._postings.get(term.term, ())
+        for i in range(0, len(pairs), 2):
+            posting_list._postings.append(Posting(pairs[i], pairs[i + 1]))
+        return posting_list
+
+    def _add(self, term: str, doc_id: int, term_frequency: int, accumulate: bool = False) -> None:
+        pairs = self._postings.get(term)
+        if pairs is None:
+            self._postings[term] = array(
+                _PAIR_TYPECODE, (doc_id, term_frequency))
+            self._memory_usage += sys.getsizeof(term) + _TERM_OVERHEAD
+        elif pairs[-2] < doc_id:
+            pairs.append(doc_id)
+            pairs.append(term_frequency)
+            self._memory_usage += _POSTING_SIZE_ESTIMATE
+        elif accumulate and pairs[-2] == doc_id:
+            pairs[-1] += term_frequency
+            return
+        else:
+            # out of order (builders add documents in doc ID order, anchor texts included), binary search for where it goes without
+            # copying the doc IDs out of the array
+            i = bisect.bisect_left(range(len(pairs) // 2), doc_id, key=lambda j: pairs[2 * j])
+            if accumulate and pairs[2 * i] == doc_id:
+                pairs[2 * i + 1] += term_frequency
+                return
+            assert pairs[2 * i] != doc_id, \
+                f"Found duplicate posting document ID. {Posting(doc_id, term_frequency)}"
+            pairs[2 * i:2 * i] = array(_PAIR_TYPECODE,
+                                       (doc_id, term_frequency))
+            self._memory_usage += _POSTING_SIZE_ESTIMATE
+        self._num_postings += 1
+
     def add_posting(self, term: Term, posting: Posting) -> None:
         """
         Add a posting to the inverted index. Postings are ordered by document ID.
         """
-        if term not in self._index:
-            bisect.insort(self._sorted_terms, term)
-        self._index[term].add_posting(posting)
-        self._num_postings += 1
+        self._add(term.term, posting.doc_id, posting.term_frequency)
 
     def add_posting_list(self, term: Term, postings_list: PostingList) -> None:
         """Convenience method for adding a posting list at once. Assumes it's unsorted."""
         for posting in postings_list:
             self.add_posting(term, posting)
 
+    def add_document(self, doc_id: int, token_tf_map: Mapping[str, int], accumulate: bool = False) -> None:
+        """
+        Add every posting of a single document, without creating Term and Posting objects for them.
+        With accumulate set, a posting for a document that's already there adds to its term frequency instead of being a duplicate.
+        """
+        for token, term_frequency in token_tf_map.items():
+            self._add(token, doc_id, term_frequency, accumulate)
+
+    def write(self, f: BinaryIO) -> int:
+        """
+        Stream the serialization to a binary file, in chunks of about WRITE_CHUNK_SIZE bytes, rather than building it all in
+        memory first. Returns the number of bytes written.
+        """
+        chunk = bytearray()
+        written = 0
+        for term in sorted(self._postings):
+            pairs = self._postings[term]
+            encoded_term = term.encode("utf-8")
+            chunk += struct.pack(TERM_LENGTH_FORMAT, len(encoded_term))
+            chunk += encoded_term
+            encode_posting_list(pairs[0::2], pairs[1::2], chunk)
+
+            if len(chunk) >= WRITE_CHUNK_SIZE:
+                f.write(chunk)
+                written += len(chunk)
+                chunk.clear()
+
+        f.write(chunk)
+        return written + len(chunk)
+
     def serialize(self) -> bytes:
         """
         Don't bother touching it.
@@ -51,27 +143,21 @@ class PartialIndex:
         [TERM SERIALIZATION][POSTING LIST SERIALIZATION]
 
         ...
+        Byte for byte the same as Term.serialize() + PostingList.serialize() for every term, in sorted order.
+        Only for small indexes and tests, partial indexes are dumped to disk with write().
         """
-        out = b''
-        for term in self._sorted_terms:
-            postings_list = self._index[term]
-            line = term.serialize() + postings_list.serialize()
-            out += line
-        return out
-        # return b''.join([posting.serialize() for posting in self._index.values()])
+        out = io.BytesIO()
+        self.write(out)
+        return out.getvalue()
 
     @staticmethod
     def deserialize(data: bytes) -> "PartialIndex":
         """NOT MEANT TO BE CALLED, ONLY FOR TESTING PURPOSES ONLY. Partial indexes should be deserialized "line by line" rather than all at once."""
         partial_index = PartialIndex()
-        num_postings = 0
 
         for term, postings_list in PartialIndex.deserialize_single_line(data):
-            num_postings += len(postings_list)
-            partial_index._index[term] = postings_list
-            bisect.insort(partial_index._sorted_terms, term)
+            partial_index.add_posting_list(term, postings_list)
 
-        partial_index._num_postings = num_postings
         return partial_index
 
     @staticmethod
@@ -80,14 +166,14 @@ class PartialIndex:
         while cursor < len(data):
             term = Term.deserialize(data[cursor:])
             cursor += TERM_LENGTH_SIZE + len(term.term.encode("utf-8"))
-            postings_list = PostingList.deserialize(data[cursor:])
-            cursor += POSTING_LIST_LENGTH_SIZE + \
-                len(postings_list) * POSTING_SIZE
+            _, _, _, end = read_posting_list_header(data, cursor)
+            postings_list = PostingList.deserialize(data[cursor:end])
+            cursor = end
 
             yield (term, postings_list)
 
     def __eq__(self, other) -> bool:
-        return isinstance(other, PartialIndex) and self._sorted_terms == other._sorted_terms and self._index == other._index and self._num_postings == other._num_postings
+        return isinstance(other, PartialIndex) and self._postings == other._postings and self._num_postings == other._num_postings
 
     def __str__(self) -> str:
         return f"<PartialIndex | {self.num_terms()} terms, {self._num_postings} postings>"
@@ -97,39 +183,172 @@ class PartialIndex:
 
 
 class PartialIndexResource:
-    def __init__(self, partial_index_fp: Path) -> None:
+    """
+    Reads the items of a partial index (or any file in its format) in order. Must be used as a context manager.
+
+    By default the file is memory mapped, and items are parsed straight out of the mapping, instead of with four small read()
+    calls each.
+    use_mmap=False reads the file through a regular buffered file object instead.
+    """
+
+    def __init__(self, partial_index_fp: Path, use_mmap: bool = True) -> None:
         self._partial_index_fp = partial_index_fp
+        self._use_mmap = use_mmap
         self._resource = None
+        # mmap mode: the mapping (empty bytes for an empty file, which can't be mapped) and the position in it
+        self._data: Optional[Union[mmap.mmap, bytes]] = None
+        self._position = 0
 
     def __enter__(self) -> "PartialIndexResource":
         self._resource = open(self._partial_index_fp, 'rb')
+        if self._use_mmap:
+            size = os.fstat(self._resource.fileno()).st_size
+            self._data = mmap.mmap(self._resource.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+            self._position = 0
         return self
 
     def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = None
         if self._resource is not None:
             self._resource.close()
 
     def __iter__(self) -> Iterator[Tuple[Term, PostingList]]:
         return self.read_items()
 
+    def _read_mapped_header(self) -> Optional[Tuple[str, int, PostingListHeader]]:
+        """
+        mmap mode _read_header: the term of the next item, where its posting list starts, and the posting list's header (see
+        read_posting_list_header). Doesn't move.
+        """
+        data, position = self._data, self._position
+        if position >= len(data):
+            return None
+        term_length = struct.unpack_from(TERM_LENGTH_FORMAT, data, position)[0]
+        position += TERM_LENGTH_SIZE
+        term = data[position:position + term_length].decode("utf-8")
+        position += term_length
+        return term, position, read_posting_list_header(data, position)
+
+    def _read_posting_list(self) -> bytes:
+        """File mode: read the serialized posting list the file is at."""
+        raw = bytearray()
+        read_varint(self._resource, raw)
+        size = read_varint(self._resource, raw)
+        read_varint(self._resource, raw)
+        raw += self._resource.read(size)
+        return bytes(raw)
+
     def _read_item(self) -> Optional[Tuple[Term, PostingList]]:
         """
         Read a single item and it's posting list from the partial index. Assumes the posting list is in absolute correct format. Must be accessed within a context manager.
         """
         assert self._resource, "PartialIndexResource not opened"
+        if self._data is not None:
+            header = self._read_mapped_header()
+            if header is None:
+                return None
+            term, _, (_, _, start, end) = header
+            self._position = end
+            postings_list = PostingList()
+            postings_list._postings = [Posting(doc_id, term_frequency)
+                                       for doc_id, term_frequency in decode_postings(self._data[start:end])]
+            return (Term(term), postings_list)
+
         # probe, if successful, represents the term length raw data
         probe = self._resource.read(TERM_LENGTH_SIZE)
         if probe == b'':
             return None
         term_length = struct.unpack(TERM_LENGTH_FORMAT, probe)[0]
         term = Term.deserialize(probe + self._resource.read(term_length))
-        posting_list_length_raw = self._resource.read(POSTING_LIST_LENGTH_SIZE)
-        posting_list_length = struct.unpack(
-            POSTING_LIST_LENGTH_FORMAT, posting_list_length_raw)[0]
-        postings_list = PostingList.deserialize(
-            posting_list_length_raw + self._resource.read(posting_list_length * POSTING_SIZE))
+        postings_list = PostingList.deserialize(self._read_posting_list())
         return (term, postings_list)
 
+    def _read_header(self) -> Optional[Tuple[str, int]]:
+        """Read just the term of the next item, and how many bytes its posting list takes. Leaves the file at the posting list."""
+        assert self._resource, "PartialIndexResource not opened"
+        if self._data is not None:
+            header = self._read_mapped_header()
+            if header is None:
+                return None
+            term, _, (_, _, start, end) = header
+            self._position = start
+            return term, end - start
+
+        probe = self._resource.read(TERM_LENGTH_SIZE)
+        if probe == b'':
+            return None
+        term_length = struct.unpack(TERM_LENGTH_FORMAT, probe)[0]
+        term = self._resource.read(term_length).decode("utf-8")
+        read_varint(self._resource)
+        size = read_varint(self._resource)
+        read_varint(self._resource)
+        return term, size
+
+    def _tell(self) -> int:
+        return self._position if self._data is not None else self._resource.tell()
+
+    def _skip(self, size: int) -> int:
+        """Move size bytes forward, returns the new position."""
+        if self._data is not None:
+            self._position += size
+            return self._position
+        return self._resource.seek(size, io.SEEK_CUR)
+
+    def scan_terms(self) -> Iterator[Tuple[str, int, int]]:
+        """
+        Yields the term, position and size in bytes of every item from the current position on, seeking over posting lists
+        instead of reading them.
+        """
+        assert self._resource, "PartialIndexResource not opened"
+        position = self._tell()
+        while (header := self._read_header()) is not None:
+            term, postings_size = header
+            end = self._skip(postings_size)
+            yield term, position, end - position
+            position = end
+
+    def seek(self, position: int) -> None:
+        """Move to the item starting at position, which has to be the start of an item."""
+        assert self._resource, "PartialIndexResource not opened"
+        if self._data is not None:
+            self._position = position
+        else:
+            self._resource.seek(position)
+
+    def skip_to(self, term: str) -> None:
+        """Skip items until the next one's term is term or comes after it."""
+        assert self._resource, "PartialIndexResource not opened"
+        for item_term, position, _ in self.scan_terms():
+            if item_term >= term:
+                self.seek(position)
+                return
+
+    def read_raw_items(self) -> Iterator[Tuple[str, bytes, int, PostingListHeader]]:
+        """
+        Yields the term, serialized bytes, posting list offset (into those bytes) and posting list header (positions into those
+        bytes too) of every item from the current position on.
+        Posting lists aren't decoded, so an item can be copied straight to another file.
+        """
+        assert self._resource, "PartialIndexResource not opened"
+        if self._data is not None:
+            while (header := self._read_mapped_header()) is not None:
+                term, posting_list_start, (num_postings, last_doc_id, start, end) = header
+                # a single copy out of the mapping. a memoryview would do without it, but it would keep the mapping from closing
+                record = self._data[self._position:end]
+                base = self._position
+                self._position = end
+                yield term, record, posting_list_start - base, (num_postings, last_doc_id, start - base, end - base)
+            return
+
+        while (probe := self._resource.read(TERM_LENGTH_SIZE)) != b'':
+            term_length = struct.unpack(TERM_LENGTH_FORMAT, probe)[0]
+            term_data = self._resource.read(term_length)
+            record = b''.join((probe, term_data, self._read_posting_list()))
+            offset = TERM_LENGTH_SIZE + term_length
+            yield term_data.decode("utf-8"), record, offset, read_posting_list_header(record, offset)
+
     def read_items(self) -> Iterator[Tuple[Term, PostingList]]:
         """
         Return a generator of items (term, postings) from the partial index.
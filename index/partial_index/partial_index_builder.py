@@ -1,12 +1,17 @@
-from index.term import Term
 from index.partial_index import PartialIndex
-from index.term import Term
-from index.posting_list import PostingList
-from utils import get_postings, index_log, get_anchor_word_postings
-from bs4 import BeautifulSoup
+from index.partial_index.partial_index_writer import PartialIndexWriter
+from index.partial_index.duplicate_detector import DuplicateDetector, Fingerprint, fingerprint
+from index.url_store import URL_STORE_FILE_NAME, write_url_store
+from utils import get_anchor_texts, get_term_frequencies, index_log, StemCache
+from bs4 import BeautifulSoup, FeatureNotFound
+from dataclasses import dataclass
 import json
 from pathlib import Path
-from typing import Mapping
+from multiprocessing.pool import Pool
+from typing import ContextManager, Iterator, Mapping, Optional, TextIO
+import contextlib
+import multiprocessing
+import sys
 import time
 import re
 
@@ -21,27 +26,136 @@ FILE_EXT_PATTERN = re.compile(
     + r"|thmx|mso|arff|rtf|jar|csv"
     + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$")
 
+# progress of a build, kept next to its runs so an interrupted build can be resumed
+CHECKPOINT_FILE_NAME = "checkpoint.json"
+# every document the build assigned a doc ID to, one [doc ID, URL] JSON line each, with its fingerprint's digest, simhash and
+# number of features when duplicate detection is on. the checkpoint only keeps how far into it the build got
+DOCUMENT_LOG_FILE_NAME = "documents.jsonl"
+# anchor texts collected while parsing, one (target URL, term frequencies) JSON line each, resolved to doc IDs after the build
+ANCHOR_SPILL_FILE_NAME = "anchors.jsonl"
+# estimates of the memory held by resolved anchor texts waiting to be sorted: a target's dict of term frequencies (and its slot and
+# doc ID in the outer dict), and a term in it
+_ANCHOR_TARGET_OVERHEAD = sys.getsizeof({}) + 64
+_ANCHOR_TERM_OVERHEAD = 72
+
+
+@dataclass
+class _ParsedDocument:
+    """What a worker process hands back to the builder for a single document."""
+    url: str
+    token_tf_map: dict[str, int]
+    # None when duplicate detection is off
+    fingerprint: Optional[Fingerprint]
+    # stem cache hits and misses spent tokenizing this document
+    stem_hits: int
+    stem_misses: int
+    # target URL to anchor text term frequencies, None when anchor text isn't indexed
+    anchors: Optional[dict[str, dict[str, int]]]
+
+
+# each worker process gets its own stem cache and settings, set up by _init_worker
+_worker_stem_cache: Optional[StemCache] = None
+_worker_fingerprint = False
+_worker_html_parser = 'html.parser'
+_worker_anchor_text = False
+
+
+def _init_worker(stem_cache_size: int, compute_fingerprint: bool, html_parser: str, anchor_text: bool) -> None:
+    global _worker_stem_cache, _worker_fingerprint, _worker_html_parser, _worker_anchor_text
+    _worker_stem_cache = StemCache(stem_cache_size)
+    _worker_fingerprint = compute_fingerprint
+    _worker_html_parser = html_parser
+    _worker_anchor_text = anchor_text
+
+
+def _parse_document(doc_path: Path) -> Optional[_ParsedDocument]:
+    """
+    The part of document processing that doesn't touch any builder state, so it can run in a worker process.
+    Returns None if the document should be skipped.
+    Duplicates can only be told apart against earlier documents, so they're still parsed here and dropped by the builder.
+    """
+    content, url, _ = PartialIndexBuilder._load_document(doc_path)
+    if FILE_EXT_PATTERN.match(url):
+        return None
+
+    assert _worker_stem_cache is not None, "_parse_document called outside of a worker"
+    fp = fingerprint(content) if _worker_fingerprint else None
+    hits, misses = _worker_stem_cache.hits, _worker_stem_cache.misses
+    soup = BeautifulSoup(content, _worker_html_parser)
+    token_tf_map = get_term_frequencies(soup, _worker_stem_cache)
+    anchors = get_anchor_texts(
+        url, soup, _worker_stem_cache) if _worker_anchor_text else None
+    return _ParsedDocument(url, token_tf_map, fp, _worker_stem_cache.hits - hits, _worker_stem_cache.misses - misses, anchors)
+
 
 class PartialIndexBuilder:
-    def __init__(self, webpages_dir: Path, partial_index_dir: Path, index_dir: Path):
+    def __init__(self, webpages_dir: Path, partial_index_dir: Path, index_dir: Path, num_workers: int = 1, stem_cache_size: int = 2 ** 17,
+                 duplicate_detection: str = "none", simhash_distance: int = 3, html_parser: str = 'html.parser',
+                 memory_budget: int = 256 * 2 ** 20, max_pending_runs: int = 2, first_doc_id: int = 0,
+                 known_urls: Optional[Mapping[str, int]] = None, anchor_text: bool = False):
         self._webpages_dir = webpages_dir
         self._partial_index_dir = partial_index_dir
         self._index_dir = index_dir
 
+        # number of processes used to parse documents, 1 parses everything in this process
+        self._num_workers = max(1, num_workers)
+        # documents handed to a worker at once, big enough to amortize IPC but small enough to keep workers busy
+        self._CHUNK_SIZE = 16
+
+        # stems for serial parsing. workers keep their own, and only report back hits and misses
+        self._stem_cache_size = stem_cache_size
+        self._stem_cache = StemCache(stem_cache_size)
+        self._stem_hits = 0
+        self._stem_misses = 0
+
         # track statistics to output at the end
         self._num_docs = 0
         self._num_terms = 0
+        # documents paths (in sorted order) that have been dealt with, indexed or skipped
+        self._docs_consumed = 0
         self._start_time = 0
 
-        # mapping of document IDs (int) to document URLs, not paths
+        # doc IDs start here, an incremental build carries on from the index it's adding to
+        self._first_doc_id = first_doc_id
+
+        # mapping of document IDs (int) to document URLs, not paths. only holds documents from this build
         self._doc_id_map: dict[int, str] = {}
+        # and appended to the document log as they're added, so checkpoints don't have to copy it
+        self._document_log: Optional[TextIO] = None
+        # and the other way around, so checking for an already indexed URL doesn't scan every URL.
+        # seeded with URLs that are already in the index, so an incremental build skips them
+        self._url_to_doc_id: dict[str, int] = dict(known_urls or {})
+
+        # BeautifulSoup tree builder. lxml is much faster than html.parser, but it's an optional dependency
+        try:
+            BeautifulSoup("", html_parser)
+        except FeatureNotFound:
+            index_log.warning(
+                f"HTML parser {html_parser} isn't installed, falling back to html.parser")
+            html_parser = 'html.parser'
+        self._html_parser = html_parser
+
+        # anchor text is indexed for the pages links point to. it's spilled to disk while parsing, since a link's target
+        # usually doesn't have a doc ID yet, and turned into postings once every doc ID is known
+        self._anchor_text = anchor_text
+        self._anchor_spill: Optional[TextIO] = None
+
+        # drops exact and near duplicate content (mirrors, crawler traps) before it's parsed
+        self._duplicates = DuplicateDetector(
+            duplicate_detection, simhash_distance)
 
         # data for partial indexing- dangerous to modify during indexing, constant changes as construction goes on
-        self._BATCH_SIZE = 2 ** 18
+        # a partial index is dumped once its estimated size in memory reaches the budget (bytes)
+        self._memory_budget = memory_budget
+        # partial indexes that can be waiting on (or being written by) the background writer at once
+        self._max_pending_runs = max_pending_runs
         self._partial_index_count = 0
         self._partial_index = PartialIndex()
+        # when the current partial index started filling up, for per run logging
+        self._run_start_time = time.time()
 
-    def _load_document(self, doc_path: Path) -> tuple[str, str, str]:
+    @staticmethod
+    def _load_document(doc_path: Path) -> tuple[str, str, str]:
         """Literally just a loader wrapper, but with some assertion checks that I KNOW will pass."""
         with open(doc_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
@@ -57,72 +171,330 @@ class PartialIndexBuilder:
 
         return content, url, encoding
 
-    def _process_document(self, doc_path: Path) -> Mapping[Term, PostingList]:
-        """Literally just a tokenizer wrapper, but also increases a _num_docs counter."""
+    def _add_document(self, url: str, token_tf_map: Mapping[str, int],
+                      anchors: Optional[Mapping[str, Mapping[str, int]]] = None,
+                      fp: Optional[Fingerprint] = None) -> tuple[int, Mapping[str, int]]:
+        """
+        Assigns the next document ID to a parsed document, logs it with its fingerprint, and spills its anchor texts.
+        Returns the doc ID along with the document's term frequencies.
+        """
+        # utilize the number of documents as the doc_id
+        doc_id = self._first_doc_id + self._num_docs
+        self._doc_id_map[doc_id] = url
+        self._url_to_doc_id[url] = doc_id
+        self._num_docs += 1
+
+        if self._document_log is not None:
+            entry = [doc_id, url] if fp is None else [doc_id, url, fp.digest.hex(), fp.simhash, fp.num_features]
+            self._document_log.write(json.dumps(entry) + "\n")
+
+        if anchors and self._anchor_spill is not None:
+            self._anchor_spill.writelines(
+                json.dumps([target, tfs]) + "\n" for target, tfs in anchors.items())
+
+        return doc_id, token_tf_map
+
+    def _process_document(self, doc_path: Path) -> Optional[tuple[int, Mapping[str, int]]]:
+        """Literally just a tokenizer wrapper, but also increases a _num_docs counter. Returns None for skipped documents."""
         content, url, _ = self._load_document(doc_path)
-        if url in self._doc_id_map.values():
-            return {}
+        if url in self._url_to_doc_id:
+            return None
 
         if FILE_EXT_PATTERN.match(url):
-            return {}
+            return None
 
-        soup = BeautifulSoup(content, 'html.parser')
-        postings = get_postings(self._num_docs, soup)
-        anchor_postings = get_anchor_word_postings(self._doc_id_map, soup)
-        anchor_postings = {term: posting_list for term,
-                           posting_list in anchor_postings.items() if len(posting_list) > 0}
+        fp = fingerprint(content) if self._duplicates.enabled else None
+        if fp is not None and self._duplicates.check(fp):
+            return None
 
-        # utilize the number of documents as the doc_id
-        self._doc_id_map[self._num_docs] = url
-        self._num_docs += 1
+        soup = BeautifulSoup(content, self._html_parser)
+        anchors = get_anchor_texts(
+            url, soup, self._stem_cache) if self._anchor_text else None
+        return self._add_document(url, get_term_frequencies(soup, self._stem_cache), anchors, fp)
+
+    def _create_pool(self) -> ContextManager[Optional[Pool]]:
+        """The worker pool for parsing documents, or nothing for a serial build."""
+        if self._num_workers == 1:
+            return contextlib.nullcontext()
+        initargs = (self._stem_cache_size, self._duplicates.enabled,
+                    self._html_parser, self._anchor_text)
+        return multiprocessing.Pool(self._num_workers, initializer=_init_worker, initargs=initargs)
 
-        return postings
+    def _process_documents(self, doc_paths: list[Path], pool: Optional[Pool]) -> Iterator[tuple[int, Mapping[str, int]]]:
+        """
+        Yields the doc ID and term frequencies of every document in doc_paths that isn't skipped, in order.
+        With a worker pool, parsing and tokenizing is fanned out to it, but results are consumed in the
+        same order as the serial build, so doc IDs (and therefore every file written) are identical either way.
+        """
+        if pool is None:
+            for doc_path in doc_paths:
+                processed = self._process_document(doc_path)
+                self._docs_consumed += 1
+                if processed is not None:
+                    yield processed
+            return
 
-    def _dump_current_partial_index(self) -> None:
-        """Serialize current partial index to disk. Used in `self._create_new_partial_index()`"""
+        # imap (not imap_unordered) hands results back in submission order
+        for parsed in pool.imap(_parse_document, doc_paths, chunksize=self._CHUNK_SIZE):
+            self._docs_consumed += 1
+            if parsed is None:
+                continue
+            self._stem_hits += parsed.stem_hits
+            self._stem_misses += parsed.stem_misses
+            if parsed.url in self._url_to_doc_id:
+                continue
+            # same checks in the same order as _process_document, so the same documents are dropped
+            if parsed.fingerprint is not None and self._duplicates.check(parsed.fingerprint):
+                continue
+            yield self._add_document(parsed.url, parsed.token_tf_map, parsed.anchors, parsed.fingerprint)
+
+    def _dump_current_partial_index(self, writer: PartialIndexWriter) -> None:
+        """Hand the current partial index to the background writer. Used in `self._create_new_partial_index()`"""
         self._partial_index_dir.mkdir(exist_ok=True)
         fname = f"partial_index_{self._partial_index_count:03}.bin"
         path = self._partial_index_dir / fname
 
-        index_log.info(f"Dumping current partial index to {path}")
-
-        start = time.time()
-        serialization = self._partial_index.serialize()
-        end = time.time()
         index_log.info(
-            f"Serializing current partial index {path} took {(end - start):.2f}s")
+            f"Dumping current partial index to {path}, filled in {(time.time() - self._run_start_time):.2f}s")
+        # everything consumed so far is in this run or an earlier one, so once it's on disk the build can pick up from here
+        checkpoint = self._checkpoint(self._partial_index_count + 1)
+        writer.submit(self._partial_index, path,
+                      lambda: self._save_checkpoint(checkpoint))
+        self._run_start_time = time.time()
 
-        start = time.time()
-        with open(path, 'wb') as f:
-            f.write(serialization)
-        end = time.time()
-        index_log.info(
-            f"Writing current partial index {path} took {(end - start):.2f}s")
-
-    def _create_new_partial_index(self) -> None:
+    def _create_new_partial_index(self, writer: PartialIndexWriter) -> None:
         """Sets the _partial_index attribute to a new PartialIndex object, done when needing to dump old partial index and start anew."""
-        self._dump_current_partial_index()
+        self._dump_current_partial_index(writer)
         self._partial_index_count += 1
         self._partial_index = PartialIndex()
 
-    def build(self) -> None:
-        """Constructs partial indexes from a directory of webpages."""
-        for doc_path in self._webpages_dir.rglob('*.json'):
-            postings = self._process_document(doc_path)
-            for term, postings_list in postings.items():
-                self._partial_index.add_posting_list(term, postings_list)
+    def _checkpoint(self, partial_index_count: int, built: bool = False) -> dict:
+        """
+        Snapshot of the build's progress. Taken on the builder's thread, since the builder keeps changing it.
+        Only counters and offsets, the documents themselves are in the document log, so it's the same size every run.
+        """
+        anchor_spill_size = None
+        if self._anchor_spill is not None:
+            self._anchor_spill.flush()
+            anchor_spill_size = self._anchor_spill.tell()
+        document_log_size = None
+        if self._document_log is not None:
+            self._document_log.flush()
+            document_log_size = self._document_log.tell()
+        return {
+            "built": built,
+            "docs_consumed": self._docs_consumed,
+            "first_doc_id": self._first_doc_id,
+            "num_docs": self._num_docs,
+            "num_terms": self._num_terms,
+            "partial_index_count": partial_index_count,
+            # documents added so far, anything after this offset is from documents that will be parsed again
+            "document_log_size": document_log_size,
+            "duplicates": self._duplicates.state(),
+            # anchor texts of the documents consumed so far, anything after this offset is from documents that will be parsed again
+            "anchor_spill_size": anchor_spill_size,
+        }
+
+    def _save_checkpoint(self, checkpoint: dict) -> None:
+        # written next to it and then renamed over it, so a crash mid-write can't leave a broken checkpoint behind
+        checkpoint_fp = self._partial_index_dir / CHECKPOINT_FILE_NAME
+        tmp_fp = checkpoint_fp.with_suffix(".tmp")
+        with open(tmp_fp, 'w') as f:
+            json.dump(checkpoint, f)
+        tmp_fp.replace(checkpoint_fp)
+        index_log.info(
+            f"Checkpoint: {checkpoint['docs_consumed']} documents consumed, {checkpoint['partial_index_count']} partial indexes on disk")
+
+    def _restore_checkpoint(self) -> bool:
+        """
+        Pick the build state back up from the checkpoint in the partial index directory, and delete runs written after it.
+        Returns whether the checkpointed build had already finished.
+        """
+        checkpoint_fp = self._partial_index_dir / CHECKPOINT_FILE_NAME
+        checkpoint = None
+        if checkpoint_fp.exists():
+            with open(checkpoint_fp, 'r') as f:
+                checkpoint = json.load(f)
+        else:
+            index_log.warning(
+                f"No checkpoint in {self._partial_index_dir}, building from the start")
+
+        if checkpoint is not None:
+            if checkpoint["first_doc_id"] != self._first_doc_id:
+                raise ValueError(
+                    f"Checkpoint in {self._partial_index_dir} is of a build starting at doc ID {checkpoint['first_doc_id']}, not {self._first_doc_id}.")
+            self._docs_consumed = checkpoint["docs_consumed"]
+            self._num_docs = checkpoint["num_docs"]
+            self._num_terms = checkpoint["num_terms"]
+            self._partial_index_count = checkpoint["partial_index_count"]
+            self._duplicates.restore(checkpoint["duplicates"])
+
+        # documents up to the checkpoint are added back, with their fingerprints, the rest will be parsed again
+        document_log_fp = self._partial_index_dir / DOCUMENT_LOG_FILE_NAME
+        if document_log_fp.exists():
+            with open(document_log_fp, 'r+', encoding='utf-8') as f:
+                f.truncate((checkpoint or {}).get("document_log_size") or 0)
+                for line in f:
+                    doc_id, url, *fp = json.loads(line)
+                    self._doc_id_map[doc_id] = url
+                    self._url_to_doc_id[url] = doc_id
+                    if fp:
+                        digest, simhash, num_features = fp
+                        self._duplicates.remember(Fingerprint(bytes.fromhex(digest), simhash, num_features))
+
+        # runs that were still being written when the build died
+        for path in self._partial_index_dir.glob("partial_index_*.bin"):
+            if int(path.stem.split('_')[-1]) >= self._partial_index_count:
+                index_log.info(f"Deleting incomplete partial index {path}")
+                path.unlink()
+
+        if checkpoint is None or not checkpoint["built"]:
+            # the anchor pass runs after every document is parsed, so it's always redone from scratch
+            for path in self._partial_index_dir.glob("anchor_index_*.bin"):
+                path.unlink()
+            anchor_spill_fp = self._partial_index_dir / ANCHOR_SPILL_FILE_NAME
+            if anchor_spill_fp.exists():
+                with open(anchor_spill_fp, 'r+') as f:
+                    f.truncate(
+                        (checkpoint or {}).get("anchor_spill_size") or 0)
+
+        return checkpoint is not None and checkpoint["built"]
+
+    def build(self, resume: bool = False) -> None:
+        """
+        Constructs partial indexes from a directory of webpages.
+        With resume set, carries on from the checkpoint an interrupted build left in the partial index directory.
+        """
+        # sorted so doc IDs don't depend on the order the filesystem happens to list files in
+        doc_paths = sorted(self._webpages_dir.rglob('*.json'))
+        if resume:
+            if self._restore_checkpoint():
+                index_log.info(
+                    f"Partial indexes in {self._partial_index_dir} were already fully built")
+                return
+            index_log.info(
+                f"Resuming build after {self._docs_consumed} documents and {self._partial_index_count} partial indexes")
+            # documents are only ever added, a crawl that lost documents can't be resumed
+            assert self._docs_consumed <= len(doc_paths), \
+                f"Checkpoint has consumed {self._docs_consumed} documents, but there are only {len(doc_paths)}"
+            doc_paths = doc_paths[self._docs_consumed:]
+        index_log.info(
+            f"Building partial indexes from {len(doc_paths)} documents with {self._num_workers} worker(s)")
+
+        self._partial_index_dir.mkdir(exist_ok=True)
+        # line buffered, so a crashed build can't flush lines past its checkpoint after the resumed one truncated the log
+        self._document_log = open(
+            self._partial_index_dir / DOCUMENT_LOG_FILE_NAME, 'a', encoding='utf-8', buffering=1)
+        if self._anchor_text:
+            self._anchor_spill = open(
+                self._partial_index_dir / ANCHOR_SPILL_FILE_NAME, 'a', encoding='utf-8')
+
+        # full partial indexes are written in the background while the next one fills up.
+        # the pool has to be forked before the writer thread starts, forking a process with other threads running can deadlock
+        with self._create_pool() as pool, PartialIndexWriter(self._max_pending_runs) as writer:
+            for doc_id, token_tf_map in self._process_documents(doc_paths, pool):
+                self._partial_index.add_document(doc_id, token_tf_map)
+                self._num_terms += len(token_tf_map)
+
+                # only flushed between documents, a document's postings all land in the same partial index
+                if self._partial_index.memory_usage() >= self._memory_budget:
+                    self._create_new_partial_index(writer)
 
-                if self._partial_index.num_postings() >= self._BATCH_SIZE:
-                    self._create_new_partial_index()
+            # dump the last partial index if there's anything left over. don't bother resetting it with a new partial index
+            if self._partial_index.num_postings() > 0:
+                self._dump_current_partial_index(writer)
+                self._partial_index_count += 1
 
-                self._num_terms += 1
+        if self._anchor_spill is not None:
+            self._anchor_spill.close()
+            self._anchor_spill = None
+            self._index_anchor_texts()
 
-        # dump the last partial index if there's anything left over. don't bother resetting it with a new partial index
-        if self._partial_index.num_postings() > 0:
-            self._dump_current_partial_index()
-            self._partial_index_count += 1
+        url_store_fp = self._index_dir / URL_STORE_FILE_NAME
+        write_url_store(url_store_fp, self._doc_id_map)
+        index_log.info(
+            f"Saved document ID to URL mapping to {url_store_fp}, {url_store_fp.stat().st_size / 1024:.1f}KB")
+
+        self._save_checkpoint(self._checkpoint(
+            self._partial_index_count, built=True))
+        self._document_log.close()
+        self._document_log = None
+        (self._partial_index_dir / ANCHOR_SPILL_FILE_NAME).unlink(missing_ok=True)
+
+        self._log_stem_cache()
+        index_log.info(f"Duplicate detection: {self._duplicates}")
+
+    def _index_anchor_texts(self) -> None:
+        """
+        Turn the spilled anchor texts into postings for the documents they link to, written as extra runs (anchor_index_NNN.bin)
+        for the merger. Every doc ID is known by now, so a link resolves with a single lookup in _url_to_doc_id.
+        Links to pages that weren't crawled (or were skipped) resolve to nothing and are dropped.
+
+        Links come in the order the linking pages were parsed, not in the order of the doc IDs they point to, so the anchor texts
+        of each target are added up in a dict first. Once that takes up the memory budget, targets are added to a partial index in
+        doc ID order, so every posting is an append, and it's written as a run.
+        """
+        start = time.time()
+        num_anchors = 0
+        num_resolved = 0
+        num_runs = 0
+        # target doc ID to its anchor text term frequencies, summed over every link to it
+        targets: dict[int, dict[str, int]] = {}
+        memory_usage = 0
+
+        def submit_run() -> None:
+            nonlocal num_runs
+            anchor_index = PartialIndex()
+            # popped, so the dicts are freed as their postings are added
+            for doc_id in sorted(targets):
+                anchor_index.add_document(doc_id, targets.pop(doc_id))
+            writer.submit(anchor_index, self._partial_index_dir /
+                          f"anchor_index_{num_runs:03}.bin")
+            num_runs += 1
+
+        with PartialIndexWriter(self._max_pending_runs) as writer, \
+                open(self._partial_index_dir / ANCHOR_SPILL_FILE_NAME, 'r', encoding='utf-8') as f:
+            for line in f:
+                target, tfs = json.loads(line)
+                num_anchors += 1
+                doc_id = self._url_to_doc_id.get(target)
+                # an incremental build can't add postings to segments that are already merged, and posting lists across segments
+                # have to stay in doc ID order, so links to documents from earlier builds are dropped too
+                if doc_id is None or doc_id < self._first_doc_id:
+                    continue
+                num_resolved += 1
+                # many pages link to the same page, their anchor texts add up
+                target_tfs = targets.get(doc_id)
+                if target_tfs is None:
+                    target_tfs = targets[doc_id] = {}
+                    memory_usage += _ANCHOR_TARGET_OVERHEAD
+                for term, term_frequency in tfs.items():
+                    if term not in target_tfs:
+                        memory_usage += sys.getsizeof(term) + _ANCHOR_TERM_OVERHEAD
+                    target_tfs[term] = target_tfs.get(term, 0) + term_frequency
+
+                if memory_usage >= self._memory_budget:
+                    submit_run()
+                    memory_usage = 0
+
+            if targets:
+                submit_run()
+
+        index_log.info(
+            f"Anchor text: {num_resolved} of {num_anchors} links resolved to indexed documents, "
+            f"written to {num_runs} anchor run(s) in {(time.time() - start):.2f}s")
+
+    def _log_stem_cache(self) -> None:
+        """Log stem cache hits and misses, and keep the warmed table next to the index so InvertedIndex starts hot."""
+        stem_hits = self._stem_hits + self._stem_cache.hits
+        stem_misses = self._stem_misses + self._stem_cache.misses
+        lookups = stem_hits + stem_misses
+        hit_rate = stem_hits / lookups if lookups else 0.0
+        index_log.info(
+            f"Stem cache (size {self._stem_cache_size}): {stem_hits} hits, {stem_misses} misses, {hit_rate:.2%} hit rate")
 
-        doc_id_map_fp = self._index_dir / "doc_id_map.json"
-        with open(doc_id_map_fp, 'w') as f:
-            json.dump(self._doc_id_map, f, indent=4)
-        index_log.info(f"Saved document ID to URL mapping to {doc_id_map_fp}")
+        # workers' caches die with them, so there's only a table to keep after a serial build
+        if len(self._stem_cache) > 0:
+            stem_cache_fp = self._index_dir / "stem_cache.json"
+            self._stem_cache.save(stem_cache_fp)
+            index_log.info(f"Saved warmed stem cache to {stem_cache_fp}")
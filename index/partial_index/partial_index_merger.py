@@ -1,26 +1,90 @@
 from pathlib import Path
-from collections import deque
-from index.partial_index.partial_index import PartialIndexResource
-from index.posting_list import PostingList
-from index.term import Term
-from typing import Deque, Iterator
+from index.partial_index.partial_index import PartialIndexResource, WRITE_CHUNK_SIZE
+from index.posting import Posting
+from index.posting_list import POSTING_BLOCK_SIZE, Block, PostingList, PostingListHeader, encode_posting_list_header, \
+    encode_skip_table, read_blocks, read_posting_list_header
+from index.champion_lists import CHAMPION_LIST_SIZE, CHAMPION_LISTS_FILE_NAME, write_champion_lists
+from index.completions import COMPLETIONS_FILE_NAME, write_completions
+from index.kgram_index import KGRAM_INDEX_FILE_NAME, write_kgram_index
+from index.term_dictionary import TERM_DICTIONARY_FILE_NAME, TermDictionary, write_term_dictionary
+from index.term_statistics import DOC_NORMS_FILE_NAME, TERM_STATISTICS_FILE_NAME, write_statistics
+from index.tombstones import Tombstones
+from index.varint import decode_varint, encode_varint
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
 from utils import index_log
-import json
+import bisect
+import contextlib
+import functools
+import heapq
+import multiprocessing
+import shutil
+import time
+
+
+@dataclass
+class _TermRange:
+    """Terms from start_term (inclusive) to end_term (exclusive), None meaning unbounded. starts has where to start reading each run."""
+    start_term: Optional[str]
+    end_term: Optional[str]
+    starts: list[int]
+
+
+def _merge_term_range(merger: "PartialIndexMerger", run_paths: list[Path], output_path: Path,
+                      term_range: _TermRange) -> dict[str, tuple[int, int]]:
+    """Worker process side of a partitioned merge. Returns where each term was written in output_path, and its document frequency."""
+    return merger._merge_runs(run_paths, output_path, term_range=term_range)
 
 
 class PartialIndexMerger:
-    """Utilize polyphase merge to merge the partial indexes into a single index."""
+    """
+    Merges the partial indexes (sorted runs) into a single index with a k-way merge.
 
-    def __init__(self, partial_index_dir: Path, index_dir: Path) -> None:
+    A heap holds the next term of every run, so every posting is read and written once, instead of once per level of a tree of
+    two-way merges. At most fan_in runs are open at once: with more runs than that, groups of fan_in runs are first merged into
+    intermediate runs (tmp_merge_run_*.bin), which are deleted as soon as they've been merged again.
+
+    With num_workers > 1, the final pass is split into term ranges that are merged in parallel, see _merge_runs_partitioned.
+    """
+
+    # a partitioned merge samples every this many terms of each run to pick range boundaries
+    _SAMPLE_INTERVAL = 64
+
+    def __init__(self, partial_index_dir: Path, index_dir: Path, tombstones: Optional[Tombstones] = None,
+                 sum_duplicates: bool = False, fan_in: int = 64, num_workers: int = 1,
+                 champion_list_size: int = CHAMPION_LIST_SIZE) -> None:
+        if fan_in < 2:
+            raise ValueError(f"Merge fan-in must be at least 2, got {fan_in}.")
         self._partial_index_dir = partial_index_dir
         self._index_dir = index_dir
+        # postings of these doc IDs are dropped while merging, terms left without postings are dropped too
+        self._tombstones = tombstones if tombstones is not None and len(tombstones) > 0 else None
+        # anchor text runs hold postings for documents that also have postings in the regular runs, those get their term frequencies
+        # summed. otherwise two postings for the same document is a bug
+        self._sum_duplicates = sum_duplicates
+        # max number of runs merged (and open) at once
+        self._fan_in = fan_in
+        # processes the final pass is split across
+        self._num_workers = max(1, num_workers)
+        # postings in the champion list of every term in more documents than this
+        self._champion_list_size = champion_list_size
+
+        self._runs: list[Path] = []
 
-        self._runs: Deque[Path] = deque()
+        # statistics
+        self.num_passes = 0
+        self.bytes_written = 0
 
     def _merge_postings_lists(self, left: PostingList, right: PostingList) -> PostingList:
         i, j = 0, 0
         out = []
         while i < len(left) and j < len(right):
+            if self._sum_duplicates and left[i].doc_id == right[j].doc_id:
+                out.append(Posting(left[i].doc_id,
+                           left[i].term_frequency + right[j].term_frequency))
+                i += 1
+                j += 1
+                continue
             assert left[i] != right[j], \
                 f"Found two identical posting objects which should not happen: {left[i]}"
             if left[i] < right[j]:
@@ -38,108 +102,336 @@ class PartialIndexMerger:
 
         posting_list = PostingList()
         posting_list._postings = out
-        assert len(out) == (len(left) + len(right))
+        assert self._sum_duplicates or len(out) == (len(left) + len(right))
         return posting_list
 
-    def _merge_partial_index_resources(self, left_resource: PartialIndexResource, right_resource: PartialIndexResource) -> Iterator[bytes]:
-        """
-        Simple merge algorithm that reads from two serialized partial indexes and writes to a new one.
-
-        This code can be optimized and made cleaner and more of a pure functional style by having left and right be generators for partial index resources, and returning a generator to write..
-        Maybe I'll do that later.
-        """
-        left = iter(left_resource)
-        right = iter(right_resource)
-        # flags to determine whether or not to get the next() value from the respective iterator after a loop iteration
-        _load_left, _load_right = True, True
-        left_value, right_value = None, None
-        leftover = left
-        while True:
-            # load new values
-            try:
-                left_value = next(left) if _load_left else left_value
-            except StopIteration:
-                left_value = None
-                leftover = right
-
-            try:
-                right_value = next(right) if _load_right else right_value
-            except StopIteration:
-                right_value = None
-                leftover = left
-
-            if left_value is None or right_value is None:
-                break
-
-            _load_left, _load_right = False, False
-
-            # merge new values
-            left_term, left_postings = left_value
-            right_term, right_postings = right_value
-
-            if left_term == right_term:  # merge and then serialize
-                new_postings = self._merge_postings_lists(
-                    left_postings, right_postings)
-                serialization = left_term.serialize() + new_postings.serialize()
-                _load_left, _load_right = True, True
-            else:
-                # serialize smaller term, move on
-                if left_term < right_term:
-                    serialization = left_term.serialize() + left_postings.serialize()
-                    _load_left = True
+    def _merge_posting_list_group(self, posting_lists: list[PostingList]) -> PostingList:
+        """Merge the posting lists of one term from several runs."""
+        if len(posting_lists) == 1:
+            return posting_lists[0]
+
+        # runs are dumped in doc ID order, so a term's posting lists almost always cover disjoint, increasing doc ID ranges
+        # and just have to be laid end to end. only anchor text runs overlap the others, those get merged for real
+        posting_lists.sort(key=lambda posting_list: posting_list[0].doc_id)
+        if all(left[-1].doc_id < right[0].doc_id for left, right in zip(posting_lists, posting_lists[1:])):
+            merged = PostingList()
+            for posting_list in posting_lists:
+                merged._postings.extend(posting_list._postings)
+            return merged
+        return functools.reduce(self._merge_postings_lists, posting_lists)
+
+    def _read_run(self, resource: PartialIndexResource, end_term: Optional[str] = None) -> Iterator[Tuple[str, bytes, int, PostingListHeader]]:
+        """
+        Raw items of a run (from its current position, up to end_term if given), see PartialIndexResource.read_raw_items.
+        Posting lists are only decoded to purge tombstoned documents, and re-encoded only if any were.
+        """
+        for item in resource.read_raw_items():
+            term, record, offset, _ = item
+            if end_term is not None and term >= end_term:
+                return
+            if self._tombstones is None:
+                yield item
+                continue
+            posting_list = PostingList.deserialize(record[offset:])
+            postings = [posting for posting in posting_list
+                        if posting.doc_id not in self._tombstones]
+            if len(postings) == len(posting_list):
+                yield item
+            elif postings:
+                purged = PostingList()
+                purged._postings = postings
+                record = record[:offset] + purged.serialize()
+                yield term, record, offset, read_posting_list_header(record, offset)
+
+    @staticmethod
+    def _concatenate_records(group: list[Tuple[bytes, int, PostingListHeader]]) -> Optional[bytes]:
+        """
+        One term's records from several runs as a single record, built from their raw postings, if their doc ID ranges don't
+        overlap (see _merge_posting_list_group). Returns None if they do and have to be decoded and merged.
+        Doc IDs are stored as gaps, so only the first posting of each list after the first needs re-encoding.
+
+        The lists keep their blocks: the skip table is theirs one after the other (a list without one is a single block), with
+        the first block of each list resized for its re-encoded gap. Neighbouring blocks are coalesced while they fit in
+        POSTING_BLOCK_SIZE postings, so many short lists don't make a skip table of tiny blocks. Blocks are never split again, so
+        where they end depends on how runs were grouped into merge passes (the postings don't). Decoding and encoding every long
+        list again to get the same blocks either way made it the slowest part of the merge.
+        """
+        spans = []
+        for record, offset, (num_postings, last_doc_id, start, end) in group:
+            first_doc_id, first_end = decode_varint(record, start)
+            spans.append((first_doc_id, last_doc_id, num_postings, record, offset, start, first_end, end))
+        spans.sort(key=lambda span: span[0])
+        if any(left[1] >= right[0] for left, right in zip(spans, spans[1:])):
+            return None
+
+        record, offset, _ = group[0]
+        out = bytearray(record[:offset])
+        num_postings = sum(span[2] for span in spans)
+        payload = bytearray()
+        blocks: list[Block] = []
+        previous_doc_id = 0
+        for first_doc_id, last_doc_id, span_num_postings, record, offset, start, first_end, end in spans:
+            gap_start = len(payload)
+            encode_varint(first_doc_id - previous_doc_id, payload)
+            resize = len(payload) - gap_start - (first_end - start)
+            payload += record[first_end:end]
+            previous_doc_id = last_doc_id
+            if num_postings <= POSTING_BLOCK_SIZE:
+                # a single block, no skip table
+                continue
+            # a list without a skip table is a single block, the header already says what it is
+            span_blocks = read_blocks(record, offset) if span_num_postings > POSTING_BLOCK_SIZE else \
+                [(last_doc_id, end - start, span_num_postings)]
+            for i, (block_last_doc_id, size, block_num_postings) in enumerate(span_blocks):
+                if i == 0:
+                    size += resize
+                if blocks and blocks[-1][2] + block_num_postings <= POSTING_BLOCK_SIZE:
+                    blocks[-1] = (block_last_doc_id, blocks[-1][1] + size, blocks[-1][2] + block_num_postings)
                 else:
-                    serialization = right_term.serialize() + right_postings.serialize()
-                    _load_right = True
-            yield serialization
+                    blocks.append((block_last_doc_id, size, block_num_postings))
+
+        skip_table = bytearray()
+        if blocks:
+            encode_skip_table(blocks, skip_table)
+        encode_posting_list_header(num_postings, len(skip_table) + len(payload), previous_doc_id, out)
+        out += skip_table
+        out += payload
+        return bytes(out)
+
+    def _merge_items(self, resources: list[PartialIndexResource], end_term: Optional[str] = None) -> Iterator[Tuple[str, bytes, int]]:
+        """
+        Serialized items of all resources, with their number of postings, in term order. A term found in several runs has its
+        posting lists merged, a term found in just one (most of them) is passed through as the bytes it was read as.
+        """
+        runs = [self._read_run(resource, end_term) for resource in resources]
+        # (term, run index, item). the run index breaks ties, so items are never compared and equal terms come out in run order
+        heap = []
+        for i, run in enumerate(runs):
+            item = next(run, None)
+            if item is not None:
+                heap.append((item[0], i, item))
+        heapq.heapify(heap)
 
-        # after breaking, left_value or right_value may still contain an already-read item that we must serialize
-        if left_value is not None:
-            yield left_value[0].serialize() + left_value[1].serialize()
-        if right_value is not None:
-            yield right_value[0].serialize() + right_value[1].serialize()
+        while heap:
+            term = heap[0][0]
+            group = []
+            while heap and heap[0][0] == term:
+                _, i, (_, record, offset, header) = heapq.heappop(heap)
+                group.append((record, offset, header))
+                item = next(runs[i], None)
+                if item is not None:
+                    heapq.heappush(heap, (item[0], i, item))
 
-        for term, postings_list in leftover:
-            yield term.serialize() + postings_list.serialize()
+            if len(group) == 1:
+                record, _, (num_postings, _, _, _) = group[0]
+                yield term, record, num_postings
+                continue
+            concatenated = self._concatenate_records(group)
+            if concatenated is not None:
+                yield term, concatenated, sum(header[0] for _, _, header in group)
+                continue
+            posting_lists = [PostingList.deserialize(record[offset:])
+                             for record, offset, _ in group]
+            record, offset, _ = group[0]
+            merged = self._merge_posting_list_group(posting_lists)
+            yield term, record[:offset] + merged.serialize(), len(merged)
 
-    def _merge_partial_indexes(self, output_path: Path, left_path: Path, right_path: Path, _final_merge=False) -> None:
-        # only is used in the final merge; is a term to pointer in the inverted index file mapping, so in InvertedIndex, .seek() can be used
+    def _merge_runs(self, run_paths: list[Path], output_path: Path, final: bool = False,
+                    term_range: Optional[_TermRange] = None) -> dict[str, tuple[int, int]]:
+        """
+        Merge run_paths into output_path, or only the terms in term_range of them. Returns where each term was written and its
+        document frequency. The final merge also saves them as the term dictionary of the output.
+        """
+        # is a term to pointer in the inverted index file mapping, so in InvertedIndex, .seek() can be used
         term_to_ii_position = {}
-        with PartialIndexResource(left_path) as left, PartialIndexResource(right_path) as right, open(output_path, "wb") as out:
-            for line in self._merge_partial_index_resources(left, right):
-                if _final_merge:
-                    term = Term.deserialize(line).term
-                    term_to_ii_position[term] = out.tell()
-                out.write(line)
-
-        if _final_merge:
-            term_to_ii_position_fp = self._index_dir / "term_to_ii_position.json"
-            with open(term_to_ii_position_fp, 'w') as f:
-                json.dump(term_to_ii_position, f, indent=4)
-            index_log.info(
-                f"Saved term to inverted index binary data position mapping to {term_to_ii_position_fp}")
+        with contextlib.ExitStack() as stack:
+            resources = [stack.enter_context(PartialIndexResource(path))
+                         for path in run_paths]
+            end_term = None
+            if term_range is not None:
+                for resource, start in zip(resources, term_range.starts):
+                    resource.seek(start)
+                    if term_range.start_term is not None:
+                        resource.skip_to(term_range.start_term)
+                end_term = term_range.end_term
+            out = stack.enter_context(
+                open(output_path, "wb", buffering=WRITE_CHUNK_SIZE))
+            for term, record, document_frequency in self._merge_items(resources, end_term):
+                term_to_ii_position[term] = (out.tell(), document_frequency)
+                out.write(record)
+            self.bytes_written += out.tell()
 
-    def merge(self) -> None:
+        if final:
+            self._save_term_dictionary(term_to_ii_position)
+        return term_to_ii_position
+
+    def _sample_runs(self, run_paths: list[Path]) -> list[list[tuple[str, int, int]]]:
         """
-        Utilize polyphase merge to merge the partial indexes (already sorted) into a single inverted index.
+        Every _SAMPLE_INTERVAL-th term of each run, with its position and the bytes of the items since the previous sample.
+        Only item headers are read.
         """
-        for p in self._partial_index_dir.iterdir():
-            self._runs.append(p)
+        samples = []
+        for path in run_paths:
+            run_samples = []
+            weight = 0
+            with PartialIndexResource(path) as resource:
+                for i, (term, position, size) in enumerate(resource.scan_terms()):
+                    weight += size
+                    if i % self._SAMPLE_INTERVAL == 0:
+                        run_samples.append((term, position, weight))
+                        weight = 0
+            samples.append(run_samples)
+        return samples
 
-        assert len(self._runs) > 0
+    def _partition_terms(self, run_paths: list[Path], num_ranges: int) -> list[_TermRange]:
+        """Split the term space into num_ranges ranges of about the same number of bytes, going by samples of the runs."""
+        samples = self._sample_runs(run_paths)
+        weighted_terms = sorted((term, weight) for run_samples in samples
+                                for term, _, weight in run_samples)
+        total = sum(weight for _, weight in weighted_terms)
+
+        boundaries: list[str] = []
+        cumulative = 0
+        for term, weight in weighted_terms:
+            cumulative += weight
+            if len(boundaries) + 1 < num_ranges and cumulative >= total * (len(boundaries) + 1) / num_ranges \
+                    and (not boundaries or term > boundaries[-1]):
+                boundaries.append(term)
+
+        ranges = []
+        for start_term, end_term in zip([None] + boundaries, boundaries + [None]):
+            # start reading each run from its last sample before the range, and skip the few items after it by their headers
+            starts = []
+            for run_samples in samples:
+                start = 0
+                if start_term is not None:
+                    terms = [term for term, _, _ in run_samples]
+                    i = bisect.bisect_left(terms, start_term)
+                    if i > 0:
+                        start = run_samples[i - 1][1]
+                starts.append(start)
+            ranges.append(_TermRange(start_term, end_term, starts))
+        return ranges
+
+    def _merge_runs_partitioned(self, run_paths: list[Path], output_path: Path) -> None:
+        """
+        Final merge with the term space split into ranges, each merged by a worker process into its own file. The files are
+        then concatenated in term order, with their term positions shifted by where they land, so the result is byte for byte
+        what a single process would have written.
+        """
+        ranges = self._partition_terms(run_paths, self._num_workers)
+        range_paths = [self._partial_index_dir / f"tmp_range_{i:03}.bin"
+                       for i in range(len(ranges))]
+        index_log.info(
+            f"Merging {len(run_paths)} runs in {len(ranges)} term ranges with {self._num_workers} workers, split at {[r.start_term for r in ranges[1:]]}")
+
+        args = [(self, run_paths, range_path, term_range)
+                for range_path, term_range in zip(range_paths, ranges)]
+        with multiprocessing.Pool(min(self._num_workers, len(ranges))) as pool:
+            results = pool.starmap(_merge_term_range, args)
+
+        term_to_ii_position: dict[str, tuple[int, int]] = {}
+        with open(output_path, "wb") as out:
+            for range_path, range_positions in zip(range_paths, results):
+                base = out.tell()
+                for term, (position, document_frequency) in range_positions.items():
+                    term_to_ii_position[term] = (base + position, document_frequency)
+                with open(range_path, "rb") as f:
+                    shutil.copyfileobj(f, out, WRITE_CHUNK_SIZE)
+                # workers only counted in their own copy of the merger
+                self.bytes_written += range_path.stat().st_size
+                range_path.unlink()
+            self.bytes_written += out.tell()
+        self._save_term_dictionary(term_to_ii_position)
+
+    def _merge_partial_indexes(self, output_path: Path, left_path: Path, right_path: Path, _final_merge=False) -> None:
+        """Merge just two runs."""
+        self._merge_runs([left_path, right_path], output_path, _final_merge)
+
+    def _save_term_dictionary(self, term_to_ii_position: dict[str, tuple[int, int]]) -> None:
+        """
+        Save the term dictionary of the inverted index, and the autocomplete table, k-gram index, scoring statistics and champion
+        lists that go with it.
+        """
+        # terms were added in the order they were written, which is term order
+        term_dictionary_fp = self._index_dir / TERM_DICTIONARY_FILE_NAME
+        write_term_dictionary(term_dictionary_fp, ((term, position, document_frequency)
+                                                   for term, (position, document_frequency) in term_to_ii_position.items()))
+        index_log.info(
+            f"Saved term to inverted index binary data position mapping to {term_dictionary_fp}")
+
+        start = time.time()
+        term_dictionary = TermDictionary(term_dictionary_fp)
+        write_completions(self._index_dir / COMPLETIONS_FILE_NAME, term_dictionary)
+        index_log.info(
+            f"Precomputed autocomplete completions in {(time.time() - start):.2f}s")
+        start = time.time()
+        write_kgram_index(self._index_dir / KGRAM_INDEX_FILE_NAME, term_dictionary)
+        term_dictionary.close()
+        index_log.info(
+            f"Built k-gram index for spelling correction in {(time.time() - start):.2f}s")
+        start = time.time()
+        write_statistics(self._index_dir / "inverted_index.bin", self._index_dir / TERM_STATISTICS_FILE_NAME,
+                         self._index_dir / DOC_NORMS_FILE_NAME)
+        index_log.info(
+            f"Computed IDFs, max scores and document norms in {(time.time() - start):.2f}s")
+        start = time.time()
+        write_champion_lists(self._index_dir / "inverted_index.bin", self._index_dir / DOC_NORMS_FILE_NAME,
+                             self._index_dir / CHAMPION_LISTS_FILE_NAME, self._champion_list_size)
+        index_log.info(
+            f"Built champion lists of {self._champion_list_size} documents in {(time.time() - start):.2f}s")
+
+    def merge(self) -> None:
+        """
+        Merge the partial indexes (already sorted) into a single inverted index, in as few passes as fan_in allows.
+        The partial indexes are deleted once the inverted index is complete.
+        """
+        start = time.time()
+        # leftovers of a merge that was interrupted, the runs they came from are all still there
+        for p in self._partial_index_dir.glob("tmp_*.bin"):
+            p.unlink()
+        # only runs, the builder keeps its checkpoint in the same directory. sorted, so equal terms are merged in the same order every time
+        partial_indexes = sorted(self._partial_index_dir.glob("*.bin"))
+        if not partial_indexes:
+            index_log.warning(
+                f"No partial indexes in {self._partial_index_dir}, the inverted index will be empty")
+        self._runs = list(partial_indexes)
 
         run = 0
-        while len(self._runs) > 1:
-            final_merge = len(self._runs) == 2
-            one = self._runs.popleft()
-            two = self._runs.popleft()
-            run_name = self._partial_index_dir / f"tmp_merge_run_{run}.bin"
-            index_log.info(f"Merging {one} and {two} to {run_name}")
-            self._merge_partial_indexes(
-                run_name, one, two, _final_merge=final_merge)
-            self._runs.append(run_name)
-            run += 1
-
-        fully_merged = self._runs.popleft()
-        fully_merged.rename(self._index_dir / "inverted_index.bin")
+        while len(self._runs) > self._fan_in:
+            self.num_passes += 1
+            merged_runs = []
+            for i in range(0, len(self._runs), self._fan_in):
+                group = self._runs[i:i + self._fan_in]
+                if len(group) == 1:
+                    merged_runs.append(group[0])
+                    continue
+                run_name = self._partial_index_dir / f"tmp_merge_run_{run}.bin"
+                index_log.info(
+                    f"Merging {len(group)} runs ({group[0].name} to {group[-1].name}) to {run_name}")
+                self._merge_runs(group, run_name)
+                # the partial indexes themselves are kept until the end, in case the merge is interrupted
+                for path in group:
+                    if path.name.startswith("tmp_"):
+                        path.unlink()
+                merged_runs.append(run_name)
+                run += 1
+            self._runs = merged_runs
+
+        self.num_passes += 1
+        inverted_index_fp = self._index_dir / "inverted_index.bin"
+        index_log.info(
+            f"Merging {len(self._runs)} runs to {inverted_index_fp}")
+        if self._num_workers > 1 and self._runs:
+            self._merge_runs_partitioned(self._runs, inverted_index_fp)
+        else:
+            self._merge_runs(self._runs, inverted_index_fp, final=True)
+
+        for path in self._runs + partial_indexes:
+            path.unlink(missing_ok=True)
+
+        index_log.info(
+            f"Merged {len(partial_indexes)} partial indexes in {self.num_passes} pass(es) with fan-in {self._fan_in}: "
+            f"{self.bytes_written / 2 ** 20:.1f}MB written in {(time.time() - start):.2f}s")
         index_log.info(
-            f"Placing inverted index at {self._index_dir / "inverted_index.bin"}")
+            f"Placing inverted index at {inverted_index_fp}")
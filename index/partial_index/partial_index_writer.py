@@ -0,0 +1,93 @@
+from index.partial_index.partial_index import PartialIndex, WRITE_CHUNK_SIZE
+from utils import index_log
+from pathlib import Path
+from typing import Callable, Optional
+import queue
+import threading
+import time
+
+
+class PartialIndexWriter:
+    """
+    Dumps partial indexes to disk on a background thread, so the builder can hand off a full PartialIndex and keep filling a new one.
+
+    At most max_pending partial indexes can be in flight (queued or being written). Once that many are, submit() blocks until one
+    is done, which bounds memory to about (max_pending + 1) partial indexes. Time spent blocked is tracked as stall time.
+
+    A thread rather than a process, because handing a partial index to another process would mean pickling it, which costs
+    about as much as writing it. Writing mostly happens in C (array buffers, file I/O) and the builder mostly waits on its
+    worker processes, so the two overlap well enough.
+    Must be used as a context manager.
+    """
+
+    def __init__(self, max_pending: int = 2) -> None:
+        if max_pending < 1:
+            raise ValueError(
+                f"At least one partial index has to be allowed in flight, got {max_pending}.")
+        self._max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._queue: queue.Queue[Optional[tuple[PartialIndex, Path, Optional[Callable[[], None]]]]] = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="PartialIndexWriter", daemon=True)
+        # first exception raised on the writer thread, re-raised on the builder's thread
+        self._error: Optional[BaseException] = None
+
+        # statistics
+        self.num_written = 0
+        self.stall_time = 0.0
+        self.write_time = 0.0
+
+    def __enter__(self) -> "PartialIndexWriter":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        index_log.info(
+            f"Background writer: {self.num_written} partial indexes written in {self.write_time:.2f}s, "
+            f"builder stalled {self.stall_time:.2f}s waiting on it, {max(0.0, self.write_time - self.stall_time):.2f}s overlapped")
+        if exc_type is None:
+            self._raise_error()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(
+                "Writing a partial index failed") from self._error
+
+    def submit(self, partial_index: PartialIndex, path: Path, on_written: Optional[Callable[[], None]] = None) -> None:
+        """
+        Queue partial_index to be written to path. partial_index must not be touched by the caller afterwards.
+        on_written is called on the writer thread once the file is completely written, runs are written in submission order.
+        """
+        self._raise_error()
+        start = time.time()
+        self._slots.acquire()
+        self.stall_time += time.time() - start
+        self._queue.put((partial_index, path, on_written))
+
+    def _run(self) -> None:
+        while (item := self._queue.get()) is not None:
+            partial_index, path, on_written = item
+            try:
+                if self._error is None:
+                    self._write(partial_index, path)
+                    if on_written is not None:
+                        on_written()
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._slots.release()
+
+    def _write(self, partial_index: PartialIndex, path: Path) -> None:
+        # serialization is streamed straight into the file, so it never sits in memory next to the partial index
+        start = time.time()
+        with open(path, 'wb', buffering=WRITE_CHUNK_SIZE) as f:
+            partial_index.write(f)
+        end = time.time()
+        self.write_time += end - start
+        self.num_written += 1
+        index_log.info(
+            f"Run {path}: {partial_index.num_terms()} terms, {partial_index.num_postings()} postings, "
+            f"~{partial_index.memory_usage() / 2 ** 20:.1f}MB in memory, {path.stat().st_size / 2 ** 20:.1f}MB on disk, "
+            f"serialized and written in {(end - start):.2f}s")
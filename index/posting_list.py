@@ -1,10 +1,196 @@
-from index.posting import Posting, POSTING_SIZE
-from typing import Iterator, Union, overload, Any
-import struct
+from index.posting import Posting
+from index.varint import decode_varint, decode_varints, encode_varint
+from typing import Iterator, Optional, Sequence, Union, overload, Any
+import bisect
+import itertools
+import operator
 
 
-POSTING_LIST_LENGTH_FORMAT = "<H"
-POSTING_LIST_LENGTH_SIZE = struct.calcsize(POSTING_LIST_LENGTH_FORMAT)
+# a serialized posting list is a header of three varints: the number of postings, the size of the postings in bytes, and the last
+# doc ID (so lists can be skipped, and checked for overlap and concatenated without decoding them). then the postings: every doc ID
+# as the gap from the one before it (the first one from 0), and its term frequency, each a varint. doc IDs of a term are close
+# together and term frequencies are small, so a posting is usually 2 or 3 bytes instead of a fixed 8, and there's no cap on length.
+# lists of more than POSTING_BLOCK_SIZE postings have a skip table between the header and the postings (the header's size covers
+# it): its size in bytes, then the last doc ID (as the gap from the last one of the block before), size in bytes and number of
+# postings of every block of POSTING_BLOCK_SIZE postings. the gaps go on from one block to the next, so the postings decode the
+# same either way, and a block decodes on its own given the last doc ID of the block before it
+
+# postings per block, in long posting lists
+POSTING_BLOCK_SIZE = 128
+
+
+def encode_posting_list(doc_ids: Sequence[int], term_frequencies: Sequence[int], out: bytearray) -> None:
+    """Append the serialization of a posting list, given as its (sorted) doc IDs and term frequencies, to out."""
+    values = [0] * (2 * len(doc_ids))
+    if doc_ids:
+        values[0::2] = [doc_ids[0], *map(operator.sub, doc_ids[1:], doc_ids[:-1])]
+        values[1::2] = term_frequencies
+    block_starts = range(0, len(doc_ids), POSTING_BLOCK_SIZE)
+    if not values or max(values) < 0x80:
+        # every varint is a single byte
+        payload = bytes(values)
+        block_sizes = [2 * min(POSTING_BLOCK_SIZE, len(doc_ids) - start) for start in block_starts]
+    else:
+        payload = bytearray()
+        block_sizes = []
+        for start in block_starts:
+            block_start = len(payload)
+            for value in values[2 * start:2 * (start + POSTING_BLOCK_SIZE)]:
+                encode_varint(value, payload)
+            block_sizes.append(len(payload) - block_start)
+
+    skip_table = bytearray()
+    if len(doc_ids) > POSTING_BLOCK_SIZE:
+        encode_skip_table([(doc_ids[min(start + POSTING_BLOCK_SIZE, len(doc_ids)) - 1], size, min(POSTING_BLOCK_SIZE, len(doc_ids) - start))
+                           for start, size in zip(block_starts, block_sizes)], skip_table)
+    encode_posting_list_header(len(doc_ids), len(skip_table) + len(payload), doc_ids[-1] if doc_ids else 0, out)
+    out += skip_table
+    out += payload
+
+
+def encode_posting_list_header(num_postings: int, size: int, last_doc_id: int, out: bytearray) -> None:
+    """Append a posting list header to out. size is the size of the rest of the posting list (skip table and postings) in bytes."""
+    encode_varint(num_postings, out)
+    encode_varint(size, out)
+    encode_varint(last_doc_id, out)
+
+
+# a block of postings: its last doc ID, size in bytes and number of postings
+Block = tuple[int, int, int]
+
+
+def encode_skip_table(blocks: Sequence[Block], out: bytearray) -> None:
+    """Append the skip table of a posting list with the given blocks to out."""
+    entries = bytearray()
+    previous_doc_id = 0
+    for last_doc_id, size, num_postings in blocks:
+        encode_varint(last_doc_id - previous_doc_id, entries)
+        encode_varint(size, entries)
+        encode_varint(num_postings, entries)
+        previous_doc_id = last_doc_id
+    encode_varint(len(entries), out)
+    out += entries
+
+
+# number of postings, last doc ID, and where the postings start and end
+PostingListHeader = tuple[int, int, int, int]
+
+
+def read_posting_list_header(data: bytes, pos: int = 0) -> PostingListHeader:
+    """
+    Header of the serialized posting list at data[pos]: number of postings, last doc ID, and where its postings start and end.
+    The postings start after the skip table, if the list has one.
+    """
+    num_postings, pos = decode_varint(data, pos)
+    size, pos = decode_varint(data, pos)
+    last_doc_id, pos = decode_varint(data, pos)
+    end = pos + size
+    if num_postings > POSTING_BLOCK_SIZE:
+        skip_table_size, pos = decode_varint(data, pos)
+        pos += skip_table_size
+    return num_postings, last_doc_id, pos, end
+
+
+def read_blocks(data: bytes, pos: int = 0) -> list[Block]:
+    """Blocks of the serialized posting list at data[pos], from its skip table. A list without one is a single block."""
+    num_postings, pos = decode_varint(data, pos)
+    size, pos = decode_varint(data, pos)
+    last_doc_id, pos = decode_varint(data, pos)
+    if num_postings <= POSTING_BLOCK_SIZE:
+        return [(last_doc_id, size, num_postings)]
+    skip_table_size, pos = decode_varint(data, pos)
+    end = pos + skip_table_size
+    blocks = []
+    block_last_doc_id = 0
+    while pos < end:
+        gap, pos = decode_varint(data, pos)
+        block_size, pos = decode_varint(data, pos)
+        block_num_postings, pos = decode_varint(data, pos)
+        block_last_doc_id += gap
+        blocks.append((block_last_doc_id, block_size, block_num_postings))
+    return blocks
+
+
+def decode_postings(data: bytes) -> Iterator[tuple[int, int]]:
+    """(doc ID, term frequency) of every posting in the postings part of a serialized posting list."""
+    # every varint is a single byte in most lists, decode_varints doesn't copy those
+    values = decode_varints(data)
+    return zip(itertools.accumulate(values[0::2]), values[1::2])
+
+
+class PostingListCursor:
+    """
+    Reads a serialized posting list a block at a time, to intersect posting lists without decoding all of them: skip_to looks
+    for the block a doc ID can be in with the skip table, and jumps straight to it, so the blocks in between are never decoded.
+    """
+
+    def __init__(self, data: bytes, pos: int = 0) -> None:
+        self._data = data
+        self._num_postings, _, start, _ = read_posting_list_header(data, pos)
+        blocks = read_blocks(data, pos)
+        self._last_doc_ids = [last_doc_id for last_doc_id, _, _ in blocks]
+        self._block_ends = list(itertools.accumulate((size for _, size, _ in blocks), initial=start))
+        # the decoded block, and the position in it
+        self._block = -1
+        self._doc_ids: list[int] = []
+        self._term_frequencies: Sequence[int] = []
+        self._i = 0
+        self.num_blocks_decoded = 0
+
+    def __len__(self) -> int:
+        return self._num_postings
+
+    def _decode_block(self, block: int) -> None:
+        values = decode_varints(self._data[self._block_ends[block]:self._block_ends[block + 1]])
+        base = self._last_doc_ids[block - 1] if block > 0 else 0
+        self._doc_ids = list(itertools.accumulate(values[0::2], initial=base))
+        del self._doc_ids[0]
+        self._term_frequencies = values[1::2]
+        self._block = block
+        self._i = 0
+        self.num_blocks_decoded += 1
+
+    def skip_to(self, doc_id: int) -> Optional[int]:
+        """
+        Move to the first posting with a doc ID of at least doc_id, from the current one on (a cursor never goes back), and
+        return its doc ID. None if there isn't one.
+        """
+        if self._block < 0 or self._last_doc_ids[self._block] < doc_id:
+            block = bisect.bisect_left(self._last_doc_ids, doc_id, self._block + 1)
+            if block == len(self._last_doc_ids):
+                self._block = block - 1
+                self._i = len(self._doc_ids)
+                return None
+            self._decode_block(block)
+        self._i = bisect.bisect_left(self._doc_ids, doc_id, self._i)
+        # the block's last doc ID is at least doc_id, so this is never past the end of it, unless the cursor already was
+        return self._doc_ids[self._i] if self._i < len(self._doc_ids) else None
+
+    def advance_to(self, doc_id: int) -> Optional[Posting]:
+        """skip_to, returning the posting."""
+        if self.skip_to(doc_id) is None:
+            return None
+        return Posting(self._doc_ids[self._i], self._term_frequencies[self._i])
+
+
+def intersect(cursors: list[PostingListCursor]) -> Iterator[int]:
+    """
+    Doc IDs in all of the cursors' posting lists, in order. The first cursor leads, so it should be the shortest list: every other
+    list only decodes the blocks the doc IDs of the ones before it can be in.
+    """
+    lead, others = cursors[0], cursors[1:]
+    doc_id = lead.skip_to(0)
+    while doc_id is not None:
+        for cursor in others:
+            found = cursor.skip_to(doc_id)
+            if found is None:
+                return
+            if found != doc_id:
+                doc_id = lead.skip_to(found)
+                break
+        else:
+            yield doc_id
+            doc_id = lead.skip_to(doc_id + 1)
 
 
 class PostingList:
@@ -57,27 +243,19 @@ class PostingList:
 
     def serialize(self) -> bytes:
         """
-        Return a serialized representation for disk storage in binary.
-        First portion is number of postings (in bytes), second portion is the serialization of the postings
+        Return a serialized representation for disk storage in binary, see encode_posting_list.
+        Postings have to be sorted by doc ID.
         """
-        serialized_postings = b''.join(
-            [posting.serialize() for posting in self._postings])
-        return struct.pack(POSTING_LIST_LENGTH_FORMAT, len(self._postings)) + serialized_postings
-        return b''.join([posting.serialize() for posting in self._postings])
+        out = bytearray()
+        encode_posting_list([posting.doc_id for posting in self._postings],
+                            [posting.term_frequency for posting in self._postings], out)
+        return bytes(out)
 
     @staticmethod
     def deserialize(data: bytes) -> "PostingList":
-        """Return a PostingList object from a struct serialized representation. Postings are deserialized because we know their exact size. Assumes data attribute is contains only the posting list."""
-        # I hate this so much i hate hate hate byte serialization
+        """Return a PostingList object from its serialized representation. Anything in data after the posting list is ignored."""
         out = PostingList()
-
-        posting_list_length = struct.unpack(
-            POSTING_LIST_LENGTH_FORMAT, data[:POSTING_LIST_LENGTH_SIZE])[0]
-        posting_list_data = data[POSTING_LIST_LENGTH_SIZE:
-                                 POSTING_LIST_LENGTH_SIZE + posting_list_length * POSTING_SIZE]
-
-        for i in range(0, len(posting_list_data), POSTING_SIZE):
-            posting = Posting.deserialize(
-                posting_list_data[i:i + POSTING_SIZE])
-            out._postings.append(posting)
+        _, _, start, end = read_posting_list_header(data)
+        out._postings = [Posting(doc_id, term_frequency)
+                         for doc_id, term_frequency in decode_postings(bytes(data[start:end]))]
         return out
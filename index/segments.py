@@ -0,0 +1,33 @@
+from index.url_store import URL_STORE_FILE_NAME, UrlStore
+from pathlib import Path
+
+# incremental builds don't touch the base index in INDEX_DIR, each one adds a segment under INDEX_DIR/segments/.
+# a segment is laid out exactly like the base index (inverted_index.bin, terms.bin, urls.bin),
+# and its doc IDs carry on from the highest doc ID before it, so concatenating posting lists across segments keeps them sorted
+SEGMENTS_DIR_NAME = "segments"
+
+
+def segment_dirs(index_dir: Path) -> list[Path]:
+    """Segment directories of the index in index_dir, oldest first. Doesn't include the base index itself."""
+    segments_dir = index_dir / SEGMENTS_DIR_NAME
+    if not segments_dir.is_dir():
+        return []
+    return sorted(p for p in segments_dir.iterdir() if p.is_dir())
+
+
+def next_segment_dir(index_dir: Path) -> Path:
+    """Directory the next incremental build writes its segment to. Not created."""
+    segments = segment_dirs(index_dir)
+    number = int(segments[-1].name.split('_')[-1]) + 1 if segments else 0
+    return index_dir / SEGMENTS_DIR_NAME / f"segment_{number:03}"
+
+
+def load_indexed_urls(index_dir: Path) -> dict[str, int]:
+    """URL to doc ID mapping of every document in the base index and its segments."""
+    url_to_doc_id: dict[str, int] = {}
+    for d in [index_dir] + segment_dirs(index_dir):
+        url_store = UrlStore(d / URL_STORE_FILE_NAME)
+        for doc_id, url in url_store.items():
+            url_to_doc_id[url] = doc_id
+        url_store.close()
+    return url_to_doc_id
@@ -0,0 +1,197 @@
+from index.varint import decode_varint, encode_varint
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+import bisect
+import mmap
+import struct
+
+TERM_DICTIONARY_FILE_NAME = "terms.bin"
+
+# magic, number of terms, block size
+_HEADER_FORMAT = "<4sII"
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+_MAGIC = b"TRM2"
+_OFFSET_FORMAT = "<Q"
+_OFFSET_SIZE = struct.calcsize(_OFFSET_FORMAT)
+# terms per front coded block. a lookup decodes at most this many
+TERM_BLOCK_SIZE = 16
+# sorts after anything starting with a given UTF-8 prefix, no UTF-8 encoded string has this byte
+_PREFIX_END = b"\xff"
+
+
+def write_term_dictionary(path: Path, term_entries: Iterable[tuple[str, int, int]], block_size: int = TERM_BLOCK_SIZE) -> None:
+    """
+    Write the terms of an index (or segment) as a term dictionary: every term's position in the inverted index and its document
+    frequency. term_entries has (term, position, document frequency) in term order, which is the order the merger writes terms in,
+    so positions go up too.
+
+    Terms are front coded in blocks of block_size like URLs in a URL store (see write_url_store): the length of the prefix shared
+    with the term before, the length of the rest, and the rest. Each term is followed by its position, as the gap from the position
+    of the term before it in the block (the first of a block has its full position), and its document frequency, so a block
+    decodes on its own.
+    """
+    blob = bytearray()
+    offsets = []
+    previous = b""
+    previous_position = 0
+    num_terms = 0
+    for term, position, document_frequency in term_entries:
+        if num_terms % block_size == 0:
+            offsets.append(len(blob))
+            previous = b""
+            previous_position = 0
+        encoded = term.encode("utf-8")
+        shared = 0
+        limit = min(len(encoded), len(previous))
+        while shared < limit and encoded[shared] == previous[shared]:
+            shared += 1
+        encode_varint(shared, blob)
+        encode_varint(len(encoded) - shared, blob)
+        blob += encoded[shared:]
+        encode_varint(position - previous_position, blob)
+        encode_varint(document_frequency, blob)
+        previous = encoded
+        previous_position = position
+        num_terms += 1
+    offsets.append(len(blob))
+
+    with open(path, 'wb') as f:
+        f.write(struct.pack(_HEADER_FORMAT, _MAGIC, num_terms, block_size))
+        f.write(b''.join(struct.pack(_OFFSET_FORMAT, offset)
+                for offset in offsets))
+        f.write(blob)
+
+
+class TermDictionary:
+    """
+    Read side of a term dictionary, memory mapped, so every process serving queries shares it through the page cache.
+    Only the first term of every block is decoded up front, into a sparse index that's binary searched for the one block a term
+    can be in, which is then scanned.
+
+    Terms are numbered (ordinals) in sorted order, so the terms starting with a prefix are a range of ordinals (see prefix_range).
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._num_terms, self._block_size = struct.unpack_from(
+            _HEADER_FORMAT, self._mmap, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} isn't a term dictionary.")
+        self._num_blocks = (self._num_terms + self._block_size - 1) // self._block_size
+        self._blob_start = _HEADER_SIZE + (self._num_blocks + 1) * _OFFSET_SIZE
+
+        # first term of every block, as UTF-8, which sorts the same as the strings do
+        self._block_terms: list[bytes] = []
+        for block in range(self._num_blocks):
+            pos = self._block_offset(block)
+            _, pos = decode_varint(self._mmap, pos)
+            length, pos = decode_varint(self._mmap, pos)
+            self._block_terms.append(self._mmap[pos:pos + length])
+
+    def __len__(self) -> int:
+        return self._num_terms
+
+    def __contains__(self, term: str) -> bool:
+        return self.lookup(term) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for term, _ in self.items():
+            yield term
+
+    def _block_offset(self, block: int) -> int:
+        return self._blob_start + struct.unpack_from(
+            _OFFSET_FORMAT, self._mmap, _HEADER_SIZE + block * _OFFSET_SIZE)[0]
+
+    def _decode_block(self, block: int) -> Iterator[tuple[bytes, int, int]]:
+        """Every (term, position, document frequency) of block."""
+        pos = self._block_offset(block)
+        count = min(self._block_size, self._num_terms - block * self._block_size)
+        previous = b""
+        position = 0
+        for _ in range(count):
+            shared, pos = decode_varint(self._mmap, pos)
+            suffix_length, pos = decode_varint(self._mmap, pos)
+            previous = previous[:shared] + self._mmap[pos:pos + suffix_length]
+            pos += suffix_length
+            gap, pos = decode_varint(self._mmap, pos)
+            position += gap
+            document_frequency, pos = decode_varint(self._mmap, pos)
+            yield previous, position, document_frequency
+
+    def find(self, term: str) -> Optional[tuple[int, int, int]]:
+        """Ordinal of term, its position in the inverted index and its document frequency, None if the index doesn't have it."""
+        encoded = term.encode("utf-8")
+        block = bisect.bisect_right(self._block_terms, encoded) - 1
+        if block < 0:
+            return None
+        for i, (block_term, position, document_frequency) in enumerate(self._decode_block(block)):
+            if block_term == encoded:
+                return block * self._block_size + i, position, document_frequency
+            if block_term > encoded:
+                return None
+        return None
+
+    def lookup(self, term: str) -> Optional[tuple[int, int]]:
+        """Position of term in the inverted index and its document frequency, None if the index doesn't have it."""
+        entry = self.find(term)
+        return entry[1:] if entry is not None else None
+
+    def get(self, term: str) -> Optional[int]:
+        """Position of term in the inverted index, None if the index doesn't have it."""
+        entry = self.lookup(term)
+        return entry[0] if entry is not None else None
+
+    def _lower_bound(self, encoded: bytes) -> int:
+        """Ordinal of the first term that isn't less than encoded."""
+        block = bisect.bisect_right(self._block_terms, encoded) - 1
+        if block < 0:
+            return 0
+        for i, (block_term, _, _) in enumerate(self._decode_block(block)):
+            if block_term >= encoded:
+                return block * self._block_size + i
+        return min((block + 1) * self._block_size, self._num_terms)
+
+    def prefix_range(self, prefix: str) -> tuple[int, int]:
+        """Ordinals (start inclusive, end exclusive) of the terms that start with prefix."""
+        encoded = prefix.encode("utf-8")
+        return self._lower_bound(encoded), self._lower_bound(encoded + _PREFIX_END)
+
+    def entries(self, start: int = 0, end: Optional[int] = None) -> Iterator[tuple[str, int, int]]:
+        """(term, position, document frequency) of the terms with ordinals start to end (exclusive), in term order."""
+        end = self._num_terms if end is None else min(end, self._num_terms)
+        ordinal = start - start % self._block_size
+        for block in range(start // self._block_size, (end + self._block_size - 1) // self._block_size):
+            for term, position, document_frequency in self._decode_block(block):
+                if start <= ordinal < end:
+                    yield term.decode("utf-8"), position, document_frequency
+                ordinal += 1
+
+    def entry(self, ordinal: int) -> tuple[str, int, int]:
+        """(term, position, document frequency) of the term with the given ordinal."""
+        for entry in self.entries(ordinal, ordinal + 1):
+            return entry
+        raise IndexError(f"No term {ordinal} in a dictionary of {self._num_terms} terms.")
+
+    def entries_at(self, ordinals: Iterable[int]) -> Iterator[tuple[str, int, int]]:
+        """(term, position, document frequency) of the terms with the given (sorted) ordinals. Each block is decoded once."""
+        block = -1
+        decoded: list[tuple[bytes, int, int]] = []
+        for ordinal in ordinals:
+            if ordinal // self._block_size != block:
+                block = ordinal // self._block_size
+                decoded = list(self._decode_block(block))
+            term, position, document_frequency = decoded[ordinal % self._block_size]
+            yield term.decode("utf-8"), position, document_frequency
+
+    def items(self) -> Iterator[tuple[str, int]]:
+        """Every (term, position) in term order, for the odd full scan."""
+        for term, position, _ in self.entries():
+            yield term, position
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __str__(self) -> str:
+        return f"<TermDictionary at {self._path} | {self._num_terms} terms in {self._num_blocks} blocks>"
@@ -0,0 +1,145 @@
+from index.partial_index.partial_index import PartialIndexResource
+from index.varint import decode_varints
+from pathlib import Path
+from typing import Iterator, Sequence, Union
+import array
+import itertools
+import math
+import mmap
+import os
+import struct
+
+TERM_STATISTICS_FILE_NAME = "term_stats.bin"
+DOC_NORMS_FILE_NAME = "doc_norms.bin"
+
+# magic, number of terms, number of documents the IDFs were computed with
+_TERM_STATISTICS_HEADER_FORMAT = "<4sII"
+_TERM_STATISTICS_HEADER_SIZE = struct.calcsize(_TERM_STATISTICS_HEADER_FORMAT)
+_TERM_STATISTICS_MAGIC = b"TST1"
+# IDF and max weight of a term, by term ordinal
+_TERM_STATISTICS_FORMAT = "<ff"
+_TERM_STATISTICS_SIZE = struct.calcsize(_TERM_STATISTICS_FORMAT)
+# magic, first doc ID, number of doc IDs
+_DOC_NORMS_HEADER_FORMAT = "<4sII"
+_DOC_NORMS_HEADER_SIZE = struct.calcsize(_DOC_NORMS_HEADER_FORMAT)
+_DOC_NORMS_MAGIC = b"NRM1"
+
+
+def tf_weight(term_frequency: int) -> float:
+    """Log scaled term frequency, the weight of a term in a document before length normalization. 0 for a term that isn't in it."""
+    return 1 + math.log10(term_frequency) if term_frequency > 0 else 0.0
+
+
+class _Weights(dict):
+    """tf_weight of every term frequency it's asked for, computed once each. Term frequencies are mostly small and repeat a lot."""
+
+    def __init__(self, squared: bool = False) -> None:
+        super().__init__()
+        self._squared = squared
+
+    def __missing__(self, term_frequency: int) -> float:
+        weight = self[term_frequency] = tf_weight(term_frequency) ** (2 if self._squared else 1)
+        return weight
+
+
+def _read_postings(index_fp: Path) -> Iterator[tuple[Iterator[int], Sequence[int]]]:
+    """Doc IDs and term frequencies of every posting list of an inverted index, in term order. Postings aren't made objects of."""
+    with PartialIndexResource(index_fp) as resource:
+        for _, record, _, (_, _, start, end) in resource.read_raw_items():
+            values = decode_varints(record[start:end])
+            yield itertools.accumulate(values[0::2]), values[1::2]
+
+
+def write_statistics(index_fp: Path, term_statistics_fp: Path, doc_norms_fp: Path) -> None:
+    """
+    Precompute the scoring statistics of a merged inverted index: the length (norm) of every document, and the IDF and max weight
+    of every term, in term ordinal order like the term dictionary. Takes two passes over the postings, the norms of a term's
+    documents are needed for its max weight.
+
+    A document's norm is the euclidean length of its tf_weight vector. A term's score in a document is tf_weight / norm * IDF,
+    its max weight is the highest tf_weight / norm over its documents, so IDF * max weight bounds its score for dynamic pruning.
+    The bound is kept apart from the IDF so it still holds with the IDFs of several segments. IDFs are computed with the number
+    of documents that have postings, the URL store isn't always written before the merge (see IndexCompactor).
+    """
+    squared_lengths: dict[int, float] = {}
+    squared_weights = _Weights(squared=True)
+    for doc_ids, term_frequencies in _read_postings(index_fp):
+        for doc_id, term_frequency in zip(doc_ids, term_frequencies):
+            squared_lengths[doc_id] = squared_lengths.get(doc_id, 0.0) + squared_weights[term_frequency]
+
+    first_doc_id = min(squared_lengths, default=0)
+    num_doc_ids = max(squared_lengths, default=-1) + 1 - first_doc_id
+    # documents without postings (in a gap of doc IDs) never get scored, 0 just marks them
+    norms = array.array('f', [0.0]) * num_doc_ids
+    for doc_id, squared_length in squared_lengths.items():
+        norms[doc_id - first_doc_id] = math.sqrt(squared_length)
+    with open(doc_norms_fp, 'wb') as f:
+        f.write(struct.pack(_DOC_NORMS_HEADER_FORMAT, _DOC_NORMS_MAGIC, first_doc_id, num_doc_ids))
+        f.write(norms.tobytes())
+
+    num_docs = len(squared_lengths)
+    statistics = bytearray()
+    num_terms = 0
+    weights = _Weights()
+    # a list indexes faster than an array. a norm of 0 means all the document's term frequencies are 0, so do its weights
+    inverse_norms = [1 / norm if norm else 0.0 for norm in norms]
+    for doc_ids, term_frequencies in _read_postings(index_fp):
+        idf = math.log10(num_docs / len(term_frequencies))
+        max_weight = max(weights[term_frequency] * inverse_norms[doc_id - first_doc_id]
+                         for doc_id, term_frequency in zip(doc_ids, term_frequencies))
+        statistics += struct.pack(_TERM_STATISTICS_FORMAT, idf, max_weight)
+        num_terms += 1
+    with open(term_statistics_fp, 'wb') as f:
+        f.write(struct.pack(_TERM_STATISTICS_HEADER_FORMAT, _TERM_STATISTICS_MAGIC, num_terms, num_docs))
+        f.write(statistics)
+
+
+def _map(path: Path) -> Union[mmap.mmap, bytes]:
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+
+
+class TermStatistics:
+    """Read side of a term statistics table, memory mapped. Terms are looked up by ordinal (see TermDictionary.find)."""
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._mmap = _map(path)
+        magic, self._num_terms, self.num_docs = struct.unpack_from(
+            _TERM_STATISTICS_HEADER_FORMAT, self._mmap, 0)
+        if magic != _TERM_STATISTICS_MAGIC:
+            raise ValueError(f"{path} isn't a term statistics table.")
+
+    def __len__(self) -> int:
+        return self._num_terms
+
+    def get(self, ordinal: int) -> tuple[float, float]:
+        """IDF and max weight of the term with the given ordinal, IDF * max weight is the highest score it can add to a document."""
+        return struct.unpack_from(_TERM_STATISTICS_FORMAT, self._mmap, _TERM_STATISTICS_HEADER_SIZE + ordinal * _TERM_STATISTICS_SIZE)
+
+    def __str__(self) -> str:
+        return f"<TermStatistics at {self._path} | {self._num_terms} terms, IDFs of {self.num_docs} documents>"
+
+
+class DocNorms:
+    """Read side of a document norm array, memory mapped."""
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._mmap = _map(path)
+        magic, self._first_doc_id, self._num_doc_ids = struct.unpack_from(
+            _DOC_NORMS_HEADER_FORMAT, self._mmap, 0)
+        if magic != _DOC_NORMS_MAGIC:
+            raise ValueError(f"{path} isn't a document norm array.")
+        # written from an array, so native floats. indexing a cast view is a lot cheaper than unpacking a struct per document
+        self._norms = memoryview(self._mmap)[_DOC_NORMS_HEADER_SIZE:].cast('f')
+
+    def norm(self, doc_id: int) -> float:
+        """Norm of the document, 0 if it has no postings."""
+        i = doc_id - self._first_doc_id
+        if not 0 <= i < self._num_doc_ids:
+            return 0.0
+        return self._norms[i]
+
+    def __str__(self) -> str:
+        return f"<DocNorms at {self._path} | doc IDs {self._first_doc_id} to {self._first_doc_id + self._num_doc_ids - 1}>"
@@ -0,0 +1,66 @@
+from index.segments import load_indexed_urls
+from utils import index_log
+from pathlib import Path
+from typing import Iterable, Optional
+
+# deleted doc IDs of an index (base and segments alike) live in one bitmap at the index root
+TOMBSTONES_FILE_NAME = "deleted.bin"
+
+
+class Tombstones:
+    """
+    Bitmap of deleted doc IDs, one bit per doc ID, so a million documents cost 125KB and a lookup is a byte index and a mask.
+    Postings of deleted documents stay on disk until a compaction purges them, queries just skip them.
+    """
+
+    def __init__(self, bitmap: Optional[bytearray] = None) -> None:
+        self._bitmap = bitmap if bitmap is not None else bytearray()
+        self._count = sum(byte.bit_count() for byte in self._bitmap)
+
+    @staticmethod
+    def load(index_dir: Path) -> "Tombstones":
+        """Tombstones of the index in index_dir, empty if nothing was ever deleted."""
+        path = index_dir / TOMBSTONES_FILE_NAME
+        if not path.exists():
+            return Tombstones()
+        with open(path, 'rb') as f:
+            return Tombstones(bytearray(f.read()))
+
+    def save(self, index_dir: Path) -> None:
+        with open(index_dir / TOMBSTONES_FILE_NAME, 'wb') as f:
+            f.write(self._bitmap)
+
+    def add(self, doc_id: int) -> None:
+        byte, bit = divmod(doc_id, 8)
+        if byte >= len(self._bitmap):
+            self._bitmap.extend(bytes(byte + 1 - len(self._bitmap)))
+        if not self._bitmap[byte] >> bit & 1:
+            self._bitmap[byte] |= 1 << bit
+            self._count += 1
+
+    def __contains__(self, doc_id: int) -> bool:
+        byte, bit = divmod(doc_id, 8)
+        return byte < len(self._bitmap) and bool(self._bitmap[byte] >> bit & 1)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __str__(self) -> str:
+        return f"<Tombstones | {self._count} deleted documents>"
+
+
+def delete_urls(index_dir: Path, urls: Iterable[str]) -> list[str]:
+    """Tombstone the documents with the given URLs in the index in index_dir. Returns the URLs that weren't in the index."""
+    tombstones = Tombstones.load(index_dir)
+    url_to_doc_id = load_indexed_urls(index_dir)
+    missing = []
+    for url in urls:
+        # same normalization as the builder, fragments were never indexed
+        doc_id = url_to_doc_id.get(url.split('#')[0])
+        if doc_id is None or doc_id in tombstones:
+            missing.append(url)
+            continue
+        tombstones.add(doc_id)
+        index_log.info(f"Deleted {url} (doc ID {doc_id})")
+    tombstones.save(index_dir)
+    return missing
@@ -0,0 +1,128 @@
+from index.varint import decode_varint, encode_varint
+from pathlib import Path
+from typing import Iterator, Mapping, Optional
+import mmap
+import struct
+
+URL_STORE_FILE_NAME = "urls.bin"
+
+# magic, first doc ID, number of doc ID slots, number of URLs, block size
+_HEADER_FORMAT = "<4sIIII"
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+_MAGIC = b"URL1"
+_OFFSET_FORMAT = "<Q"
+_OFFSET_SIZE = struct.calcsize(_OFFSET_FORMAT)
+# URLs per front coded block. a lookup decodes at most this many
+URL_BLOCK_SIZE = 16
+
+
+def write_url_store(path: Path, doc_id_to_url: Mapping[int, str], block_size: int = URL_BLOCK_SIZE) -> None:
+    """
+    Write the doc ID to URL mapping of an index (or segment) as a URL store.
+
+    Doc IDs of an index are (nearly) contiguous, so URLs are stored densely from the smallest doc ID on, and a doc ID
+    that isn't in the mapping (deleted by a compaction) gets an empty URL. URLs are front coded in blocks of block_size:
+    each one is the length of the prefix it shares with the one before it and the rest of it, and the first of a block shares
+    nothing, so a block decodes on its own. Crawls list pages of a site together, so most of a URL is usually shared.
+    """
+    first_doc_id = min(doc_id_to_url, default=0)
+    num_slots = max(doc_id_to_url, default=-1) + 1 - first_doc_id
+
+    blob = bytearray()
+    offsets = []
+    previous = b""
+    for slot in range(num_slots):
+        if slot % block_size == 0:
+            offsets.append(len(blob))
+            previous = b""
+        url = doc_id_to_url.get(first_doc_id + slot, "").encode("utf-8")
+        shared = 0
+        limit = min(len(url), len(previous))
+        while shared < limit and url[shared] == previous[shared]:
+            shared += 1
+        encode_varint(shared, blob)
+        encode_varint(len(url) - shared, blob)
+        blob += url[shared:]
+        previous = url
+    offsets.append(len(blob))
+
+    with open(path, 'wb') as f:
+        f.write(struct.pack(_HEADER_FORMAT, _MAGIC, first_doc_id,
+                num_slots, len(doc_id_to_url), block_size))
+        f.write(b''.join(struct.pack(_OFFSET_FORMAT, offset)
+                for offset in offsets))
+        f.write(blob)
+
+
+class UrlStore:
+    """
+    Read side of a URL store, memory mapped so nothing is parsed up front and every process serving queries shares the
+    pages through the page cache. Only the URLs of results actually returned are ever decoded.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._first_doc_id, self._num_slots, self._num_urls, self._block_size = struct.unpack_from(
+            _HEADER_FORMAT, self._mmap, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} isn't a URL store.")
+        self._num_blocks = (self._num_slots + self._block_size - 1) // self._block_size
+        self._blob_start = _HEADER_SIZE + (self._num_blocks + 1) * _OFFSET_SIZE
+
+    def __len__(self) -> int:
+        """Number of URLs, not counting empty doc ID slots."""
+        return self._num_urls
+
+    def __contains__(self, doc_id: int) -> bool:
+        return self.url(doc_id) is not None
+
+    @property
+    def first_doc_id(self) -> int:
+        return self._first_doc_id
+
+    @property
+    def end_doc_id(self) -> int:
+        """One past the last doc ID in the store."""
+        return self._first_doc_id + self._num_slots
+
+    def _block_offset(self, block: int) -> int:
+        return self._blob_start + struct.unpack_from(
+            _OFFSET_FORMAT, self._mmap, _HEADER_SIZE + block * _OFFSET_SIZE)[0]
+
+    def _decode_block(self, block: int, count: int) -> Iterator[bytes]:
+        """The first count URLs of block."""
+        pos = self._block_offset(block)
+        previous = b""
+        for _ in range(count):
+            shared, pos = decode_varint(self._mmap, pos)
+            suffix_length, pos = decode_varint(self._mmap, pos)
+            previous = previous[:shared] + self._mmap[pos:pos + suffix_length]
+            pos += suffix_length
+            yield previous
+
+    def url(self, doc_id: int) -> Optional[str]:
+        slot = doc_id - self._first_doc_id
+        if not 0 <= slot < self._num_slots:
+            return None
+        block, index = divmod(slot, self._block_size)
+        url = b""
+        for url in self._decode_block(block, index + 1):
+            pass
+        return url.decode("utf-8") or None
+
+    def items(self) -> Iterator[tuple[int, str]]:
+        """Every (doc ID, URL) in doc ID order, for the odd full scan (compaction, incremental builds)."""
+        for block in range(self._num_blocks):
+            first_slot = block * self._block_size
+            count = min(self._block_size, self._num_slots - first_slot)
+            for i, url in enumerate(self._decode_block(block, count)):
+                if url:
+                    yield self._first_doc_id + first_slot + i, url.decode("utf-8")
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __str__(self) -> str:
+        return f"<UrlStore at {self._path} | {self._num_urls} URLs, doc IDs {self._first_doc_id} to {self.end_doc_id - 1}>"
@@ -0,0 +1,65 @@
+"""
+Variable-byte integers: 7 bits a byte, least significant group first, high bit set on every byte but the last.
+Small numbers (string lengths, doc ID gaps) take a single byte instead of a fixed 2 or 4.
+"""
+from typing import BinaryIO, Optional, Sequence
+
+
+def encode_varint(value: int, out: bytearray) -> None:
+    """Append value (non-negative) to out."""
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data: bytes | memoryview, pos: int) -> tuple[int, int]:
+    """Read the varint at data[pos]. Returns the value and the position right after it."""
+    byte = data[pos]
+    if byte < 0x80:
+        # most are a single byte
+        return byte, pos + 1
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def decode_varints(data: bytes) -> Sequence[int]:
+    """Every varint of data, which holds nothing else."""
+    if data.isascii():
+        # every varint is a single byte, the bytes are the values
+        return data
+    values = []
+    value = 0
+    shift = 0
+    for byte in data:
+        if byte < 0x80:
+            values.append(value | byte << shift)
+            value = 0
+            shift = 0
+        else:
+            value |= (byte & 0x7f) << shift
+            shift += 7
+    return values
+
+
+def read_varint(f: BinaryIO, raw: Optional[bytearray] = None) -> Optional[int]:
+    """Read a varint from a file, a byte at a time. None at the end of the file. The bytes read are appended to raw if given."""
+    value = 0
+    shift = 0
+    while True:
+        byte = f.read(1)
+        if byte == b'':
+            return None
+        if raw is not None:
+            raw += byte
+        value |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
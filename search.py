@@ -9,9 +9,11 @@ import time
 def main():
     load_config()
     index_dir = Path(os.environ.get('INDEX_DIR', './inverted_index'))
+    champions = os.environ.get('CHAMPION_LISTS', 'false').lower() == 'true'
 
     try:
-        inverted_index = InvertedIndex(index_dir)
+        inverted_index = InvertedIndex(
+            index_dir, stem_cache_size=int(os.environ.get('STEM_CACHE_SIZE', str(2 ** 17))))
     except FileNotFoundError:
         print(
             f"Error: Inverted index file not found at {index_dir}. Please run the indexer first.")
@@ -23,9 +25,13 @@ def main():
             break
 
         start = time.time()
-        results = inverted_index.ranked_retrieve(query)
+        corrections = {}
+        results = inverted_index.ranked_retrieve(query, champions=champions, corrections=corrections)
         end = time.time()
 
+        for term, corrected in corrections.items():
+            print(f"Searched for {corrected} instead of {term}.")
+
         if results:
             for i, url in enumerate(results):
                 print(f"{i+1}. {url}")
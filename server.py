@@ -6,15 +6,18 @@ import os
 sys.path.append('..')
 from engine.inverted_index import InvertedIndex
 from utils.config import load_config
+from index.completions import COMPLETIONS_K
 
 app = Flask(__name__)
 CORS(app)
 
 load_config()
 index_dir = Path(os.environ.get('INDEX_DIR', './index'))
+champions = os.environ.get('CHAMPION_LISTS', 'false').lower() == 'true'
 
 try:
-    inverted_index = InvertedIndex(index_dir)
+    inverted_index = InvertedIndex(
+        index_dir, stem_cache_size=int(os.environ.get('STEM_CACHE_SIZE', str(2 ** 17))))
     print(f"Inverted index loaded successfully from {index_dir}")
 except FileNotFoundError:
     print(f"Error: Inverted index file not found at {index_dir}. Please run the indexer first.")
@@ -24,14 +27,35 @@ except FileNotFoundError:
 def search():
     query = request.args.get('query', default='', type=str)
     try:
-        results = inverted_index.ranked_retrieve(query)
+        corrections = {}
+        results = inverted_index.ranked_retrieve(query, champions=champions, corrections=corrections)
         return jsonify({
             'query': query,
             'results': results,
-            'count': len(results)
+            'count': len(results),
+            'corrections': corrections
         })
     except Exception as e:
         return jsonify({'error': f'Search failed: {str(e)}'}), 500
 
+@app.route('/api/suggest', methods=['GET'])
+def suggest():
+    prefix = request.args.get('prefix', default='', type=str)
+    k = request.args.get('k', default=COMPLETIONS_K, type=int)
+    try:
+        suggestions = inverted_index.suggest(prefix, max(0, min(k, COMPLETIONS_K)))
+        return jsonify({
+            'prefix': prefix,
+            'suggestions': suggestions
+        })
+    except Exception as e:
+        return jsonify({'error': f'Suggest failed: {str(e)}'}), 500
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    if inverted_index is None:
+        return jsonify({'error': 'Inverted index not loaded'}), 503
+    return jsonify({'stem_cache': inverted_index.stem_cache_stats()})
+
 if __name__ == '__main__':
     app.run(debug=True, port=8080)
\ No newline at end of file
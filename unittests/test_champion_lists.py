@@ -0,0 +1,63 @@
+import unittest
+import math
+import random
+import tempfile
+from pathlib import Path
+from index.champion_lists import CHAMPION_LISTS_FILE_NAME, ChampionLists
+from index.partial_index.partial_index import PartialIndex
+from index.partial_index.partial_index_merger import PartialIndexMerger
+from index.term_dictionary import TERM_DICTIONARY_FILE_NAME, TermDictionary
+from index.term_statistics import tf_weight
+from utils import load_config
+
+
+class TestChampionLists(unittest.TestCase):
+    def setUp(self):
+        load_config()
+        self.pi_dir = tempfile.TemporaryDirectory()
+        self.ii_dir = tempfile.TemporaryDirectory()
+        rng = random.Random(0)
+        self.documents: dict[int, dict[str, int]] = {}
+        for i in range(5):
+            run = PartialIndex()
+            for doc_id in range(i * 20, (i + 1) * 20):
+                tfs = {f"term{min(rng.randrange(40), rng.randrange(40))}": rng.randrange(1, 10) for _ in range(6)}
+                run.add_document(doc_id, tfs)
+                self.documents[doc_id] = tfs
+            with open(Path(self.pi_dir.name) / f'partial_index_{i:03}.bin', 'wb') as f:
+                run.write(f)
+        PartialIndexMerger(Path(self.pi_dir.name), Path(self.ii_dir.name), champion_list_size=8).merge()
+
+    def tearDown(self):
+        self.pi_dir.cleanup()
+        self.ii_dir.cleanup()
+
+    def test_champion_lists(self):
+        norms = {doc_id: math.sqrt(sum(tf_weight(tf) ** 2 for tf in tfs.values())) for doc_id, tfs in self.documents.items()}
+        champion_lists = ChampionLists(Path(self.ii_dir.name) / CHAMPION_LISTS_FILE_NAME)
+        dictionary = TermDictionary(Path(self.ii_dir.name) / TERM_DICTIONARY_FILE_NAME)
+        self.assertEqual(champion_lists.size, 8)
+
+        num_lists = 0
+        for ordinal, (term, _, document_frequency) in enumerate(dictionary.entries()):
+            champions = champion_lists.get(ordinal)
+            if document_frequency <= 8:
+                self.assertIsNone(champions, term)
+                continue
+            num_lists += 1
+            impacts = {doc_id: tf_weight(tfs[term]) / norms[doc_id] for doc_id, tfs in self.documents.items() if term in tfs}
+            self.assertEqual(len(champions), 8)
+            self.assertEqual(len(set(champions)), 8)
+            # highest impact first, and nothing left out scores higher
+            champion_impacts = [impacts[doc_id] for doc_id in champions]
+            self.assertEqual(champion_impacts, sorted(champion_impacts, reverse=True))
+            self.assertGreaterEqual(champion_impacts[-1] + 1e-6,
+                                    max(impact for doc_id, impact in impacts.items() if doc_id not in champions))
+        self.assertEqual(num_lists, len(champion_lists))
+        self.assertGreater(num_lists, 0)
+        dictionary.close()
+        champion_lists.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
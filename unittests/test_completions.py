@@ -0,0 +1,47 @@
+import unittest
+import heapq
+import random
+import tempfile
+from pathlib import Path
+from index.completions import Completions, write_completions
+from index.term_dictionary import TermDictionary, write_term_dictionary
+
+
+class TestCompletions(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        rng = random.Random(0)
+        self.terms = sorted({"".join(rng.choices("abc", k=rng.randint(1, 6))) for _ in range(300)})
+        self.document_frequencies = {term: rng.randint(1, 50) for term in self.terms}
+        write_term_dictionary(Path(self.dir.name) / "terms.bin",
+                              [(term, i, self.document_frequencies[term]) for i, term in enumerate(self.terms)], block_size=4)
+        self.dictionary = TermDictionary(Path(self.dir.name) / "terms.bin")
+
+    def tearDown(self):
+        self.dictionary.close()
+        self.dir.cleanup()
+
+    def test_completions(self):
+        write_completions(Path(self.dir.name) / "completions.bin", self.dictionary, k=3, max_scan=8)
+        completions = Completions(Path(self.dir.name) / "completions.bin")
+        self.assertEqual(completions.k, 3)
+
+        prefixes = {term[:i] for term in self.terms for i in range(1, len(term) + 1)}
+        num_stored = 0
+        for prefix in prefixes:
+            matching = [ordinal for ordinal, term in enumerate(self.terms) if term.startswith(prefix)]
+            stored = completions.get(prefix)
+            if len(matching) <= 8:
+                self.assertIsNone(stored, prefix)
+                continue
+            num_stored += 1
+            expected = heapq.nlargest(3, matching, key=lambda ordinal: self.document_frequencies[self.terms[ordinal]])
+            self.assertEqual(stored, [(self.terms[ordinal], self.document_frequencies[self.terms[ordinal]])
+                                      for ordinal in expected], prefix)
+        self.assertEqual(len(completions), num_stored)
+        self.assertIsNone(completions.get("d"))
+        completions.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
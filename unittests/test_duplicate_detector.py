@@ -0,0 +1,77 @@
+import unittest
+import random
+import json
+from index.partial_index.duplicate_detector import DuplicateDetector, fingerprint
+
+
+def make_page(words: list[str]) -> str:
+    return f"<html><body><p>{' '.join(words)}</p></body></html>"
+
+
+class TestDuplicateDetector(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        vocabulary = [f"word{i}" for i in range(300)]
+        self.words = rng.choices(vocabulary, k=400)
+        self.other_words = rng.choices(vocabulary, k=400)
+
+    def test_fingerprint_ignores_markup(self):
+        plain = fingerprint(make_page(self.words))
+        styled = fingerprint(
+            "<div class='x'><script>var a = 1;</script>" + make_page(self.words) + "</div>")
+        self.assertEqual(plain.simhash, styled.simhash)
+        self.assertNotEqual(plain.digest, styled.digest)
+
+    def test_exact(self):
+        detector = DuplicateDetector("exact")
+        page = make_page(self.words)
+        self.assertIsNone(detector.check(fingerprint(page)))
+        self.assertEqual(detector.check(fingerprint(page)), "exact")
+        # near duplicates aren't looked for in exact mode
+        self.assertIsNone(detector.check(
+            fingerprint(make_page(self.words + ["extra"]))))
+        self.assertEqual(detector.num_exact, 1)
+
+    def test_near(self):
+        detector = DuplicateDetector("near", max_distance=3)
+        self.assertIsNone(detector.check(fingerprint(make_page(self.words))))
+        self.assertEqual(detector.check(
+            fingerprint(make_page(self.words + ["extra"]))), "near")
+        self.assertIsNone(detector.check(
+            fingerprint(make_page(self.other_words))))
+        self.assertEqual(detector.num_near, 1)
+
+    def test_near_skips_tiny_pages(self):
+        detector = DuplicateDetector("near")
+        self.assertIsNone(detector.check(fingerprint(make_page(["a", "b"]))))
+        self.assertIsNone(detector.check(fingerprint(make_page(["a", "c"]))))
+
+    def test_none(self):
+        detector = DuplicateDetector("none")
+        page = make_page(self.words)
+        self.assertIsNone(detector.check(fingerprint(page)))
+        self.assertIsNone(detector.check(fingerprint(page)))
+
+    def test_state_restore(self):
+        detector = DuplicateDetector("near", max_distance=3)
+        fp = fingerprint(make_page(self.words))
+        detector.check(fp)
+        detector.check(fp)
+        restored = DuplicateDetector("near", max_distance=3)
+        restored.restore(json.loads(json.dumps(detector.state())))
+        restored.remember(fp)
+        self.assertEqual(restored.num_exact, 1)
+        self.assertEqual(restored.check(
+            fingerprint(make_page(self.words))), "exact")
+        self.assertEqual(restored.check(
+            fingerprint(make_page(self.words + ["extra"]))), "near")
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            DuplicateDetector("fuzzy")
+        with self.assertRaises(ValueError):
+            DuplicateDetector("near", max_distance=64)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,20 @@
 import unittest
+import unittest.mock
 
 from index.posting import Posting
 from index.term import Term
 from index.indexer import Indexer
 from pathlib import Path
 import tempfile
+import json
+import math
 from utils import load_config
-from index.partial_index import PartialIndexBuilder
+from index.partial_index import PartialIndexBuilder, PartialIndexMerger
+from index.segments import segment_dirs
+from index.tombstones import Tombstones, delete_urls
+from index.compactor import IndexCompactor
+from engine.inverted_index import InvertedIndex
+import shutil
 
 
 class TestInvertedIndex(unittest.TestCase):
@@ -54,13 +62,13 @@ class TestInvertedIndex(unittest.TestCase):
         doc_1_id = 1 - 1
         doc_2_id = 2 - 1
         self.assertEqual(
-            indexer._partial_index._index[Term('foo')]._postings,
+            indexer._partial_index.posting_list(Term('foo'))._postings,
             [Posting(doc_1_id, 6), Posting(doc_2_id, 3)])
         self.assertEqual(
-            indexer._partial_index._index[Term('bar')]._postings,
+            indexer._partial_index.posting_list(Term('bar'))._postings,
             [Posting(doc_1_id, 3), Posting(doc_2_id, 6)])
         self.assertEqual(
-            indexer._partial_index._index[Term('baz')]._postings,
+            indexer._partial_index.posting_list(Term('baz'))._postings,
             [Posting(doc_1_id, 1), Posting(doc_2_id, 1)])
 
     def test_merge(self):
@@ -79,6 +87,373 @@ class TestInvertedIndex(unittest.TestCase):
             len(list(path.iterdir())), 2
         )
 
+    def write_html_docs(self, webpages_dir: Path) -> None:
+        words = ["alpha", "beta", "gamma", "delta", "epsilon", "running", "runner", "zeta"]
+        for i in range(40):
+            body = " ".join(words[(i + j) % len(words)] for j in range(i % 7 + 3))
+            # every tenth document repeats a URL, which should be skipped in both modes
+            url = f"https://example.com/{i - 1 if i % 10 == 9 else i}"
+            content = f"<html><title>page {i}</title><body><p>{body}</p><b>{words[i % len(words)]}</b></body></html>"
+            with open(webpages_dir / f"{i:03}.json", 'w') as f:
+                json.dump({"url": url, "content": content,
+                          "encoding": "utf-8"}, f)
+
+    def test_parallel_build_matches_serial(self):
+        with tempfile.TemporaryDirectory() as webpages_dir, tempfile.TemporaryDirectory() as pi_dir, tempfile.TemporaryDirectory() as ii_dir:
+            self.write_html_docs(Path(webpages_dir))
+            serial = Indexer(Path(webpages_dir), Path(self.pi_dir.name),
+                             Path(self.ii_dir.name), num_workers=1)
+            serial.construct()
+            parallel = Indexer(Path(webpages_dir), Path(pi_dir),
+                               Path(ii_dir), num_workers=2)
+            parallel.construct()
+
+            for fname in ["inverted_index.bin", "urls.bin"]:
+                with open(Path(self.ii_dir.name) / fname, 'rb') as f1, open(Path(ii_dir) / fname, 'rb') as f2:
+                    self.assertEqual(f1.read(), f2.read(), fname)
+
+    def test_duplicate_content_dropped(self):
+        with tempfile.TemporaryDirectory() as webpages_dir:
+            self.write_html_docs(Path(webpages_dir))
+            # a mirror of 000.json under another URL
+            with open(Path(webpages_dir) / "000.json") as f:
+                mirrored = json.load(f)
+            mirrored["url"] = "https://mirror.example.com/0"
+            with open(Path(webpages_dir) / "100.json", 'w') as f:
+                json.dump(mirrored, f)
+
+            for num_workers in [1, 2]:
+                with tempfile.TemporaryDirectory() as pi_dir, tempfile.TemporaryDirectory() as ii_dir:
+                    builder = PartialIndexBuilder(Path(webpages_dir), Path(pi_dir), Path(ii_dir),
+                                                  num_workers=num_workers, duplicate_detection="exact")
+                    builder.build()
+                    self.assertNotIn(
+                        "https://mirror.example.com/0", builder._doc_id_map.values())
+                    self.assertEqual(builder._duplicates.num_exact, 1)
+
+    def test_memory_budget_splits_runs(self):
+        with tempfile.TemporaryDirectory() as webpages_dir, tempfile.TemporaryDirectory() as pi_dir, tempfile.TemporaryDirectory() as ii_dir:
+            self.write_html_docs(Path(webpages_dir))
+            one_run = Indexer(Path(webpages_dir), Path(self.pi_dir.name),
+                              Path(self.ii_dir.name))
+            one_run.construct()
+            self.assertEqual(len(list(Path(self.pi_dir.name).iterdir())), 0)
+
+            builder = PartialIndexBuilder(Path(webpages_dir), Path(pi_dir), Path(ii_dir),
+                                          memory_budget=1024)
+            builder.build()
+            self.assertGreater(builder._partial_index_count, 1)
+            self.assertEqual(
+                len(list(Path(pi_dir).glob("*.bin"))), builder._partial_index_count)
+
+            PartialIndexMerger(Path(pi_dir), Path(ii_dir)).merge()
+            with open(Path(self.ii_dir.name) / "inverted_index.bin", 'rb') as f1, open(Path(ii_dir) / "inverted_index.bin", 'rb') as f2:
+                self.assertEqual(f1.read(), f2.read())
+
+    def test_incremental_build_adds_segment(self):
+        with tempfile.TemporaryDirectory() as webpages_dir, tempfile.TemporaryDirectory() as base_dir, \
+                tempfile.TemporaryDirectory() as pi_dir, tempfile.TemporaryDirectory() as ii_dir:
+            self.write_html_docs(Path(webpages_dir))
+            for path in sorted(Path(webpages_dir).iterdir())[:20]:
+                shutil.copy(path, base_dir)
+
+            full = Indexer(Path(webpages_dir), Path(self.pi_dir.name),
+                           Path(self.ii_dir.name))
+            full.construct()
+            Indexer(Path(base_dir), Path(pi_dir), Path(ii_dir)).construct()
+            # the whole crawl again, the first half is already indexed and should be skipped
+            Indexer(Path(webpages_dir), Path(pi_dir), Path(ii_dir),
+                    incremental=True).construct()
+            self.assertEqual(len(segment_dirs(Path(ii_dir))), 1)
+
+            # nothing new this time, so no segment
+            Indexer(Path(webpages_dir), Path(pi_dir), Path(ii_dir),
+                    incremental=True).construct()
+            self.assertEqual(len(segment_dirs(Path(ii_dir))), 1)
+
+            expected = InvertedIndex(Path(self.ii_dir.name))
+            incremental = InvertedIndex(Path(ii_dir))
+            self.assertEqual([incremental._url(doc_id) for doc_id in range(40)],
+                             [expected._url(doc_id) for doc_id in range(40)])
+            self.assertEqual(incremental._num_docs, 36)
+            for term in ["alpha", "run", "zeta", "page"]:
+                self.assertEqual(incremental._search_term(Term(term)),
+                                 expected._search_term(Term(term)), term)
+                self.assertGreater(len(incremental._search_term(Term(term))), 0)
+
+    def test_update_delete_compact(self):
+        with tempfile.TemporaryDirectory() as webpages_dir, tempfile.TemporaryDirectory() as delta_dir, tempfile.TemporaryDirectory() as ii_dir:
+            self.write_html_docs(Path(webpages_dir))
+            ii_path = Path(ii_dir)
+            Indexer(Path(webpages_dir), Path(self.pi_dir.name), ii_path).construct()
+            with open(Path(delta_dir) / "005.json", 'w') as f:
+                json.dump({"url": "https://example.com/5", "content": "<html><body><p>omega</p></body></html>",
+                           "encoding": "utf-8"}, f)
+
+            Indexer(Path(delta_dir), Path(self.pi_dir.name), ii_path,
+                    incremental=True, update=True).construct()
+            index = InvertedIndex(ii_path)
+            self.assertIn(5, index._deleted)
+            self.assertEqual(index.bool_retrieve("omega"), ["https://example.com/5"])
+            # the old version's words don't find it anymore, even though its postings are still there
+            self.assertIn(5, [p.doc_id for p in index._search_term(Term("page"))])
+            self.assertNotIn("https://example.com/5", index.bool_retrieve("page 5"))
+
+            self.assertEqual(delete_urls(ii_path, ["https://example.com/6", "https://nowhere.com"]),
+                             ["https://nowhere.com"])
+            index = InvertedIndex(ii_path)
+            self.assertIn(6, index._deleted)
+            before = index._search_term(Term("page"))
+
+            IndexCompactor(Path(self.pi_dir.name), ii_path).compact()
+            self.assertEqual(segment_dirs(ii_path), [])
+            self.assertEqual(len(Tombstones.load(ii_path)), 0)
+            index = InvertedIndex(ii_path)
+            after = index._search_term(Term("page"))
+            self.assertEqual([p for p in before if p.doc_id not in (5, 6)], list(after))
+            self.assertEqual(index.bool_retrieve("omega"), ["https://example.com/5"])
+            self.assertIsNone(index._url(6))
+            self.assertEqual(index._num_docs, 35)
+
+    def test_resume_after_crash(self):
+        class CrashingBuilder(PartialIndexBuilder):
+            def _create_new_partial_index(self, writer):
+                if self._partial_index_count == 3:
+                    raise KeyboardInterrupt
+                super()._create_new_partial_index(writer)
+
+        with tempfile.TemporaryDirectory() as webpages_dir, tempfile.TemporaryDirectory() as pi_dir, tempfile.TemporaryDirectory() as ii_dir:
+            self.write_html_docs(Path(webpages_dir))
+            Indexer(Path(webpages_dir), Path(self.pi_dir.name), Path(self.ii_dir.name),
+                    duplicate_detection="near").construct()
+
+            crashing = CrashingBuilder(Path(webpages_dir), Path(pi_dir), Path(ii_dir),
+                                       memory_budget=1024, duplicate_detection="near")
+            with self.assertRaises(KeyboardInterrupt):
+                crashing.build()
+            self.assertTrue((Path(pi_dir) / "checkpoint.json").exists())
+
+            resumed = PartialIndexBuilder(Path(webpages_dir), Path(pi_dir), Path(ii_dir),
+                                          memory_budget=1024, duplicate_detection="near")
+            resumed._restore_checkpoint()
+            # only documents after the last complete run are parsed again
+            self.assertEqual(resumed._partial_index_count, 3)
+            self.assertGreater(resumed._docs_consumed, 0)
+            # the checkpoint only has offsets into the document log, which has every document up to it
+            with open(Path(pi_dir) / "checkpoint.json") as f:
+                self.assertNotIn("doc_id_map", json.load(f))
+            self.assertEqual(sorted(resumed._doc_id_map), list(range(resumed._num_docs)))
+
+            Indexer(Path(webpages_dir), Path(pi_dir), Path(ii_dir), memory_budget=1024,
+                    duplicate_detection="near", resume=True).construct()
+            self.assertFalse((Path(pi_dir) / "checkpoint.json").exists())
+            self.assertFalse((Path(pi_dir) / "documents.jsonl").exists())
+            for fname in ["inverted_index.bin", "urls.bin"]:
+                with open(Path(self.ii_dir.name) / fname, 'rb') as f1, open(Path(ii_dir) / fname, 'rb') as f2:
+                    self.assertEqual(f1.read(), f2.read(), fname)
+
+    def test_anchor_text(self):
+        with tempfile.TemporaryDirectory() as webpages_dir, tempfile.TemporaryDirectory() as pi_dir, tempfile.TemporaryDirectory() as ii_dir:
+            self.write_html_docs(Path(webpages_dir))
+            # two pages linking to page 3 and one to a page that was never crawled
+            for i, target in [(50, "/3"), (51, "/3#top"), (52, "/404")]:
+                content = f'<html><body><p>links</p><a href="{target}">wombat Wombats</a></body></html>'
+                with open(Path(webpages_dir) / f"{i:03}.json", 'w') as f:
+                    json.dump({"url": f"https://example.com/{i}", "content": content,
+                               "encoding": "utf-8"}, f)
+
+            Indexer(Path(webpages_dir), Path(self.pi_dir.name), Path(self.ii_dir.name),
+                    anchor_text=True, memory_budget=2048).construct()
+            Indexer(Path(webpages_dir), Path(pi_dir), Path(ii_dir), num_workers=2,
+                    anchor_text=True).construct()
+            with open(Path(self.ii_dir.name) / "inverted_index.bin", 'rb') as f1, open(Path(ii_dir) / "inverted_index.bin", 'rb') as f2:
+                self.assertEqual(f1.read(), f2.read())
+
+            index = InvertedIndex(Path(ii_dir))
+            # the linking pages have the words themselves, page 3 gets both links' anchor text and the uncrawled page nothing
+            self.assertEqual(list(index._search_term(Term("wombat"))),
+                             [Posting(3, 4), Posting(36, 2), Posting(37, 2), Posting(38, 2)])
+
+    def test_suggest_and_wildcard(self):
+        with tempfile.TemporaryDirectory() as webpages_dir, tempfile.TemporaryDirectory() as base_dir, \
+                tempfile.TemporaryDirectory() as pi_dir, tempfile.TemporaryDirectory() as ii_dir:
+            self.write_html_docs(Path(webpages_dir))
+            for path in sorted(Path(webpages_dir).iterdir())[:20]:
+                shutil.copy(path, base_dir)
+            Indexer(Path(webpages_dir), Path(self.pi_dir.name),
+                    Path(self.ii_dir.name)).construct()
+            # the same documents in two segments
+            Indexer(Path(base_dir), Path(pi_dir), Path(ii_dir)).construct()
+            Indexer(Path(webpages_dir), Path(pi_dir), Path(ii_dir),
+                    incremental=True).construct()
+
+            index = InvertedIndex(Path(self.ii_dir.name))
+            # suggestions are index terms, so stems: running is indexed as run
+            suggestions = index.suggest("Ru")
+            self.assertEqual(set(suggestions), {"run", "runner"})
+            document_frequencies = [len(index._search_term(Term(term))) for term in suggestions]
+            self.assertEqual(document_frequencies, sorted(document_frequencies, reverse=True))
+            self.assertEqual(index.suggest("ru", k=1), suggestions[:1])
+            self.assertEqual(index.suggest(""), [])
+            self.assertEqual(index.suggest("wombat"), [])
+            self.assertEqual(InvertedIndex(Path(ii_dir)).suggest("ru"), suggestions)
+
+            posting_lists = index._retrieve("run*")
+            doc_ids = {posting.doc_id for term in ["run", "runner"]
+                       for posting in index._search_term(Term(term))}
+            self.assertEqual([posting.doc_id for posting in posting_lists[Term("run*")]], sorted(doc_ids))
+
+    def test_wildcard_matches_every_term(self):
+        with tempfile.TemporaryDirectory() as webpages_dir:
+            self.write_html_docs(Path(webpages_dir))
+            # more terms starting with "qz" than suggest() returns
+            words = [f"qz{a}{b}x" for a in "abcd" for b in "abcd"]
+            for i, word in enumerate(words):
+                # qzddx is in two documents, the others in one
+                content = f"<html><body><p>{word} alpha{' qzddx' if i == 0 else ''}</p></body></html>"
+                with open(Path(webpages_dir) / f"{100 + i}.json", 'w') as f:
+                    json.dump({"url": f"https://example.com/qz/{i}", "content": content, "encoding": "utf-8"}, f)
+            Indexer(Path(webpages_dir), Path(self.pi_dir.name),
+                    Path(self.ii_dir.name)).construct()
+            index = InvertedIndex(Path(self.ii_dir.name))
+            self.assertLess(len(index.suggest("qz")), len(words))
+            doc_ids = sorted({posting.doc_id for word in words for posting in index._search_term(Term(word))})
+            self.assertEqual(len(doc_ids), len(words))
+            self.assertEqual([posting.doc_id for posting in index._search_wildcard("QZ")], doc_ids)
+            # an AND with the wildcard keeps the documents of every matching term
+            self.assertEqual(index.bool_retrieve("qz* alpha"), [index._url(doc_id) for doc_id in doc_ids[:5]])
+            self.assertEqual(len(index.ranked_retrieve("qz*")), 5)
+
+            # past the cap, the terms in the most documents are kept
+            self.assertEqual(len(index._wildcard_terms("qz")), len(words))
+            with unittest.mock.patch("engine.inverted_index.WILDCARD_MAX_TERMS", 1):
+                self.assertEqual(index._wildcard_terms("qz"), ["qzddx"])
+
+    def test_spelling_correction(self):
+        with tempfile.TemporaryDirectory() as webpages_dir:
+            self.write_html_docs(Path(webpages_dir))
+            Indexer(Path(webpages_dir), Path(self.pi_dir.name),
+                    Path(self.ii_dir.name)).construct()
+            index = InvertedIndex(Path(self.ii_dir.name))
+            self.assertEqual(index.correct("gamm"), "gamma")
+            self.assertEqual(index.correct("epsilom"), "epsilon")
+            self.assertEqual(index.correct("qwxyz"), None)
+            # too short to guess
+            self.assertEqual(index.correct("ru"), None)
+            self.assertEqual(list(index._retrieve("alpah", correct=True).values()),
+                             [index._search_term(Term("alpha"))])
+            corrections = {}
+            self.assertEqual(index.ranked_retrieve("alpah", corrections=corrections), index.ranked_retrieve("alpha"))
+            self.assertEqual(corrections, {"alpah": "alpha"})
+            # only when asked for, boolean queries are taken as written
+            self.assertEqual(index.ranked_retrieve("alpah"), [])
+            self.assertEqual(index.bool_retrieve("alpah"), [])
+            # terms with digits aren't corrected
+            corrections = {}
+            index.ranked_retrieve("pag3", corrections=corrections)
+            self.assertEqual(corrections, {})
+
+    def test_bool_retrieve(self):
+        with tempfile.TemporaryDirectory() as webpages_dir:
+            self.write_html_docs(Path(webpages_dir))
+            Indexer(Path(webpages_dir), Path(self.pi_dir.name),
+                    Path(self.ii_dir.name)).construct()
+            index = InvertedIndex(Path(self.ii_dir.name))
+            for query in ["alpha", "alpha beta", "running zeta gamma", "page alpha", "delt* beta", "alpha wombat"]:
+                doc_ids = None
+                for term in ["run" if word == "running" else word for word in query.split()]:
+                    if term.endswith("*"):
+                        term_doc_ids = {posting.doc_id for posting in index._search_wildcard(term[:-1])}
+                    else:
+                        term_doc_ids = {posting.doc_id for posting in index._search_term(Term(term))}
+                    doc_ids = term_doc_ids if doc_ids is None else doc_ids & term_doc_ids
+                self.assertEqual(index.bool_retrieve(query), [index._url(doc_id) for doc_id in sorted(doc_ids)[:5]], query)
+
+    def test_ranked_retrieve(self):
+        with tempfile.TemporaryDirectory() as webpages_dir, tempfile.TemporaryDirectory() as base_dir, \
+                tempfile.TemporaryDirectory() as pi_dir, tempfile.TemporaryDirectory() as ii_dir:
+            self.write_html_docs(Path(webpages_dir))
+            for path in sorted(Path(webpages_dir).iterdir())[:20]:
+                shutil.copy(path, base_dir)
+            Indexer(Path(webpages_dir), Path(self.pi_dir.name),
+                    Path(self.ii_dir.name)).construct()
+            # the same documents in two segments, where IDFs can't come from a single segment's statistics
+            Indexer(Path(base_dir), Path(pi_dir), Path(ii_dir)).construct()
+            Indexer(Path(webpages_dir), Path(pi_dir), Path(ii_dir),
+                    incremental=True).construct()
+
+            for index in [InvertedIndex(Path(self.ii_dir.name)), InvertedIndex(Path(ii_dir))]:
+                # cosine normalized TF-IDF, from the posting lists alone
+                tfs: dict[int, dict[str, int]] = {}
+                for term in set().union(*(segment.terms() for segment in index._segments)):
+                    for posting in index._search_term(Term(term)):
+                        tfs.setdefault(posting.doc_id, {})[term] = posting.term_frequency
+                url_to_doc_id = {index._url(doc_id): doc_id for doc_id in tfs}
+                for query in ["alpha", "alpha beta", "running zeta gamma", "page alpha", "gamma wombat"]:
+                    terms = ["run" if word == "running" else word for word in query.split()]
+                    scores = {}
+                    for doc_id, doc_tfs in tfs.items():
+                        if doc_id in index._deleted:
+                            continue
+                        norm = math.sqrt(sum((1 + math.log10(tf)) ** 2 for tf in doc_tfs.values()))
+                        matched = [term for term in terms if term in doc_tfs]
+                        if not matched:
+                            continue
+                        score = sum((1 + math.log10(doc_tfs[term])) * math.log10(index._num_scored_docs / len(index._search_term(Term(term))))
+                                    for term in matched) / norm
+                        scores[doc_id] = score if len(matched) > len(terms) * 0.75 else 0.0
+                    results = index.ranked_retrieve(query)
+                    expected = sorted(scores.values(), reverse=True)[:5]
+                    self.assertEqual(len(results), len(expected), query)
+                    for url, score in zip(results, expected):
+                        self.assertAlmostEqual(scores[url_to_doc_id[url]], score, places=5, msg=query)
+
+    def test_idf_after_deletions(self):
+        with tempfile.TemporaryDirectory() as webpages_dir:
+            self.write_html_docs(Path(webpages_dir))
+            ii_path = Path(self.ii_dir.name)
+            Indexer(Path(webpages_dir), Path(self.pi_dir.name), ii_path).construct()
+            index = InvertedIndex(ii_path)
+            terms = ["page", "alpha", "run"]
+            idfs = [index._idf(term, len(index._search_term(Term(term)))) for term in terms]
+            self.assertAlmostEqual(idfs[0], 0.0, places=6)
+
+            delete_urls(ii_path, [f"https://example.com/{i}" for i in range(10, 20)])
+            index = InvertedIndex(ii_path)
+            # deleted documents' postings still count in document frequencies, so they still count in N too
+            for term, idf in zip(terms, idfs):
+                document_frequency = len(index._search_term(Term(term)))
+                self.assertAlmostEqual(index._idf(term, document_frequency), idf, places=6)
+                self.assertAlmostEqual(index._idf(term, document_frequency),
+                                       math.log10(index._num_scored_docs / document_frequency), places=6)
+            self.assertGreaterEqual(index._idf("page", index._num_scored_docs + 1), 0.0)
+            deleted_urls = {f"https://example.com/{i}" for i in range(10, 20)}
+            for query in ["page", "page alpha", "run zeta"]:
+                results = index.ranked_retrieve(query)
+                self.assertEqual(len(results), 5)
+                self.assertFalse(deleted_urls & set(results), query)
+
+    def test_champion_retrieve(self):
+        with tempfile.TemporaryDirectory() as webpages_dir, tempfile.TemporaryDirectory() as pi_dir, tempfile.TemporaryDirectory() as ii_dir:
+            self.write_html_docs(Path(webpages_dir))
+            Indexer(Path(webpages_dir), Path(self.pi_dir.name),
+                    Path(self.ii_dir.name)).construct()
+            Indexer(Path(webpages_dir), Path(pi_dir), Path(ii_dir), champion_list_size=5).construct()
+            # no term is in more than 64 documents, so every champion list is a whole posting list
+            index = InvertedIndex(Path(self.ii_dir.name))
+            small_index = InvertedIndex(Path(ii_dir))
+            for query in ["alpha", "alpha beta", "running zeta gamma", "page alpha", "gamma wombat", "delt* beta"]:
+                self.assertEqual(index.ranked_retrieve(query, champions=True), index.ranked_retrieve(query), query)
+                self.assertEqual(small_index.ranked_retrieve(query), index.ranked_retrieve(query), query)
+
+            # a term's score is IDF * impact, so the top 5 of a single term are its champion list of 5
+            for term in ["alpha", "gamma", "run", "page"]:
+                self.assertEqual(set(small_index.ranked_retrieve(term, champions=True)),
+                                 {small_index._url(doc_id) for doc_id in small_index._segments[0].champions(term)}, term)
+            self.assertEqual(small_index._champion_retrieve(["alpha"], k=6), None)
+            self.assertEqual(len(small_index.ranked_retrieve("alpha", champions=True)), 5)
+            # more candidates than any one champion list
+            self.assertEqual(len(small_index._champion_retrieve(["alpha", "beta"], k=6)), 6)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import random
+import tempfile
+from pathlib import Path
+from index.kgram_index import KGramIndex, edit_distance, kgrams, max_edit_distance, write_kgram_index
+from index.term_dictionary import TermDictionary, write_term_dictionary
+
+
+def levenshtein(a: str, b: str) -> int:
+    # the whole table, no early exit
+    table = [[i + j if i == 0 or j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            table[i][j] = min(table[i - 1][j] + 1, table[i][j - 1] + 1, table[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+    return table[len(a)][len(b)]
+
+
+class TestKGramIndex(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        rng = random.Random(0)
+        self.terms = sorted({"".join(rng.choices("abcd", k=rng.randint(1, 7))) for _ in range(500)} | {"café", "cafe"})
+        write_term_dictionary(Path(self.dir.name) / "terms.bin",
+                              [(term, i, 1) for i, term in enumerate(self.terms)], block_size=4)
+        self.dictionary = TermDictionary(Path(self.dir.name) / "terms.bin")
+        write_kgram_index(Path(self.dir.name) / "kgrams.bin", self.dictionary)
+        self.kgram_index = KGramIndex(Path(self.dir.name) / "kgrams.bin")
+
+    def tearDown(self):
+        self.kgram_index.close()
+        self.dictionary.close()
+        self.dir.cleanup()
+
+    def test_kgrams(self):
+        self.assertEqual(kgrams("abab"), {"$a", "ab", "ba", "b$"})
+        self.assertEqual(kgrams("a"), {"$a", "a$"})
+
+    def test_edit_distance(self):
+        rng = random.Random(1)
+        for _ in range(300):
+            a = "".join(rng.choices("abc", k=rng.randint(0, 6)))
+            b = "".join(rng.choices("abc", k=rng.randint(0, 6)))
+            self.assertEqual(edit_distance(a, b, 2), min(levenshtein(a, b), 3), (a, b))
+        self.assertEqual(max_edit_distance("ab"), 0)
+        self.assertEqual(max_edit_distance("abcd"), 1)
+        self.assertEqual(max_edit_distance("abcde"), 2)
+
+    def test_candidates(self):
+        # every term within the distance has to be a candidate, the k-gram filter can only ever drop terms that are too far
+        rng = random.Random(2)
+        queries = ["".join(rng.choices("abcde", k=rng.randint(3, 8))) for _ in range(100)] + ["cafè", "cafe"]
+        for query in queries:
+            max_distance = max_edit_distance(query)
+            candidates = self.kgram_index.candidates(query, max_distance)
+            expected = {ordinal for ordinal, term in enumerate(self.terms)
+                        if levenshtein(query, term) <= max_distance}
+            self.assertLessEqual(expected, set(candidates), query)
+            self.assertLess(len(candidates), len(self.terms))
+        self.assertEqual(self.kgram_index.candidates("xyz", 1), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
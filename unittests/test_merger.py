@@ -3,11 +3,13 @@ import unittest
 from index.partial_index.partial_index_merger import PartialIndexMerger
 from index.partial_index.partial_index import PartialIndex
 from index.posting import Posting
-from index.posting_list import PostingList
+from index.posting_list import POSTING_BLOCK_SIZE, PostingList, PostingListCursor, read_blocks, read_posting_list_header
 from index.term import Term
+from index.term_dictionary import TERM_DICTIONARY_FILE_NAME, TermDictionary
 from index.indexer import Indexer
 from pathlib import Path
 import tempfile
+import random
 from utils import load_config
 
 
@@ -246,3 +248,117 @@ class TestMerger(unittest.TestCase):
             out_index = PartialIndex.deserialize(f.read())
             self.assertEqual(out_index.num_postings(), pi.num_postings())
             self.assertEqual(out_index, pi)
+
+    def write_random_runs(self, pi_dir: Path, num_runs: int) -> PartialIndex:
+        rng = random.Random(0)
+        pi = PartialIndex()
+        doc_id = 0
+        for i in range(num_runs):
+            run = PartialIndex()
+            for _ in range(20):
+                tfs = {f"term{rng.randrange(50)}": rng.randrange(1, 5) for _ in range(5)}
+                run.add_document(doc_id, tfs)
+                pi.add_document(doc_id, tfs)
+                doc_id += 1
+            with open(pi_dir / f'partial_index_{i:03}.bin', 'wb') as f:
+                run.write(f)
+        return pi
+
+    def test_fan_in(self):
+        outputs = []
+        for fan_in in [2, 3, 64]:
+            with tempfile.TemporaryDirectory() as pi_dir, tempfile.TemporaryDirectory() as ii_dir:
+                pi = self.write_random_runs(Path(pi_dir), 10)
+                merger = PartialIndexMerger(Path(pi_dir), Path(ii_dir), fan_in=fan_in)
+                merger.merge()
+                # every partial and intermediate run is cleaned up
+                self.assertEqual(list(Path(pi_dir).iterdir()), [])
+                with open(Path(ii_dir) / 'inverted_index.bin', 'rb') as f:
+                    data = f.read()
+                self.assertEqual(PartialIndex.deserialize(data), pi)
+                outputs.append(data)
+                term_dictionary = TermDictionary(Path(ii_dir) / TERM_DICTIONARY_FILE_NAME)
+                positions = dict(term_dictionary.items())
+                term_dictionary.close()
+                for term, position in positions.items():
+                    self.assertEqual(Term.deserialize(data[position:]).term, term)
+        self.assertEqual(merger.num_passes, 1)
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0], outputs[2])
+
+    def test_fan_in_invalid(self):
+        with self.assertRaises(ValueError):
+            PartialIndexMerger(Path(self.pi_dir.name), Path(self.ii_dir.name), fan_in=1)
+
+    def test_partitioned_merge(self):
+        outputs = []
+        for num_workers in [1, 2, 4]:
+            with tempfile.TemporaryDirectory() as pi_dir, tempfile.TemporaryDirectory() as ii_dir:
+                pi = self.write_random_runs(Path(pi_dir), 10)
+                merger = PartialIndexMerger(Path(pi_dir), Path(ii_dir), num_workers=num_workers)
+                merger._SAMPLE_INTERVAL = 4
+                merger.merge()
+                self.assertEqual(list(Path(pi_dir).iterdir()), [])
+                with open(Path(ii_dir) / 'inverted_index.bin', 'rb') as f:
+                    data = f.read()
+                self.assertEqual(PartialIndex.deserialize(data), pi)
+                term_dictionary = TermDictionary(Path(ii_dir) / TERM_DICTIONARY_FILE_NAME)
+                positions = dict(term_dictionary.items())
+                term_dictionary.close()
+                outputs.append((data, positions))
+        # same bytes and term positions as a single process merge
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0], outputs[2])
+
+    def test_partition_terms(self):
+        self.write_random_runs(Path(self.pi_dir.name), 10)
+        runs = sorted(Path(self.pi_dir.name).glob("*.bin"))
+        merger = PartialIndexMerger(Path(self.pi_dir.name), Path(self.ii_dir.name), num_workers=4)
+        merger._SAMPLE_INTERVAL = 4
+        ranges = merger._partition_terms(runs, 4)
+        self.assertEqual(len(ranges), 4)
+        self.assertIsNone(ranges[0].start_term)
+        self.assertIsNone(ranges[-1].end_term)
+        for left, right in zip(ranges, ranges[1:]):
+            self.assertEqual(left.end_term, right.start_term)
+            self.assertLess(left.start_term or "", right.start_term)
+
+    def test_concatenate_records(self):
+        def record(term, postings):
+            pl = PostingList()
+            pl._postings = [Posting(*p) for p in postings]
+            data = Term(term).serialize()
+            return data + pl.serialize(), len(data), read_posting_list_header(data + pl.serialize(), len(data))
+
+        left = record("apple", [(0, 1), (2, 3)])
+        right = record("apple", [(5, 1), (9, 2)])
+        merged = PartialIndexMerger._concatenate_records([right, left])
+        self.assertEqual(merged, record("apple", [(0, 1), (2, 3), (5, 1), (9, 2)])[0])
+
+        # overlapping doc ID ranges have to be decoded and merged
+        overlapping = record("apple", [(1, 1), (6, 1)])
+        self.assertIsNone(PartialIndexMerger._concatenate_records([left, right, overlapping]))
+
+        # long enough for a skip table, made of the lists' blocks, with neighbours coalesced while they fit in one
+        sizes = [50, 100, 500, 30, 200, 129, 128, 1, 90, 300]
+        lists = [[(doc_id, doc_id % 3 + 1) for doc_id in range(start, start + 2 * size, 2)]
+                 for start, size in zip(range(0, 10000, 1000), sizes)]
+        parts = [record("apple", postings) for postings in lists]
+        offset = parts[0][1]
+        merged = PartialIndexMerger._concatenate_records(parts)
+        expected = [Posting(*posting) for postings in lists for posting in postings]
+        self.assertEqual(list(PostingList.deserialize(merged[offset:])), expected)
+        blocks = read_blocks(merged, offset)
+        self.assertEqual(sum(num_postings for _, _, num_postings in blocks), len(expected))
+        self.assertTrue(all(num_postings <= POSTING_BLOCK_SIZE for _, _, num_postings in blocks))
+        self.assertTrue(all(left[2] + right[2] > POSTING_BLOCK_SIZE for left, right in zip(blocks, blocks[1:])))
+        cursor = PostingListCursor(merged, offset)
+        self.assertEqual([cursor.advance_to(posting.doc_id) for posting in expected], expected)
+        # concatenated again, with whatever blocks the first pass made
+        for split in [2, 5, 8]:
+            halves = [PartialIndexMerger._concatenate_records(parts[:split]),
+                      PartialIndexMerger._concatenate_records(parts[split:])]
+            regrouped = PartialIndexMerger._concatenate_records(
+                [(half, offset, read_posting_list_header(half, offset)) for half in halves])
+            self.assertEqual(list(PostingList.deserialize(regrouped[offset:])), expected)
+            self.assertTrue(all(num_postings <= POSTING_BLOCK_SIZE for _, _, num_postings in read_blocks(regrouped, offset)))
@@ -1,7 +1,9 @@
 import unittest
-from index.partial_index.partial_index import PartialIndex
+import io
+from index.partial_index.partial_index import PartialIndex, WRITE_CHUNK_SIZE
 from index.term import Term
 from index.posting import Posting
+from index.posting_list import PostingList
 
 
 class TestPartialIndex(unittest.TestCase):
@@ -10,11 +12,11 @@ class TestPartialIndex(unittest.TestCase):
 
     def test_add_posting(self):
         term_test = Term('test')
-        self.assertNotIn(term_test, self.pi._index.keys())
+        self.assertNotIn(term_test, self.pi.terms())
         self.pi.add_posting(term_test, Posting(1, 1))
-        self.assertEqual(self.pi._index[term_test]._postings,
+        self.assertEqual(self.pi.posting_list(term_test)._postings,
                          [Posting(1, 1)])
-        self.assertIn(term_test, self.pi._index.keys())
+        self.assertIn(term_test, self.pi.terms())
 
         self.assertEqual(self.pi.num_terms(), 1)
         self.assertEqual(self.pi.num_postings(), 1)
@@ -26,7 +28,7 @@ class TestPartialIndex(unittest.TestCase):
         for posting in postings:
             self.pi.add_posting(term_test, posting)
         self.assertEqual(
-            self.pi._index[term_test]._postings, sorted(postings))
+            self.pi.posting_list(term_test)._postings, sorted(postings))
         self.assertEqual(self.pi.num_terms(), 1)
         self.assertEqual(self.pi.num_postings(), 4)
 
@@ -58,6 +60,53 @@ class TestPartialIndex(unittest.TestCase):
         self.assertEqual(PartialIndex.deserialize(
             self.pi.serialize()), self.pi)
 
+    def test_add_document(self):
+        self.pi.add_document(0, {'foo': 3, 'bar': 1})
+        self.pi.add_document(1, {'foo': 2})
+        self.assertEqual(self.pi.terms(), [Term('bar'), Term('foo')])
+        self.assertEqual(self.pi.posting_list(Term('foo'))._postings,
+                         [Posting(0, 3), Posting(1, 2)])
+        self.assertEqual(self.pi.num_postings(), 3)
+
+    def test_serialization_format(self):
+        # runs must stay byte for byte what Term and PostingList serialize to
+        postings = [Posting(7, 2), Posting(3, 1), Posting(5, 9)]
+        for posting in postings:
+            self.pi.add_posting(Term('b'), posting)
+        self.pi.add_posting(Term('a'), Posting(1, 70000))
+        plist_a = PostingList()
+        plist_a.add_posting(Posting(1, 70000))
+        plist_b = PostingList()
+        for posting in postings:
+            plist_b.add_posting(posting)
+        self.assertEqual(self.pi.serialize(),
+                         Term('a').serialize() + plist_a.serialize() + Term('b').serialize() + plist_b.serialize())
+
+    def test_posting_list_missing_term(self):
+        self.assertEqual(len(self.pi.posting_list(Term('missing'))), 0)
+
+    def test_write_streams_chunks(self):
+        # postings are about 2 bytes compressed, this has to come to more than WRITE_CHUNK_SIZE
+        for doc_id in range(40000):
+            self.pi.add_document(
+                doc_id, {f'term{i}': doc_id % 7 + 1 for i in range(20)})
+
+        class RecordingFile(io.BytesIO):
+            def __init__(self):
+                super().__init__()
+                self.write_sizes = []
+
+            def write(self, b):
+                self.write_sizes.append(len(b))
+                return super().write(b)
+
+        f = RecordingFile()
+        written = self.pi.write(f)
+        self.assertEqual(written, len(f.getvalue()))
+        self.assertGreater(len(f.write_sizes), 1)
+        self.assertTrue(all(size < 2 * WRITE_CHUNK_SIZE for size in f.write_sizes))
+        self.assertEqual(PartialIndex.deserialize(f.getvalue()), self.pi)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -61,8 +61,8 @@ class TestPartialIndexResource(unittest.TestCase):
             i = 0
             while item := f._read_item():
                 term, posting_list = item
-                self.assertEqual(term, pi._sorted_terms[i])
-                self.assertEqual(posting_list, pi._index[term])
+                self.assertEqual(term, pi.terms()[i])
+                self.assertEqual(posting_list, pi.posting_list(term))
                 i += 1
 
     def test_pir(self):
@@ -74,3 +74,36 @@ class TestPartialIndexResource(unittest.TestCase):
             plist_bar.add_posting(Posting(0, 3))
             plist_bar.add_posting(Posting(1, 6))
             self.assertEqual(item, (Term('bar'), plist_bar))
+
+    def test_mmap_matches_file(self):
+        self.construct_custom_pi()
+        fp = Path(self.pi_dir.name) / 'out.bin'
+        results = []
+        for use_mmap in [True, False]:
+            with PartialIndexResource(fp, use_mmap=use_mmap) as f:
+                items = list(f.read_items())
+            with PartialIndexResource(fp, use_mmap=use_mmap) as f:
+                raw_items = list(f.read_raw_items())
+            with PartialIndexResource(fp, use_mmap=use_mmap) as f:
+                scanned = list(f.scan_terms())
+                f.seek(0)
+                f.skip_to("term2")
+                rest = [term.term for term, _ in f]
+            results.append((items, raw_items, scanned, rest))
+        self.assertEqual(results[0], results[1])
+        items, raw_items, scanned, rest = results[0]
+        self.assertEqual([term.term for term, _ in items], ["term1", "term2", "term3"])
+        self.assertEqual(rest, ["term2", "term3"])
+        with open(fp, 'rb') as f:
+            data = f.read()
+        self.assertEqual(b''.join(record for _, record, _, _ in raw_items), data)
+        for (term, position, size), (_, record, _, _) in zip(scanned, raw_items):
+            self.assertEqual(data[position:position + size], record)
+
+    def test_empty(self):
+        fp = Path(self.pi_dir.name) / 'empty.bin'
+        fp.touch()
+        for use_mmap in [True, False]:
+            with PartialIndexResource(fp, use_mmap=use_mmap) as f:
+                self.assertIsNone(f._read_item())
+                self.assertEqual(list(f.read_raw_items()), [])
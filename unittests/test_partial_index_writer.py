@@ -0,0 +1,45 @@
+import unittest
+import tempfile
+from pathlib import Path
+from index.partial_index.partial_index import PartialIndex
+from index.partial_index.partial_index_writer import PartialIndexWriter
+
+
+class TestPartialIndexWriter(unittest.TestCase):
+    def setUp(self):
+        self.pi_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.pi_dir.cleanup()
+
+    def make_partial_index(self, start: int) -> PartialIndex:
+        pi = PartialIndex()
+        for doc_id in range(start, start + 100):
+            pi.add_document(doc_id, {'foo': 1, f'bar{doc_id % 5}': 2})
+        return pi
+
+    def test_writes_everything_submitted(self):
+        partial_indexes = [self.make_partial_index(i * 100) for i in range(5)]
+        paths = [Path(self.pi_dir.name) /
+                 f'partial_index_{i:03}.bin' for i in range(5)]
+        with PartialIndexWriter(max_pending=1) as writer:
+            for pi, path in zip(partial_indexes, paths):
+                writer.submit(pi, path)
+        self.assertEqual(writer.num_written, 5)
+        for pi, path in zip(partial_indexes, paths):
+            with open(path, 'rb') as f:
+                self.assertEqual(PartialIndex.deserialize(f.read()), pi)
+
+    def test_error_is_raised(self):
+        missing = Path(self.pi_dir.name) / 'missing' / 'partial_index_000.bin'
+        with self.assertRaises(RuntimeError):
+            with PartialIndexWriter() as writer:
+                writer.submit(self.make_partial_index(0), missing)
+
+    def test_invalid_max_pending(self):
+        with self.assertRaises(ValueError):
+            PartialIndexWriter(max_pending=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
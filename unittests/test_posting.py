@@ -1,6 +1,8 @@
 import unittest
+import bisect
+import random
 
-from index.posting_list import PostingList
+from index.posting_list import POSTING_BLOCK_SIZE, PostingList, PostingListCursor, intersect, read_blocks, read_posting_list_header
 from index.posting import Posting
 from index.term import Term
 
@@ -63,5 +65,92 @@ class TestPosting(unittest.TestCase):
             self.assertEqual(posting, posting_sorted[i])
 
 
+    def test_posting_list_compression(self):
+        # single byte gaps and term frequencies
+        plist = PostingList()
+        plist._postings = [Posting(doc_id, 1) for doc_id in range(100)]
+        data = plist.serialize()
+        self.assertEqual(PostingList.deserialize(data), plist)
+        num_postings, last_doc_id, start, end = read_posting_list_header(data)
+        self.assertEqual((num_postings, last_doc_id, end), (100, 99, len(data)))
+        self.assertEqual(end - start, 200)
+
+        # multi byte gaps and term frequencies
+        plist._postings = [Posting(0, 1), Posting(127, 128), Posting(300, 2), Posting(2 ** 32 - 1, 2 ** 20)]
+        self.assertEqual(PostingList.deserialize(plist.serialize() + b'trailing'), plist)
+
+        plist._postings = []
+        self.assertEqual(PostingList.deserialize(plist.serialize()), plist)
+
+    def test_posting_list_no_length_cap(self):
+        # used to be a 2 byte length, which wrapped around past 65,535 postings
+        plist = PostingList()
+        plist._postings = [Posting(doc_id * 3, doc_id % 200 + 1) for doc_id in range(70000)]
+        self.assertEqual(PostingList.deserialize(plist.serialize()), plist)
+
+    def test_skip_table(self):
+        rng = random.Random(0)
+        doc_ids = sorted(rng.sample(range(10 ** 6), 1000))
+        plist = PostingList()
+        plist._postings = [Posting(doc_id, rng.randint(1, 300)) for doc_id in doc_ids]
+        data = plist.serialize()
+        self.assertEqual(PostingList.deserialize(data), plist)
+        num_postings, last_doc_id, start, end = read_posting_list_header(data)
+        self.assertEqual((num_postings, last_doc_id, end), (1000, doc_ids[-1], len(data)))
+
+        blocks = read_blocks(data)
+        self.assertEqual([num_postings for _, _, num_postings in blocks], [POSTING_BLOCK_SIZE] * 7 + [1000 - 7 * POSTING_BLOCK_SIZE])
+        self.assertEqual([last_doc_id for last_doc_id, _, _ in blocks], doc_ids[POSTING_BLOCK_SIZE - 1::POSTING_BLOCK_SIZE] + [doc_ids[-1]])
+        self.assertEqual(sum(size for _, size, _ in blocks), end - start)
+
+        # short lists don't have one
+        plist._postings = plist._postings[:POSTING_BLOCK_SIZE]
+        data = plist.serialize()
+        _, _, start, end = read_posting_list_header(data)
+        self.assertEqual(read_blocks(data), [(doc_ids[POSTING_BLOCK_SIZE - 1], end - start, POSTING_BLOCK_SIZE)])
+
+    def test_cursor(self):
+        rng = random.Random(1)
+        for length in [1, 50, POSTING_BLOCK_SIZE, POSTING_BLOCK_SIZE + 1, 2000]:
+            doc_ids = sorted(rng.sample(range(100000), length))
+            plist = PostingList()
+            plist._postings = [Posting(doc_id, doc_id % 7 + 1) for doc_id in doc_ids]
+            # somewhere in the middle of other bytes, like in an inverted index
+            data = b'padding' + plist.serialize() + b'trailing'
+            cursor = PostingListCursor(data, len(b'padding'))
+            self.assertEqual(len(cursor), length)
+            target = 0
+            while True:
+                target += rng.randint(0, 2000)
+                i = bisect.bisect_left(doc_ids, target)
+                posting = cursor.advance_to(target)
+                if i == length:
+                    self.assertIsNone(posting)
+                    break
+                self.assertEqual(posting, Posting(doc_ids[i], doc_ids[i] % 7 + 1))
+                # doesn't move if it's already there
+                self.assertEqual(cursor.advance_to(target), posting)
+            self.assertIsNone(cursor.advance_to(10 ** 6))
+
+        # one doc ID near the end only decodes the last block
+        cursor = PostingListCursor(plist.serialize())
+        self.assertEqual(cursor.advance_to(doc_ids[-1]).doc_id, doc_ids[-1])
+        self.assertEqual(cursor.num_blocks_decoded, 1)
+
+    def test_intersect(self):
+        rng = random.Random(2)
+        for lengths in [[10, 5000], [300, 300, 3000], [1, 1], [5000, 4000]]:
+            doc_id_sets = [set(rng.sample(range(20000), length)) for length in lengths]
+            cursors = []
+            for doc_ids in doc_id_sets:
+                plist = PostingList()
+                plist._postings = [Posting(doc_id, 1) for doc_id in sorted(doc_ids)]
+                cursors.append(PostingListCursor(plist.serialize()))
+            self.assertEqual(list(intersect(cursors)), sorted(set.intersection(*doc_id_sets)))
+            if lengths[0] == 10:
+                # the long list decodes at most a block per doc ID of the short one
+                self.assertLessEqual(cursors[1].num_blocks_decoded, 10)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import tempfile
+from pathlib import Path
+from utils.stem_cache import StemCache
+from utils.tokenize import tokenize
+
+
+class TestStemCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = StemCache(10)
+        self.assertEqual(cache.stem('running'), 'run')
+        self.assertEqual(cache.stem('running'), 'run')
+        self.assertEqual(cache.stem('runs'), 'run')
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 2)
+        self.assertAlmostEqual(cache.hit_rate(), 1 / 3)
+
+    def test_lru_eviction(self):
+        cache = StemCache(2)
+        cache.stem('cats')
+        cache.stem('dogs')
+        cache.stem('cats')  # dogs is now least recently used
+        cache.stem('birds')
+        self.assertEqual(len(cache), 2)
+        misses = cache.misses
+        cache.stem('cats')
+        self.assertEqual(cache.misses, misses)
+        cache.stem('dogs')
+        self.assertEqual(cache.misses, misses + 1)
+
+    def test_zero_size_never_caches(self):
+        cache = StemCache(0)
+        cache.stem('cats')
+        cache.stem('cats')
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.misses, 2)
+
+    def test_save_load(self):
+        cache = StemCache(10)
+        for word in ['running', 'jumps', 'engines']:
+            cache.stem(word)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'stem_cache.json'
+            cache.save(path)
+            warmed = StemCache(10)
+            warmed.load(path)
+        self.assertEqual(len(warmed), 3)
+        self.assertEqual(warmed.stem('jumps'), 'jump')
+        self.assertEqual(warmed.hits, 1)
+        self.assertEqual(warmed.misses, 0)
+
+    def test_tokenize_uses_cache(self):
+        cache = StemCache(10)
+        tokens = tokenize("running running runs", cache)
+        self.assertEqual(tokens, {'run': 3})
+        # each distinct surface form is stemmed once per call
+        self.assertEqual(cache.misses, 2)
+        tokenize("running", cache)
+        self.assertEqual(cache.hits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
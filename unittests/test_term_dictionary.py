@@ -0,0 +1,60 @@
+import unittest
+import tempfile
+from pathlib import Path
+from index.term_dictionary import TermDictionary, write_term_dictionary
+
+
+class TestTermDictionary(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.dir.name) / "terms.bin"
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_lookup(self):
+        terms = sorted({f"term{i}" for i in range(50)} | {"a", "zzz", "ünïcode", "term"})
+        term_positions = [(term, i * 37) for i, term in enumerate(terms)]
+        # small blocks, so lookups cross block boundaries
+        write_term_dictionary(self.path, [(term, position, len(term)) for term, position in term_positions], block_size=4)
+
+        dictionary = TermDictionary(self.path)
+        self.assertEqual(len(dictionary), len(terms))
+        for term, position in term_positions:
+            self.assertEqual(dictionary.get(term), position)
+            self.assertEqual(dictionary.lookup(term), (position, len(term)))
+            self.assertIn(term, dictionary)
+        # before the first term, between terms, past a block's last term, and after the last term
+        for missing in ["", "Z", "term01", "term5a", "zzzz", "ü"]:
+            self.assertIsNone(dictionary.get(missing))
+            self.assertNotIn(missing, dictionary)
+        self.assertEqual(list(dictionary.items()), term_positions)
+        self.assertEqual(list(dictionary), terms)
+        for ordinal in [0, 3, 4, len(terms) - 1]:
+            self.assertEqual(dictionary.entry(ordinal)[0], terms[ordinal])
+        self.assertEqual([term for term, _, _ in dictionary.entries(5, 11)], terms[5:11])
+        ordinals = [0, 1, 5, 6, 7, 30, len(terms) - 1]
+        self.assertEqual([term for term, _, _ in dictionary.entries_at(ordinals)], [terms[ordinal] for ordinal in ordinals])
+        dictionary.close()
+
+    def test_prefix_range(self):
+        terms = sorted({f"term{i}" for i in range(120)} | {"a", "ab", "abc", "b", "te", "zzz", "ü", "üb"})
+        write_term_dictionary(self.path, [(term, i, 1) for i, term in enumerate(terms)], block_size=4)
+        dictionary = TermDictionary(self.path)
+        for prefix in ["", "a", "ab", "abcd", "t", "term", "term1", "term11", "term119", "term2", "x", "z", "zzzz", "ü"]:
+            start, end = dictionary.prefix_range(prefix)
+            self.assertEqual(terms[start:end], [term for term in terms if term.startswith(prefix)], prefix)
+        dictionary.close()
+
+    def test_empty(self):
+        write_term_dictionary(self.path, [])
+        dictionary = TermDictionary(self.path)
+        self.assertEqual(len(dictionary), 0)
+        self.assertIsNone(dictionary.get("anything"))
+        self.assertEqual(dictionary.prefix_range("a"), (0, 0))
+        self.assertEqual(list(dictionary.items()), [])
+        dictionary.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
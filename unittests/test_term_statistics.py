@@ -0,0 +1,61 @@
+import unittest
+import math
+import random
+import tempfile
+from pathlib import Path
+from index.partial_index.partial_index import PartialIndex
+from index.partial_index.partial_index_merger import PartialIndexMerger
+from index.term_dictionary import TERM_DICTIONARY_FILE_NAME, TermDictionary
+from index.term_statistics import DOC_NORMS_FILE_NAME, TERM_STATISTICS_FILE_NAME, DocNorms, TermStatistics, tf_weight
+from utils import load_config
+
+
+class TestTermStatistics(unittest.TestCase):
+    def setUp(self):
+        load_config()
+        self.pi_dir = tempfile.TemporaryDirectory()
+        self.ii_dir = tempfile.TemporaryDirectory()
+        rng = random.Random(0)
+        self.documents: dict[int, dict[str, int]] = {}
+        # doc IDs start past 0 and have gaps, like a segment's. "common" is in every document, long enough for a skip table
+        doc_id = 10
+        for i in range(10):
+            run = PartialIndex()
+            for _ in range(20):
+                tfs = {f"term{rng.randrange(50)}": rng.randrange(1, 5) for _ in range(5)}
+                tfs["common"] = rng.randrange(1, 20)
+                run.add_document(doc_id, tfs)
+                self.documents[doc_id] = tfs
+                doc_id += rng.randint(1, 3)
+            with open(Path(self.pi_dir.name) / f'partial_index_{i:03}.bin', 'wb') as f:
+                run.write(f)
+        PartialIndexMerger(Path(self.pi_dir.name), Path(self.ii_dir.name)).merge()
+
+    def tearDown(self):
+        self.pi_dir.cleanup()
+        self.ii_dir.cleanup()
+
+    def test_statistics(self):
+        norms = {doc_id: math.sqrt(sum(tf_weight(tf) ** 2 for tf in tfs.values())) for doc_id, tfs in self.documents.items()}
+        doc_norms = DocNorms(Path(self.ii_dir.name) / DOC_NORMS_FILE_NAME)
+        for doc_id in range(max(self.documents) + 2):
+            self.assertAlmostEqual(doc_norms.norm(doc_id), norms.get(doc_id, 0.0), places=5)
+
+        term_statistics = TermStatistics(Path(self.ii_dir.name) / TERM_STATISTICS_FILE_NAME)
+        dictionary = TermDictionary(Path(self.ii_dir.name) / TERM_DICTIONARY_FILE_NAME)
+        self.assertEqual(term_statistics.num_docs, len(self.documents))
+        self.assertEqual(len(term_statistics), len(dictionary))
+        for term, _, document_frequency in dictionary.entries():
+            ordinal, _, _ = dictionary.find(term)
+            weights = [tf_weight(tfs[term]) / norms[doc_id] for doc_id, tfs in self.documents.items() if term in tfs]
+            self.assertEqual(document_frequency, len(weights))
+            idf, max_weight = term_statistics.get(ordinal)
+            self.assertAlmostEqual(idf, math.log10(len(self.documents) / len(weights)), places=5)
+            self.assertAlmostEqual(max_weight, max(weights), places=5)
+        self.assertEqual(term_statistics.get(dictionary.find("common")[0])[0], 0.0)
+        self.assertIsNone(dictionary.find("wombat"))
+        dictionary.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,7 @@
 import unittest
 from utils import get_postings
+from utils.tokenize import tokenize, get_anchor_texts, get_term_frequencies
+from bs4 import BeautifulSoup
 
 
 class TestTokenize(unittest.TestCase):
@@ -14,6 +16,58 @@ class TestTokenize(unittest.TestCase):
         self.assertEqual(words['a'], 1)
         self.assertEqual(words['1'], 1)
 
+    def test_tokenize_splits_on_non_alnum(self):
+        tokens = tokenize("Hello, world! hello_world 42-foo")
+        self.assertEqual(tokens['hello'], 2)
+        self.assertEqual(tokens['world'], 2)
+        self.assertEqual(tokens['42'], 1)
+        self.assertEqual(tokens['foo'], 1)
+        self.assertEqual(sum(tokens.values()), 6)
+
+    def test_tokenize_stems(self):
+        tokens = tokenize("running runs RUN")
+        self.assertEqual(tokens, {'run': 3})
+
+    def test_tokenize_empty(self):
+        self.assertEqual(tokenize(""), {})
+        self.assertEqual(tokenize(" .,;-_ "), {})
+
+    def test_tokenize_unicode(self):
+        # non-ASCII letters are alphanumeric, and are lowercased one character at a time (no word final sigma)
+        tokens = tokenize("naïve ΟΔΟΣ")
+        self.assertIn('naïv', tokens)
+        self.assertIn('οδοσ', tokens)
+        self.assertEqual(sum(tokens.values()), 2)
+
+    def test_term_frequencies_strongest_weight(self):
+        soup = BeautifulSoup(
+            "<html><head><title>engine</title></head><body><div><p>search <b>engine</b></p></div>plain</body></html>", 'html.parser')
+        tfs = get_term_frequencies(soup)
+        # title (5) + b inside p inside div inside body (2)
+        self.assertEqual(tfs['engin'], 7)
+        self.assertEqual(tfs['search'], 1)
+        self.assertEqual(tfs['plain'], 1)
+
+    def test_term_frequencies_skip_non_text(self):
+        soup = BeautifulSoup(
+            "<html><body><!-- hidden --><script>var x;</script><style>p {}</style><p>shown</p></body></html>", 'html.parser')
+        self.assertEqual(get_term_frequencies(soup), {'shown': 1})
+
+    def test_term_frequencies_unweighted_text_dropped(self):
+        soup = BeautifulSoup("foo bar <ul><li>baz</li></ul>", 'html.parser')
+        self.assertEqual(get_term_frequencies(soup), {})
+
+    def test_anchor_texts(self):
+        soup = BeautifulSoup(
+            '<a href="/about#team">About us</a> <a href="https://b.com/x">Running</a> <a href="https://b.com/x">runs</a>'
+            '<a href="mailto:me@a.com">mail</a> <a href="page.html">home</a> <a href="#top">top</a> <a href="/empty"></a>',
+            "html.parser")
+        anchors = get_anchor_texts("https://a.com/page.html", soup)
+        self.assertEqual(anchors, {
+            "https://a.com/about": {"about": 1, "us": 1},
+            "https://b.com/x": {"run": 2},
+        })
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+import tempfile
+from pathlib import Path
+from index.tombstones import Tombstones
+
+
+class TestTombstones(unittest.TestCase):
+    def test_add_and_contains(self):
+        tombstones = Tombstones()
+        for doc_id in [0, 7, 8, 1000]:
+            tombstones.add(doc_id)
+        tombstones.add(7)
+        self.assertEqual(len(tombstones), 4)
+        for doc_id in [0, 7, 8, 1000]:
+            self.assertIn(doc_id, tombstones)
+        for doc_id in [1, 6, 9, 999, 10 ** 6]:
+            self.assertNotIn(doc_id, tombstones)
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as index_dir:
+            self.assertEqual(len(Tombstones.load(Path(index_dir))), 0)
+            tombstones = Tombstones()
+            tombstones.add(3)
+            tombstones.add(42)
+            tombstones.save(Path(index_dir))
+            loaded = Tombstones.load(Path(index_dir))
+            self.assertEqual(len(loaded), 2)
+            self.assertIn(42, loaded)
+            self.assertNotIn(41, loaded)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import tempfile
+from pathlib import Path
+from index.url_store import UrlStore, write_url_store
+from index.varint import decode_varint, encode_varint
+
+
+class TestUrlStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.dir.name) / "urls.bin"
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_varint(self):
+        out = bytearray()
+        values = [0, 1, 127, 128, 300, 2 ** 32 - 1, 2 ** 40]
+        for value in values:
+            encode_varint(value, out)
+        self.assertEqual(len(out), 1 + 1 + 1 + 2 + 2 + 5 + 6)
+        pos = 0
+        for value in values:
+            decoded, pos = decode_varint(out, pos)
+            self.assertEqual(decoded, value)
+        self.assertEqual(pos, len(out))
+
+    def test_lookup(self):
+        doc_id_to_url = {doc_id: f"https://www.ics.uci.edu/~user{doc_id // 7}/page/{doc_id}.html"
+                         for doc_id in range(100, 150)}
+        # a gap left by a compaction
+        del doc_id_to_url[120]
+        doc_id_to_url[130] = "https://ünïcode.example.com/"
+        write_url_store(self.path, doc_id_to_url)
+
+        store = UrlStore(self.path)
+        self.assertEqual(len(store), 49)
+        self.assertEqual((store.first_doc_id, store.end_doc_id), (100, 150))
+        for doc_id, url in doc_id_to_url.items():
+            self.assertEqual(store.url(doc_id), url)
+        for doc_id in [0, 99, 120, 150, 10 ** 6]:
+            self.assertIsNone(store.url(doc_id))
+        self.assertEqual(dict(store.items()), doc_id_to_url)
+        store.close()
+
+        # front coding should beat the URLs laid end to end
+        self.assertLess(self.path.stat().st_size,
+                        sum(len(url) for url in doc_id_to_url.values()))
+
+    def test_empty(self):
+        write_url_store(self.path, {})
+        store = UrlStore(self.path)
+        self.assertEqual(len(store), 0)
+        self.assertIsNone(store.url(0))
+        self.assertEqual(list(store.items()), [])
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
-from utils.tokenize import get_postings, get_anchor_word_postings, tokenize
+from utils.tokenize import get_postings, get_anchor_texts, get_term_frequencies, make_postings, tokenize
 from utils.logger import engine_log, index_log
 from utils.config import load_config
+from utils.stem_cache import StemCache
@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from nltk.stem import PorterStemmer
+from pathlib import Path
+import json
+
+
+class StemCache:
+    """
+    Bounded LRU memo of surface form -> Porter stem.
+    Web text is Zipfian, so a few hundred thousand entries catch the vast majority of stem() calls.
+    Keeps hit/miss counts so the bound can be sized against real data.
+    """
+
+    def __init__(self, max_size: int = 2 ** 17) -> None:
+        if max_size < 0:
+            raise ValueError(f"Stem cache size must be non-negative, got {max_size}.")
+        self._max_size = max_size
+        self._stemmer = PorterStemmer()
+        self._cache: OrderedDict[str, str] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def stem(self, word: str) -> str:
+        """Returns the stem of word, stemming and remembering it if it isn't cached. Evicts the least recently used entry when full."""
+        stem = self._cache.get(word)
+        if stem is not None:
+            self.hits += 1
+            self._cache.move_to_end(word)
+            return stem
+
+        self.misses += 1
+        stem = self._stemmer.stem(word)
+        if self._max_size > 0:
+            self._cache[word] = stem
+            if len(self._cache) > self._max_size:
+                self._cache.popitem(last=False)
+        return stem
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def save(self, path: Path) -> None:
+        """Dump the cached table, least recently used first, so load() keeps the same recency order."""
+        with open(path, 'w') as f:
+            json.dump(self._cache, f)
+
+    def load(self, path: Path) -> None:
+        """Warm the cache from a table written by save(). Doesn't count towards hits or misses."""
+        with open(path, 'r') as f:
+            table: dict[str, str] = json.load(f)
+        for word, stem in table.items():
+            self._cache[word] = stem
+            self._cache.move_to_end(word)
+            if len(self._cache) > self._max_size:
+                self._cache.popitem(last=False)
+
+    def __str__(self) -> str:
+        return f"<StemCache | {len(self._cache)}/{self._max_size} entries, {self.hits} hits, {self.misses} misses, {self.hit_rate():.2%} hit rate>"
+
+    def __repr__(self) -> str:
+        return self.__str__()
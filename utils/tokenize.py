@@ -1,41 +1,53 @@
 from collections import Counter, defaultdict
-from bs4 import BeautifulSoup
-from typing import Mapping
-from index.posting_list import PostingList
-from index.term import Term
-from index.posting import Posting
-import nltk
-from nltk.stem import PorterStemmer
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
+from typing import TYPE_CHECKING, Mapping, Optional
+from utils.stem_cache import StemCache
+from urllib.parse import urljoin
+import re
 
+if TYPE_CHECKING:
+    # index imports utils (the builder tokenizes documents), so index is only imported where postings are made, see make_postings
+    from index.posting_list import PostingList
+    from index.term import Term
 
-def tokenize(text: str) -> Counter[str]:
+
+# a run of characters that str.isalnum() accepts. \w is exactly isalnum() plus "_", so take the underscore back out
+_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# shared by every tokenize() call that doesn't bring its own cache, instead of constructing a stemmer per call
+_STEM_CACHE = StemCache()
+
+
+def _lower(token: str) -> str:
     """
-    Tokenizes input text, applies Porter stemming, and returns a Counter object.
+    Lowercases a token the same way lowercasing it character by character would.
+    str.lower() on the whole token is only different for context sensitive characters (like a word final sigma), which can't be ASCII.
     """
-    stemmer = PorterStemmer()
-    tokens = Counter()
+    if token.isascii():
+        return token.lower()
+    return "".join(char.lower() for char in token)
 
-    buffer = ""
-    cursor = 0
 
-    while cursor < len(text):
-        char = text[cursor]
-        if char.isalnum():
-            buffer += char.lower()
-        else:
-            if buffer:
-                # stem token
-                stemmed_token = stemmer.stem(buffer)
-                tokens[stemmed_token] += 1
-                buffer = ""
-        cursor += 1
+def tokenize(text: str, stem_cache: Optional[StemCache] = None) -> Counter[str]:
+    """
+    Tokenizes input text, applies Porter stemming, and returns a Counter object.
+    Tokens are maximal runs of alphanumeric characters, lowercased.
+    Stems go through stem_cache, or a module-wide cache if none is given.
+    """
+    if stem_cache is None:
+        stem_cache = _STEM_CACHE
 
-    # append anything leftover in the buffer after stemming
-    if buffer:
-        stemmed_token = stemmer.stem(buffer)
-        tokens[stemmed_token] += 1
+    if text.isascii():
+        # ASCII lowercasing can't change what's alphanumeric, so lowercase everything in one go
+        tokens = _TOKEN_PATTERN.findall(text.lower())
+    else:
+        tokens = [_lower(token) for token in _TOKEN_PATTERN.findall(text)]
 
-    return tokens
+    # stem each distinct surface form once
+    stemmed_tokens: Counter[str] = Counter()
+    for token, count in Counter(tokens).items():
+        stemmed_tokens[stem_cache.stem(token)] += count
+    return stemmed_tokens
 
 
 _TAG_WEIGHTS = {
@@ -53,19 +65,54 @@ _TAG_WEIGHTS = {
 
 _TAGS = list(_TAG_WEIGHTS.keys())
 
+# the same strings Tag.get_text() collects by default. comments, scripts, stylesheets etc. are NavigableString subclasses, so
+# these are compared by exact type
+_TEXT_TYPES = (NavigableString, CData)
+
 
-def get_postings(doc_id: int, soup: BeautifulSoup) -> Mapping[Term, PostingList]:
+def _weighted_texts(soup: BeautifulSoup) -> dict[int, list[str]]:
     """
-    Returns a Mapping of Terms to PostingLists.
+    Walks the document once, attributing every text node to the strongest _TAG_WEIGHTS weight among its enclosing tags.
+    Returns the text nodes grouped by weight. Text outside of every weighted tag is dropped.
+    """
+    texts: defaultdict[int, list[str]] = defaultdict(list)
+    stack: list[tuple[Tag, int]] = [(soup, 0)]
+    while stack:
+        element, weight = stack.pop()
+        for child in element.contents:
+            if isinstance(child, Tag):
+                stack.append(
+                    (child, max(weight, _TAG_WEIGHTS.get(child.name, 0))))
+            elif weight and type(child) in _TEXT_TYPES:
+                text = child.strip()
+                if text:
+                    texts[weight].append(text)
+    return texts
+
+
+def get_term_frequencies(soup: BeautifulSoup, stem_cache: Optional[StemCache] = None) -> dict[str, int]:
+    """
+    Returns a mapping of stemmed tokens to their weighted term frequency in the document.
     Only takes text from the tags in _TAG_WEIGHTS keys, ignoring all other data.
+    Every occurrence of a token counts once, with the weight of its strongest enclosing tag (a word in a <b> in a <p> counts 2).
+    Plain str/int mapping so it's cheap to send back from a worker process.
     """
     token_tf_map: defaultdict[str, int] = defaultdict(int)
 
-    # weight specific terms based on HTML tags
-    for tag in soup.find_all(_TAGS):
-        tokens = tokenize(tag.get_text(separator=" ", strip=True))
+    # tokenize all the text of one weight in a single call, rather than once per tag
+    for weight, texts in _weighted_texts(soup).items():
+        tokens = tokenize(" ".join(texts), stem_cache)
         for token, count in tokens.items():
-            token_tf_map[token] += count * _TAG_WEIGHTS[tag.name]
+            token_tf_map[token] += count * weight
+
+    return token_tf_map
+
+
+def make_postings(doc_id: int, token_tf_map: Mapping[str, int]) -> Mapping["Term", "PostingList"]:
+    """Turns a mapping of tokens to term frequencies into a Mapping of Terms to PostingLists for a single document."""
+    from index.posting import Posting
+    from index.posting_list import PostingList
+    from index.term import Term
 
     out: defaultdict[Term, PostingList] = defaultdict(PostingList)
     for token, tf in token_tf_map.items():
@@ -74,26 +121,36 @@ def get_postings(doc_id: int, soup: BeautifulSoup) -> Mapping[Term, PostingList]
     return out
 
 
-def get_anchor_word_postings(doc_id_map: Mapping[int, str], soup: BeautifulSoup) -> Mapping[Term, PostingList]:
+def get_postings(doc_id: int, soup: BeautifulSoup) -> Mapping["Term", "PostingList"]:
     """
-    Extracts anchor texts from one soup and creates postings for them for the document they link to.
+    Returns a Mapping of Terms to PostingLists.
+    Only takes text from the tags in _TAG_WEIGHTS keys, ignoring all other data.
     """
-    out: defaultdict[Term, PostingList] = defaultdict(PostingList)
-    inverted = {v: k for k, v in doc_id_map.items()}
+    return make_postings(doc_id, get_term_frequencies(soup))
 
-    a_tags = []
-    # a_tags.extend(soup.find_all('a', href=True))
-    for a_tag in a_tags:
-        if a_tag is None:
-            continue
-        href = a_tag['href'].split('#')[0]  # ignore fragment part
-        if not href.startswith('http'):
+
+def get_anchor_texts(url: str, soup: BeautifulSoup, stem_cache: Optional[StemCache] = None) -> dict[str, dict[str, int]]:
+    """
+    Tokenized anchor text of every outgoing link of one document, keyed by the absolute URL (without fragment) it links to.
+    Links back to the document itself are dropped, they're mostly navigation.
+    Doesn't resolve targets to doc IDs, that's left to the builder once every doc ID is known.
+    """
+    texts: defaultdict[str, list[str]] = defaultdict(list)
+    for a_tag in soup.find_all('a', href=True):
+        try:
+            target = urljoin(url, a_tag['href']).split('#')[0]  # ignore fragment part
+        except ValueError:
+            # malformed hrefs (like broken IPv6 hosts) are out there
             continue
-        doc_id = inverted.get(href, None)
-        if doc_id is None:
+        if not target.startswith('http') or target == url:
             continue
-        tokens = tokenize(a_tag.get_text(separator=" ", strip=True))
-        for token, count in tokens.items():
-            out[Term(token)].add_posting(Posting(doc_id, count))
-
-    return out
+        text = a_tag.get_text(separator=" ", strip=True)
+        if text:
+            texts[target].append(text)
+
+    anchors = {}
+    for target, target_texts in texts.items():
+        tokens = tokenize(" ".join(target_texts), stem_cache)
+        if tokens:
+            anchors[target] = dict(tokens)
+    return anchors